@@ -9,6 +9,11 @@ class FinancialDashboardApp {
         this.mobileNavOpen = false;
         this.charts = {};
         this.userData = null;
+        this.apiToken = localStorage.getItem('finai_token');
+        this.dashboardETag = null;
+        this.dashboardVersion = null;
+        this.dashboardData = {};
+        this.liveEvents = null;
         this.appData = null;
         this.currentPricingSlide = 0;
         this.currentMetricIndex = 0;
@@ -937,6 +942,7 @@ class FinancialDashboardApp {
 
     logout() {
         localStorage.removeItem('finai_user');
+        this.disconnectLiveEvents();
         this.isAuthenticated = false;
         this.userData = null;
         this.hideElement('userDropdown');
@@ -968,6 +974,9 @@ class FinancialDashboardApp {
         // Close mobile navigation
         this.closeMobileNav();
         
+        // Live updates replace polling when signed in with an API token
+        this.connectLiveEvents();
+        
         // Initialize dashboard with delay to ensure DOM is ready
         setTimeout(() => {
             this.populateDashboard();
@@ -1802,23 +1811,7 @@ class FinancialDashboardApp {
         }
 
         this.addChatMessage(message, 'user');
-        
-        // Show typing indicator
-        setTimeout(() => {
-            this.showTypingIndicator();
-            
-            // Simulate AI response delay
-            setTimeout(() => {
-                this.hideTypingIndicator();
-                const response = this.generateAIResponse(message);
-                this.addChatMessage(response, 'ai');
-                
-                // Add haptic feedback for response
-                if (navigator.vibrate) {
-                    navigator.vibrate([50, 100, 50]);
-                }
-            }, 2000);
-        }, 500);
+        this.respondToChatMessage(message);
     }
 
     sendQuickMessage(message) {
@@ -1829,10 +1822,27 @@ class FinancialDashboardApp {
         }
 
         this.addChatMessage(message, 'user');
-        
+        this.respondToChatMessage(message);
+    }
+
+    respondToChatMessage(message) {
+        // Stream the answer from the API when signed in with a real token
+        if (this.apiToken && window.fetch && window.TextDecoder) {
+            this.streamAIResponse(message).catch(error => {
+                console.error('AI stream error:', error);
+                this.hideTypingIndicator();
+                this.respondWithMockAI(message);
+            });
+            return;
+        }
+        this.respondWithMockAI(message);
+    }
+
+    respondWithMockAI(message) {
         setTimeout(() => {
             this.showTypingIndicator();
             
+            // Simulate AI response delay
             setTimeout(() => {
                 this.hideTypingIndicator();
                 const response = this.generateAIResponse(message);
@@ -1846,6 +1856,69 @@ class FinancialDashboardApp {
         }, 500);
     }
 
+    async streamAIResponse(message) {
+        this.showTypingIndicator();
+
+        const response = await fetch('/api/ai/consult/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${this.apiToken}`
+            },
+            body: JSON.stringify({ question: message, include_rss: true })
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let textEl = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE frames are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                const eventLine = frame.split('\n').find(line => line.startsWith('event: '));
+                const dataLine = frame.split('\n').find(line => line.startsWith('data: '));
+                if (!eventLine || !dataLine) continue;
+
+                const event = eventLine.slice(7);
+                const data = JSON.parse(dataLine.slice(6));
+
+                if (event === 'delta') {
+                    if (!textEl) {
+                        this.hideTypingIndicator();
+                        this.addChatMessage('', 'ai');
+                        const messages = document.querySelectorAll('#chatMessages .chat-message--ai .message-text');
+                        textEl = messages[messages.length - 1];
+                    }
+                    answer += data.content;
+                    if (textEl) {
+                        textEl.textContent = answer;
+                        const container = document.getElementById('chatMessages');
+                        if (container) container.scrollTop = container.scrollHeight;
+                    }
+                } else if (event === 'done' && navigator.vibrate) {
+                    navigator.vibrate([50, 100, 50]);
+                }
+            }
+        }
+
+        if (!textEl) {
+            this.hideTypingIndicator();
+        }
+    }
+
     addChatMessage(text, sender) {
         const container = document.getElementById('chatMessages');
         if (!container) return;
@@ -2118,7 +2191,120 @@ class FinancialDashboardApp {
         }, 1500);
     }
 
+    async fetchDashboardFromApi() {
+        // Conditional request: 304 when nothing changed, otherwise only changed sections
+        const url = this.dashboardVersion
+            ? `/api/dashboard?since=${encodeURIComponent(this.dashboardVersion)}`
+            : '/api/dashboard';
+        const headers = { 'Authorization': `Bearer ${this.apiToken}` };
+        if (this.dashboardETag) {
+            headers['If-None-Match'] = this.dashboardETag;
+        }
+
+        const response = await fetch(url, { headers });
+        if (response.status === 304) {
+            return false;
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        const data = await response.json();
+        this.dashboardETag = response.headers.get('ETag');
+        this.dashboardVersion = data.version;
+        this.dashboardData = data.delta ? { ...this.dashboardData, ...data } : data;
+        this.applyDashboardData(this.dashboardData);
+        return true;
+    }
+
+    connectLiveEvents() {
+        if (!this.apiToken || !window.EventSource || this.liveEvents) return;
+
+        // EventSource reconnects on its own and sends Last-Event-ID to resume
+        this.liveEvents = new EventSource(`/api/events?token=${encodeURIComponent(this.apiToken)}`);
+
+        const refreshDashboard = () => {
+            this.fetchDashboardFromApi()
+                .then(changed => {
+                    if (changed) {
+                        this.populateDashboard();
+                        this.populateAccountsList();
+                        this.populateDetailedAccounts();
+                    }
+                })
+                .catch(error => console.error('Dashboard refresh error:', error));
+        };
+
+        this.liveEvents.addEventListener('dashboard.changed', refreshDashboard);
+        this.liveEvents.addEventListener('resync', () => {
+            this.dashboardVersion = null;
+            refreshDashboard();
+        });
+        this.liveEvents.addEventListener('notification', event => {
+            const data = JSON.parse(event.data);
+            this.showToast(data.title, data.type === 'critical' ? 'error' : 'info');
+        });
+        this.liveEvents.addEventListener('report.ready', event => {
+            const data = JSON.parse(event.data);
+            this.showToast(`Отчет готов: ${data.name}`, 'success');
+        });
+        this.liveEvents.addEventListener('report.failed', event => {
+            const data = JSON.parse(event.data);
+            this.showToast(`Ошибка генерации отчета: ${data.name}`, 'error');
+        });
+    }
+
+    disconnectLiveEvents() {
+        if (this.liveEvents) {
+            this.liveEvents.close();
+            this.liveEvents = null;
+        }
+    }
+
+    applyDashboardData(data) {
+        const metrics = this.appData.dashboardMetrics;
+        const summary = data.summary || data;
+
+        metrics.totalBalance = summary.total_balance_kzt ?? summary.totalBalance ?? metrics.totalBalance;
+        metrics.liquidityStatus = summary.liquidity_status ?? summary.liquidityStatus ?? metrics.liquidityStatus;
+        metrics.accountsCount = summary.accounts_count ?? summary.accountsCount ?? metrics.accountsCount;
+        metrics.lastUpdated = summary.last_updated ?? data.lastUpdated ?? metrics.lastUpdated;
+        if (data.cashFlowThisMonth !== undefined) metrics.cashFlowThisMonth = data.cashFlowThisMonth;
+        if (data.riskLevel !== undefined) metrics.riskLevel = data.riskLevel;
+
+        if (Array.isArray(data.accounts)) {
+            this.appData.accounts = data.accounts.map(account => ({
+                id: account.id,
+                name: account.name,
+                bank: account.bank,
+                balance: account.balance,
+                currency: account.currency,
+                type: account.account_type,
+                lastTransaction: account.lastTransaction || metrics.lastUpdated
+            }));
+        }
+    }
+
     refreshData() {
+        if (this.apiToken && window.fetch) {
+            this.showLoading(true);
+            this.fetchDashboardFromApi()
+                .then(changed => {
+                    if (changed) {
+                        this.populateDashboard();
+                        this.populateAccountsList();
+                        this.populateDetailedAccounts();
+                    }
+                    this.showToast(changed ? 'Данные обновлены' : 'Данные актуальны', 'success');
+                })
+                .catch(error => {
+                    console.error('Dashboard refresh error:', error);
+                    this.showToast('Ошибка обновления данных', 'error');
+                })
+                .finally(() => this.showLoading(false));
+            return;
+        }
+
         this.showLoading(true);
         
         setTimeout(() => {
@@ -0,0 +1,145 @@
+"""Per-render cost of report HTML templates.
+
+Compares three ways of rendering the same report:
+- compile per render: templates parsed and compiled on every call, as the
+  inline Template(...) strings used to be;
+- cold start: a fresh Environment per render that can load the on-disk
+  bytecode cache (the first render of a new process);
+- cached environment: the module-level Environment used by main.py.
+
+Run from the repository root:
+    python benchmarks/report_templates.py --renders 500
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+
+TEMPLATE_DIR = "templates"
+TEMPLATE_VERSION = "v1"
+
+SAMPLE_REPORTS = {
+    "liquidity_daily": {
+        "report_type": "liquidity_daily",
+        "summary": {"total_balance_kzt": 154300000.0, "accounts_count": 12, "liquidity_status": "ADEQUATE",
+                    "risk_level": "LOW", "net_cash_flow_30d": 12500000.0},
+        "accounts": [
+            {"name": f"Счет {i}", "bank": "Halyk Bank", "balance": 1000000.0 * i, "currency": "KZT",
+             "balance_kzt": 1000000.0 * i, "account_type": "current", "mobile_priority": i % 3}
+            for i in range(12)
+        ],
+        "cash_flows": {"inflows": 40000000.0, "outflows": 27500000.0, "net": 12500000.0},
+        "recommendations": ["Оптимизируйте кредиторскую задолженность", "Усильте контроль за дебиторской задолженностью"],
+    },
+    "risk_weekly": {
+        "report_type": "risk_weekly",
+        "summary": {"overall_risk": "MEDIUM", "total_risks": 2, "high_risks": 0, "medium_risks": 2,
+                    "total_balance_kzt": 154300000.0},
+        "risk_breakdown": {
+            "currency_distribution": {"KZT": 100000000.0, "USD": 44300000.0, "EUR": 10000000.0},
+            "bank_distribution": {"Halyk Bank": 95000000.0, "Kaspi Bank": 59300000.0},
+        },
+        "identified_risks": [
+            {"type": "bank_concentration", "level": "MEDIUM", "description": "Концентрация в банке Halyk Bank: 61.6%",
+             "recommendation": "Рассмотрите распределение средств между несколькими банками", "mobile_priority": False},
+        ] * 2,
+    },
+    "cashflow_monthly": {
+        "report_type": "cashflow_monthly",
+        "summary": {"total_inflows": 40000000.0, "total_outflows": 27500000.0, "net_cash_flow": 12500000.0,
+                    "weeks_analyzed": 9},
+        "weekly_breakdown": {f"2025-W{week:02d}": {"inflows": 5000000.0, "outflows": 3000000.0, "net": 2000000.0}
+                             for week in range(10, 19)},
+        "cash_flows": [
+            {"date": "2025-03-10T00:00:00", "amount": 250000.0 * (i + 1), "type": "inflow" if i % 2 else "outflow",
+             "description": f"Платеж {i}", "category": "operations", "probability": 0.9, "mobile_important": i < 5}
+            for i in range(200)
+        ],
+    },
+}
+
+for sample in SAMPLE_REPORTS.values():
+    sample.update({
+        "company_name": "ТОО Демо",
+        "user_name": "Демо пользователь",
+        "generated_at": datetime(2025, 3, 10, 8, 0).isoformat(),
+        "period": {"from": "2025-02-08", "to": "2025-04-09"},
+    })
+
+
+def make_environment(**options) -> Environment:
+    # Same settings and filters as report_templates in main.py
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(["html"]),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        **options
+    )
+    environment.filters.update(
+        money=lambda value: f"{value or 0:,.0f}",
+        share=lambda value, total: f"{(value or 0) / total * 100:.1f}%" if total else "0.0%",
+        report_date=lambda value: datetime.fromisoformat(value).strftime("%d.%m.%Y %H:%M"),
+    )
+    return environment
+
+
+def template_name(report_type: str, variant: str) -> str:
+    return f"reports/{TEMPLATE_VERSION}/{variant}/{report_type}.html"
+
+
+def measure(renders: int, render) -> float:
+    """Mean microseconds per render over all report types and variants"""
+    jobs = [(report_type, variant) for report_type in SAMPLE_REPORTS for variant in ("desktop", "mobile")]
+    started = time.perf_counter()
+    for index in range(renders):
+        report_type, variant = jobs[index % len(jobs)]
+        render(template_name(report_type, variant), SAMPLE_REPORTS[report_type])
+    return (time.perf_counter() - started) / renders * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=500)
+    args = parser.parse_args()
+
+    bytecode_dir = tempfile.mkdtemp(prefix="jinja-bench-")
+    try:
+        def compile_per_render(name, report):
+            return make_environment(cache_size=0).get_template(name).render(report=report)
+
+        # Warm the bytecode cache once, then every render starts from a fresh environment
+        warm = make_environment(bytecode_cache=FileSystemBytecodeCache(bytecode_dir))
+        for report_type in SAMPLE_REPORTS:
+            for variant in ("desktop", "mobile"):
+                warm.get_template(template_name(report_type, variant))
+
+        def cold_start(name, report):
+            environment = make_environment(bytecode_cache=FileSystemBytecodeCache(bytecode_dir))
+            return environment.get_template(name).render(report=report)
+
+        cached = make_environment(bytecode_cache=FileSystemBytecodeCache(bytecode_dir))
+
+        def cached_environment(name, report):
+            return cached.get_template(name).render(report=report)
+
+        results = {
+            "compile per render": measure(args.renders, compile_per_render),
+            "cold start (bytecode)": measure(args.renders, cold_start),
+            "cached environment": measure(args.renders, cached_environment),
+        }
+    finally:
+        shutil.rmtree(bytecode_dir, ignore_errors=True)
+
+    baseline = results["compile per render"]
+    print(f"renders={args.renders}")
+    for name, micros in results.items():
+        print(f"{name:>22}: {micros:>9.1f} us/render  (x{baseline / micros:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -61,9 +61,15 @@ CREATE TABLE IF NOT EXISTS news_articles (
     risk_level VARCHAR(20), -- low, medium, high
     relevance_score DECIMAL(3,2) DEFAULT 0.50, -- 0.00-1.00 AI оценка релевантности
     ai_tags JSONB, -- AI теги для категоризации
+    fingerprint VARCHAR(64), -- sha256 нормализованного URL (или текста, если URL нет)
+    content_hash VARCHAR(64), -- sha256 нормализованных заголовка и текста
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Для существующих баз
+ALTER TABLE news_articles ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
+ALTER TABLE news_articles ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
 -- НОВАЯ ТАБЛИЦА: Пользовательские RSS каналы
 CREATE TABLE IF NOT EXISTS user_rss_feeds (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -142,6 +148,26 @@ CREATE TABLE IF NOT EXISTS webhook_logs (
     processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Валидаторы условных HTTP запросов для RSS и НБ РК
+CREATE TABLE IF NOT EXISTS http_validator_cache (
+    url VARCHAR(1000) PRIMARY KEY,
+    etag VARCHAR(255),
+    last_modified VARCHAR(100),
+    content_hash VARCHAR(64), -- sha256 последнего обработанного ответа
+    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Кеш AI анализа статей по хешу содержимого и версии промпта
+CREATE TABLE IF NOT EXISTS ai_analysis_cache (
+    content_hash VARCHAR(64) NOT NULL,
+    prompt_version VARCHAR(50) NOT NULL,
+    result JSONB NOT NULL,
+    processing_time_ms INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, prompt_version)
+);
+
 -- Денежные потоки (для прогнозирования)
 CREATE TABLE IF NOT EXISTS cash_flows (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -208,6 +234,7 @@ CREATE INDEX IF NOT EXISTS idx_news_articles_category ON news_articles(category)
 CREATE INDEX IF NOT EXISTS idx_news_articles_sentiment ON news_articles(sentiment);
 CREATE INDEX IF NOT EXISTS idx_news_articles_relevance ON news_articles(relevance_score DESC);
 CREATE INDEX IF NOT EXISTS idx_news_articles_title_trgm ON news_articles USING gin(title gin_trgm_ops);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_news_articles_fingerprint ON news_articles(fingerprint);
 
 -- RSS каналы пользователей
 CREATE INDEX IF NOT EXISTS idx_user_rss_feeds_user_id ON user_rss_feeds(user_id);
@@ -216,6 +243,7 @@ CREATE INDEX IF NOT EXISTS idx_user_rss_feeds_category ON user_rss_feeds(categor
 CREATE INDEX IF NOT EXISTS idx_user_rss_feeds_priority ON user_rss_feeds(priority DESC);
 CREATE INDEX IF NOT EXISTS idx_user_rss_feeds_frequency ON user_rss_feeds(fetch_frequency);
 CREATE INDEX IF NOT EXISTS idx_user_rss_feeds_last_fetched ON user_rss_feeds(last_fetched);
+CREATE INDEX IF NOT EXISTS idx_user_rss_feeds_due ON user_rss_feeds(is_active, fetch_frequency, last_fetched);
 
 -- RSS анализ контента
 CREATE INDEX IF NOT EXISTS idx_rss_content_analysis_user_id ON rss_content_analysis(user_id);
@@ -416,6 +444,10 @@ BEGIN
     DELETE FROM rss_content_analysis 
     WHERE analysis_date < CURRENT_DATE - INTERVAL '3 months';
     
+    -- Удаление старых записей кеша AI анализа (старше 3 месяцев)
+    DELETE FROM ai_analysis_cache 
+    WHERE created_at < CURRENT_DATE - INTERVAL '3 months';
+    
     -- Удаление старых логов webhook'ов (старше 3 месяцев)
     DELETE FROM webhook_logs 
     WHERE processed_at < CURRENT_DATE - INTERVAL '3 months';
@@ -541,6 +573,8 @@ COMMENT ON TABLE rss_content_analysis IS 'AI анализ контента из
 COMMENT ON TABLE ai_consultations IS 'История AI консультаций с учетом RSS данных';
 COMMENT ON TABLE reports IS 'Генерируемые отчеты с включением RSS анализа';
 COMMENT ON TABLE webhook_logs IS 'Логи webhook интеграций (n8n, Telegram, etc.)';
+COMMENT ON TABLE ai_analysis_cache IS 'Кеш AI анализа статей по хешу содержимого и версии промпта';
+COMMENT ON TABLE http_validator_cache IS 'ETag, Last-Modified и хеш содержимого для условной загрузки RSS и курсов НБ РК';
 
 -- Комментарии к ключевым полям
 COMMENT ON COLUMN user_rss_feeds.priority IS 'Приоритет RSS канала (1-5), влияет на частоту обновления и количество анализируемых статей';
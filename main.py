@@ -1,14 +1,16 @@
 # ⚡ FastAPI Backend с исправленными отчетами и мобильной поддержкой
 
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, JSON, Integer, Float, func
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, JSON, Integer, Float, func, text, literal_column, event, insert, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.dialects.postgresql import UUID, aggregate_order_by
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
@@ -19,8 +21,12 @@ import os
 import httpx
 import asyncio
 import json
+import hashlib
 import logging
 from pathlib import Path
+import gzip
+import stat
+import anyio
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -29,14 +35,26 @@ from email import encoders
 import csv
 import io
 import base64
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
 import schedule
 import threading
+import queue
 import time
+import atexit
+import fcntl
 import random
 import os
+import numpy as np
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from starlette.datastructures import Headers
 from supabase import create_client
 
+try:
+    import brotli
+except ImportError:  # gzip copies only
+    brotli = None
+
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "financial-ai-super-secret-key-for-development-change-in-production")
 ALGORITHM = "HS256"
@@ -67,8 +85,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a precompressed .br / .gz sibling when the client accepts it"""
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    @staticmethod
+    def accepted_encodings(header: str) -> Dict[str, float]:
+        """Accept-Encoding codings with their q-values (q=0 means "not acceptable")"""
+        accepted = {}
+        for item in header.split(","):
+            coding, _, params = item.partition(";")
+            coding = coding.strip().lower()
+            if not coding:
+                continue
+            quality = 1.0
+            for param in params.split(";"):
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        quality = float(value.strip())
+                    except ValueError:
+                        quality = 0.0
+            accepted[coding] = quality
+        return accepted
+
+    async def get_response(self, path: str, scope) -> Response:
+        accepted = {}
+        if scope["method"] in ("GET", "HEAD"):
+            accepted = self.accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        
+        variants = []  # (quality, encoding, full_path, stat_result) in ENCODINGS preference order
+        for encoding, suffix in self.ENCODINGS:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                variants.append((accepted.get(encoding, accepted.get("*", 0.0)), encoding, full_path, stat_result))
+        
+        acceptable = [variant for variant in variants if variant[0] > 0]
+        if acceptable:
+            _, encoding, full_path, stat_result = max(acceptable, key=lambda variant: variant[0])
+            # The media type is guessed from the name without the suffix (x.html.gz -> text/html)
+            response = self.file_response(full_path, stat_result, scope)
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = await super().get_response(path, scope)
+        if variants:
+            # Caches must key every representation of this path on Accept-Encoding, identity included
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
 # Static files with mobile optimization
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -218,6 +285,7 @@ class ReportHistory(Base):
     success = Column(Boolean, default=True)
     error_message = Column(Text)
     mobile_optimized = Column(Boolean, default=False)  # New for mobile-optimized reports
+    content_hash = Column(String(64), index=True)  # Artifact in the report artifact store
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -249,6 +317,11 @@ class UserSession(Base):
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Columns added to existing tables (create_all only creates missing tables)
+with engine.begin() as connection:
+    connection.execute(text("ALTER TABLE report_history ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_report_history_content_hash ON report_history (content_hash)"))
+
 # =============================================================================
 # Pydantic Models
 # =============================================================================
@@ -313,6 +386,309 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt runs on its own bounded pool so logins never block the event loop.
+# The bcrypt backend releases the GIL, so threads hash in parallel across cores.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_LIMITER_MAX_ACCOUNTS = int(os.getenv("LOGIN_LIMITER_MAX_ACCOUNTS", "100000"))
+
+class PasswordHasher:
+    """Bounded executor for bcrypt hash/verify with queue-depth metrics.
+
+    When every worker is busy and PASSWORD_HASH_MAX_QUEUE calls are already
+    waiting, new calls are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.peak_queued = 0
+        self._wait_total = 0.0
+        self._work_total = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(pwd_context.verify, plain_password, hashed_password)
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service is busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self.peak_queued = max(self.peak_queued, self._pending - self._running)
+        submitted_at = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, submitted_at, func, args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _timed(self, submitted_at: float, func, args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self._wait_total += started_at - submitted_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self._work_total += time.perf_counter() - started_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_queue": self.max_queue,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total / self.completed * 1000, 2) if self.completed else 0.0,
+                "avg_hash_ms": round(self._work_total / self.completed * 1000, 2) if self.completed else 0.0
+            }
+
+class LoginRateLimiter:
+    """Sliding window of failed attempts per account (keyed by email).
+
+    Checked before any bcrypt work, so a single account cannot be used to
+    flood the hashing pool.
+    """
+
+    def __init__(self, max_attempts: int = LOGIN_MAX_ATTEMPTS, window_seconds: int = LOGIN_WINDOW_SECONDS,
+                 max_accounts: int = LOGIN_LIMITER_MAX_ACCOUNTS):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self.max_accounts = max_accounts
+        self._failures: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.blocked = 0
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return email.strip().lower()
+
+    def check(self, email: str):
+        """Raise 429 with Retry-After while the account is over its budget"""
+        key = self._key(email)
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key)
+            if not failures:
+                return
+            while failures and failures[0] <= now - self.window_seconds:
+                failures.popleft()
+            if not failures:
+                del self._failures[key]
+                return
+            if len(failures) < self.max_attempts:
+                return
+            self.blocked += 1
+            retry_after = int(failures[0] + self.window_seconds - now) + 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def record_failure(self, email: str):
+        key = self._key(email)
+        with self._lock:
+            failures = self._failures.get(key)
+            if failures is None:
+                failures = self._failures[key] = deque(maxlen=self.max_attempts)
+            failures.append(time.monotonic())
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_accounts:
+                self._failures.popitem(last=False)
+
+    def reset(self, email: str):
+        with self._lock:
+            self._failures.pop(self._key(email), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked_accounts": len(self._failures),
+                "blocked": self.blocked,
+                "max_attempts": self.max_attempts,
+                "window_seconds": self.window_seconds
+            }
+
+password_hasher = PasswordHasher()
+login_limiter = LoginRateLimiter()
+
+# Login/register bookkeeping (UserSession rows, users.last_login) is written
+# behind the request and flushed in bulk by a background thread.
+SESSION_WRITE_FLUSH_INTERVAL_MS = int(os.getenv("SESSION_WRITE_FLUSH_INTERVAL_MS", "300"))
+SESSION_WRITE_BATCH_SIZE = int(os.getenv("SESSION_WRITE_BATCH_SIZE", "500"))
+SESSION_WRITE_MAX_BUFFER = int(os.getenv("SESSION_WRITE_MAX_BUFFER", "50000"))
+
+class SessionWriteRecorder:
+    """Write-behind buffer for UserSession inserts and last_login updates.
+
+    Rows are flushed every SESSION_WRITE_FLUSH_INTERVAL_MS or as soon as
+    SESSION_WRITE_BATCH_SIZE records are pending, as one multi-row INSERT
+    plus one bulk UPDATE in a single transaction. A batch the database
+    rejects for its data is split in halves until the bad rows are isolated
+    and dropped; any other failure (database unreachable) puts the rows
+    back. close() drains whatever is left on shutdown.
+    """
+
+    def __init__(self, flush_interval_ms: int = SESSION_WRITE_FLUSH_INTERVAL_MS,
+                 batch_size: int = SESSION_WRITE_BATCH_SIZE, max_buffer: int = SESSION_WRITE_MAX_BUFFER):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.max_buffer = max_buffer
+        self._sessions: List[Dict[str, Any]] = []
+        self._last_logins: Dict[Any, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    def record_session(self, **values):
+        values.setdefault("id", uuid.uuid4())
+        now = datetime.utcnow()
+        values.setdefault("created_at", now)
+        values.setdefault("last_activity", now)
+        with self._lock:
+            self._sessions.append(values)
+            self._trim()
+            pending = len(self._sessions) + len(self._last_logins)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def record_login(self, user_id, at: Optional[datetime] = None):
+        at = at or datetime.utcnow()
+        with self._lock:
+            previous = self._last_logins.get(user_id)
+            if previous is None or at > previous:
+                self._last_logins[user_id] = at
+
+    def _trim(self):
+        overflow = len(self._sessions) - self.max_buffer
+        if overflow > 0:
+            del self._sessions[:overflow]
+            self.dropped += overflow
+            logger.warning(f"Session write buffer full, dropped {overflow} oldest session rows")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                sessions, self._sessions = self._sessions, []
+                last_logins, self._last_logins = self._last_logins, {}
+            if not sessions and not last_logins:
+                return 0
+
+            try:
+                written = self._write(sessions, list(last_logins.items()))
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                    self._sessions[:0] = sessions
+                    self._trim()
+                    for user_id, at in last_logins.items():
+                        if at > self._last_logins.get(user_id, at - timedelta(seconds=1)):
+                            self._last_logins[user_id] = at
+                logger.error(f"Session write flush failed, {len(sessions)} sessions requeued: {e}")
+                return 0
+
+            with self._lock:
+                self.flushes += 1
+                self.rows_written += written
+            return written
+
+    def _write(self, sessions: List[Dict[str, Any]], last_logins: List[tuple]) -> int:
+        """Write one batch, bisecting it when a row is rejected; other errors propagate"""
+        db = SessionLocal()
+        try:
+            if sessions:
+                db.execute(insert(UserSession), sessions)
+            if last_logins:
+                db.execute(update(User), [{"id": user_id, "last_login": at} for user_id, at in last_logins])
+            db.commit()
+            return len(sessions) + len(last_logins)
+        except (IntegrityError, DataError, StaleDataError) as e:
+            db.rollback()
+            error = e
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if len(sessions) + len(last_logins) == 1:
+            # e.g. a session for a user deleted since login: retrying cannot succeed
+            with self._lock:
+                self.rejected += 1
+            logger.error(f"Dropping session write row rejected by the database: {error}")
+            return 0
+        if sessions and last_logins:
+            return self._write(sessions, []) + self._write([], last_logins)
+        sessions_half, logins_half = len(sessions) // 2, len(last_logins) // 2
+        return (self._write(sessions[:sessions_half], last_logins[:logins_half])
+                + self._write(sessions[sessions_half:], last_logins[logins_half:]))
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_sessions": len(self._sessions),
+                "pending_logins": len(self._last_logins),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "failures": self.failures,
+                "dropped": self.dropped,
+                "rejected": self.rejected
+            }
+
+session_writer = SessionWriteRecorder()
+atexit.register(session_writer.close)
+
+@app.on_event("shutdown")
+def flush_session_writes():
+    session_writer.close()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -350,6 +726,142 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         )
     return user
 
+# Verified tokens are cached so authenticated requests skip the user lookup.
+# The TTL bounds how long other worker processes can serve a changed user.
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+
+class AuthPrincipal:
+    """Lightweight authenticated user built from a users row"""
+    __slots__ = ("id", "email", "name", "role", "company", "subscription_plan", "is_active", "is_verified")
+
+    def __init__(self, user: "User"):
+        for attribute in self.__slots__:
+            setattr(self, attribute, getattr(user, attribute))
+
+class AuthPrincipalCache:
+    """Bounded LRU of verified tokens -> principal.
+
+    An entry lives until AUTH_CACHE_TTL_SECONDS or the token's own expiry,
+    whichever comes first, and is dropped as soon as the user row changes.
+    Invalidation only reaches the current process: with several uvicorn or
+    gunicorn workers the others keep a deactivated or changed user for up
+    to the TTL, so keep AUTH_CACHE_TTL_SECONDS short.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl_seconds: int = AUTH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[AuthPrincipal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: AuthPrincipal, token_expires_at: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        user_key = str(principal.id)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            self._tokens_by_user.setdefault(user_key, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, token: str):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(str(principal.id))
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[str(principal.id)]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(str(user_id), ())):
+                self._drop(token)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+auth_cache = AuthPrincipalCache()
+
+@event.listens_for(Session, "after_flush")
+def collect_auth_invalidations(session, flush_context):
+    changed = [obj for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)]
+    for user in changed:
+        # Drop right away and again after commit, so a request racing the commit cannot keep stale data
+        auth_cache.invalidate_user(user.id)
+        session.info.setdefault("auth_invalidations", set()).add(str(user.id))
+
+@event.listens_for(Session, "after_commit")
+def apply_auth_invalidations(session):
+    for user_id in session.info.pop("auth_invalidations", ()):
+        auth_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def discard_auth_invalidations(session):
+    session.info.pop("auth_invalidations", None)
+
+def authenticate_token(token: str, db: Session) -> AuthPrincipal:
+    """Verify a bearer token and return its principal, from cache when possible"""
+    principal = auth_cache.get(token)
+    if principal is not None:
+        return principal
+    
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        email: str = payload.get("sub")
+        if email is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    except jwt.PyJWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = db.query(User).filter(User.email == email).first()
+    if user is None or user.is_active is False:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    principal = AuthPrincipal(user)
+    auth_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> AuthPrincipal:
+    """Authenticated principal; no database access on a cache hit"""
+    return authenticate_token(credentials.credentials, db)
+
 def detect_mobile_device(user_agent: str) -> bool:
     """Detect if request is from mobile device"""
     mobile_keywords = ['mobile', 'android', 'iphone', 'ipod', 'blackberry', 'windows phone']
@@ -368,42 +880,599 @@ def mask_api_key(key: str) -> str:
         return "••••••••"
     return key[:4] + "•" * (len(key) - 8) + key[-4:]
 
+# =============================================================================
+# Exchange Rates
+# =============================================================================
+
+# Used until the first successful refresh and for pairs the view does not have
+FX_FALLBACK_RATES = {"USD": 480.0, "EUR": 520.0}
+FX_RATE_TABLE_MAX_AGE_SECONDS = int(os.getenv("FX_RATE_TABLE_MAX_AGE_SECONDS", "300"))
+
+class FXSnapshot:
+    """Immutable view of the rate table: units of the base currency per unit of currency"""
+    __slots__ = ("base_currency", "rates", "rows", "version", "as_of")
+
+    def __init__(self, base_currency: str, rates: Dict[str, float], rows: List[Dict[str, Any]],
+                 version: int, as_of: Optional[datetime]):
+        self.base_currency = base_currency
+        self.rates = rates
+        self.rows = rows
+        self.version = version
+        self.as_of = as_of
+
+    def rate(self, from_currency: str, to_currency: Optional[str] = None) -> float:
+        """Rate between two currencies, cross rates go through the base currency"""
+        to_currency = to_currency or self.base_currency
+        if from_currency == to_currency:
+            return 1.0
+        return self.rates.get(from_currency, 1.0) / self.rates.get(to_currency, 1.0)
+
+    def to_base(self, amount: float, currency: str) -> float:
+        return amount * self.rates.get(currency, 1.0)
+
+class FXRateTable:
+    """Latest rate per currency pair, loaded from the latest_exchange_rates view.
+
+    Every report and the dashboard read the same snapshot; a refresh builds a
+    new snapshot and swaps it in, so readers never see a half-updated table.
+    """
+
+    def __init__(self, base_currency: str = "KZT", fallback_rates: Optional[Dict[str, float]] = None,
+                 max_age_seconds: int = FX_RATE_TABLE_MAX_AGE_SECONDS):
+        self.base_currency = base_currency
+        self.fallback_rates = dict(fallback_rates or {})
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._snapshot = FXSnapshot(base_currency, {base_currency: 1.0, **self.fallback_rates}, [], 0, None)
+
+    def refresh(self, db: Session) -> FXSnapshot:
+        rows = db.execute(text(
+            "SELECT from_currency, to_currency, rate, date, source FROM latest_exchange_rates"
+        )).mappings().all()
+        
+        direct, inverse = {}, {}
+        for row in rows:
+            if not row["rate"]:
+                continue
+            if row["to_currency"] == self.base_currency:
+                direct[row["from_currency"]] = float(row["rate"])
+            elif row["from_currency"] == self.base_currency:
+                inverse[row["to_currency"]] = 1.0 / float(row["rate"])
+        # Direct quotes win over inverted ones, both win over fallbacks
+        rates = {**self.fallback_rates, **inverse, **direct, self.base_currency: 1.0}
+        
+        as_of = max((row["date"] for row in rows if row["date"]), default=None)
+        with self._lock:
+            self._snapshot = FXSnapshot(
+                self.base_currency,
+                rates,
+                [{**row, "rate": float(row["rate"]) if row["rate"] is not None else None} for row in rows],
+                self._snapshot.version + 1,
+                as_of
+            )
+            self._loaded_at = time.monotonic()
+            return self._snapshot
+
+    def snapshot(self, db: Optional[Session] = None) -> FXSnapshot:
+        """Current snapshot, refreshed first if it is older than max_age_seconds"""
+        if db is not None and time.monotonic() - self._loaded_at > self.max_age_seconds:
+            try:
+                # Savepoint keeps the caller's transaction usable when the view is missing or the query fails
+                with db.begin_nested():
+                    return self.refresh(db)
+            except Exception as e:
+                logger.error(f"Error refreshing FX rate table: {e}")
+                self._loaded_at = time.monotonic()
+        return self._snapshot
+
+fx_rates = FXRateTable(fallback_rates=FX_FALLBACK_RATES)
+
+# =============================================================================
+# Balance Aggregation
+# =============================================================================
+
+class BalanceAggregate:
+    """Result of one vectorized pass over a tenant's accounts, amounts in the base currency"""
+    __slots__ = ("balances_base", "total", "by_currency", "by_bank")
+
+    def __init__(self, balances_base: np.ndarray, by_currency: Dict[str, float], by_bank: Dict[str, float]):
+        self.balances_base = balances_base
+        self.total = float(balances_base.sum())
+        self.by_currency = by_currency
+        self.by_bank = by_bank
+
+    def _shares(self, amounts: Dict[str, float]) -> Dict[str, float]:
+        if self.total <= 0:
+            return {key: 0.0 for key in amounts}
+        return {key: amount / self.total * 100 for key, amount in amounts.items()}
+
+    def currency_shares(self) -> Dict[str, float]:
+        """Percentage of the total held in each currency"""
+        return self._shares(self.by_currency)
+
+    def bank_shares(self) -> Dict[str, float]:
+        """Percentage of the total held in each bank"""
+        return self._shares(self.by_bank)
+
+class AccountBalances:
+    """A tenant's active accounts as columnar arrays.
+
+    Currencies and banks are dictionary-encoded, so conversion is a single
+    gather of the per-currency rate vector and the per-currency / per-bank
+    sums are bincounts, whatever the number of accounts.
+    """
+
+    DETAIL_COLUMNS = ("name", "account_type", "mobile_priority")
+
+    def __init__(self, balances: np.ndarray, currencies: np.ndarray, currency_index: np.ndarray,
+                 banks: np.ndarray, bank_index: np.ndarray, details: Optional[Dict[str, list]] = None):
+        self.balances = balances
+        self.currencies = currencies
+        self.currency_index = currency_index
+        self.banks = banks
+        self.bank_index = bank_index
+        self.details = details or {}
+
+    @classmethod
+    def load(cls, db: Session, user_id: str, with_details: bool = False) -> "AccountBalances":
+        columns = [BankAccount.balance, BankAccount.currency, BankAccount.bank]
+        if with_details:
+            columns += [getattr(BankAccount, name) for name in cls.DETAIL_COLUMNS]
+        rows = db.query(*columns).filter(
+            BankAccount.user_id == user_id,
+            BankAccount.is_active == True
+        ).all()
+        
+        balances = np.fromiter((row[0] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+        currencies, currency_index = np.unique(
+            np.array([row[1] or "KZT" for row in rows], dtype=object).astype(str), return_inverse=True
+        )
+        banks, bank_index = np.unique(
+            np.array([row[2] or "" for row in rows], dtype=object).astype(str), return_inverse=True
+        )
+        details = None
+        if with_details:
+            details = {
+                name: [row[3 + i] for row in rows]
+                for i, name in enumerate(cls.DETAIL_COLUMNS)
+            }
+        return cls(balances, currencies, currency_index, banks, bank_index, details)
+
+    def __len__(self) -> int:
+        return len(self.balances)
+
+    def aggregate(self, rates: FXSnapshot) -> BalanceAggregate:
+        rate_vector = np.array([rates.to_base(1.0, currency) for currency in self.currencies], dtype=np.float64)
+        balances_base = self.balances * rate_vector[self.currency_index]
+        
+        by_currency = np.bincount(self.currency_index, weights=balances_base, minlength=len(self.currencies))
+        by_bank = np.bincount(self.bank_index, weights=balances_base, minlength=len(self.banks))
+        return BalanceAggregate(
+            balances_base,
+            dict(zip(self.currencies.tolist(), by_currency.tolist())),
+            dict(zip(self.banks.tolist(), by_bank.tolist()))
+        )
+
+    def priority_order(self, limit: Optional[int] = None) -> np.ndarray:
+        """Row indices by descending mobile priority (requires details)"""
+        priorities = np.array([priority or 0 for priority in self.details["mobile_priority"]], dtype=np.int64)
+        order = np.argsort(-priorities, kind="stable")
+        return order[:limit] if limit is not None else order
+
+# =============================================================================
+# Live Events
+# =============================================================================
+
+EVENT_BACKEND = os.getenv("EVENT_BACKEND", "memory")
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+EVENT_SUBSCRIBER_QUEUE_SIZE = 100
+
+# Events published to this channel go to every connected user
+BROADCAST_CHANNEL = "*"
+
+class InMemoryEventBackend:
+    """Pub/sub inside this process: a ring buffer for resume plus subscriber queues.
+
+    Another backend (e.g. Redis pub/sub with a capped stream for history)
+    only needs the same publish / replay / subscribe / unsubscribe methods.
+    publish() is safe to call from any thread: delivery is scheduled on each
+    subscriber's own event loop.
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)  # (sequence, channel, event)
+        self._subscribers: Dict[str, set] = {}  # channel -> {(loop, queue)}
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._sequence += 1
+            event = {
+                "id": f"{self.epoch}-{self._sequence}",
+                "sequence": self._sequence,
+                "type": event_type,
+                "data": data,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            self._history.append((self._sequence, channel, event))
+            subscribers = list(self._subscribers.get(channel, ()))
+            if channel == BROADCAST_CHANNEL:
+                for channel_subscribers in self._subscribers.values():
+                    subscribers.extend(channel_subscribers)
+        
+        for loop, subscriber_queue in set(subscribers):
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriber_queue, event)
+            except RuntimeError:
+                pass  # subscriber's loop is already closed
+        return event
+
+    @staticmethod
+    def _deliver(subscriber_queue: asyncio.Queue, event: Dict[str, Any]):
+        if subscriber_queue.full():
+            # Slow consumer: drop the oldest event, the client can resume by id
+            subscriber_queue.get_nowait()
+        subscriber_queue.put_nowait(event)
+
+    def replay(self, channel: str, last_event_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Events after last_event_id, or None if they are no longer available"""
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self._lock:
+            if self._history and self._history[0][0] > sequence + 1:
+                return None
+            return [
+                event for event_sequence, event_channel, event in self._history
+                if event_sequence > sequence and event_channel in (channel, BROADCAST_CHANNEL)
+            ]
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        subscriber_queue = asyncio.Queue(maxsize=EVENT_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add((asyncio.get_running_loop(), subscriber_queue))
+        return subscriber_queue
+
+    def unsubscribe(self, channel: str, subscriber_queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is subscriber_queue})
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "channels": len(self._subscribers),
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "history": len(self._history)
+            }
+
+EVENT_BACKENDS = {
+    "memory": InMemoryEventBackend,
+}
+
+class EventBroker:
+    """Per-user live event channel served as Server-Sent Events"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def publish(self, user_id, event_type: str, data: Optional[Dict[str, Any]] = None):
+        try:
+            self.backend.publish(str(user_id), event_type, data or {})
+        except Exception as e:
+            logger.error(f"Error publishing event {event_type}: {e}")
+
+    def broadcast(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        self.publish(BROADCAST_CHANNEL, event_type, data)
+
+    @staticmethod
+    def format(event: Dict[str, Any]) -> str:
+        payload = json.dumps({**event["data"], "timestamp": event["timestamp"]}, ensure_ascii=False, default=str)
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+    async def stream(self, user_id, last_event_id: Optional[str] = None):
+        """SSE frames for one connection: missed events first, then live ones with heartbeats"""
+        channel = str(user_id)
+        subscriber_queue = self.backend.subscribe(channel)
+        try:
+            yield f"retry: {int(EVENT_HEARTBEAT_SECONDS * 1000)}\n\n"
+            last_sequence = 0
+            if last_event_id:
+                missed = self.backend.replay(channel, last_event_id)
+                if missed is None:
+                    # History is gone (restart or overflow): the client should refetch
+                    yield self.format({"id": last_event_id, "type": "resync", "data": {}, "timestamp": datetime.utcnow().isoformat()})
+                else:
+                    for missed_event in missed:
+                        last_sequence = missed_event["sequence"]
+                        yield self.format(missed_event)
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber_queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                # Events published while replaying are already in the replayed batch
+                if event["sequence"] <= last_sequence:
+                    continue
+                yield self.format(event)
+        finally:
+            self.backend.unsubscribe(channel, subscriber_queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+if EVENT_BACKEND not in EVENT_BACKENDS:
+    logger.warning(f"Unknown EVENT_BACKEND '{EVENT_BACKEND}', using in-process events")
+event_broker = EventBroker(EVENT_BACKENDS.get(EVENT_BACKEND, InMemoryEventBackend)())
+
+# =============================================================================
+# Dashboard Snapshots
+# =============================================================================
+
+DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS", "60"))
+
+# Distinguishes snapshot versions across process restarts
+DASHBOARD_SNAPSHOT_EPOCH = uuid.uuid4().hex[:8]
+
+class DashboardSnapshotStore:
+    """Precomputed per-user dashboard documents, rebuilt section by section.
+
+    Each section (accounts, cash flows, ...) has a version per user and a
+    global version. Writes bump the versions of the sections they affect and
+    the next read rebuilds only those sections; untouched sections are served
+    from memory. A snapshot older than max_age_seconds is rebuilt in full, which
+    covers time-based windows and writes made by other processes.
+    """
+
+    def __init__(self, max_age_seconds: int = DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        self._entries: Dict[str, Dict[Any, Dict[str, Any]]] = {}  # user -> variant -> entry
+        self._user_versions: Dict[str, Dict[str, int]] = {}
+        self._global_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.section_rebuilds = 0
+
+    def _version(self, user_key: str, section: str) -> tuple:
+        return (self._user_versions.get(user_key, {}).get(section, 0), self._global_versions.get(section, 0))
+
+    def invalidate(self, user_id, *sections: str):
+        """Mark sections of one user's dashboard as changed"""
+        with self._lock:
+            versions = self._user_versions.setdefault(str(user_id), {})
+            for section in sections:
+                versions[section] = versions.get(section, 0) + 1
+
+    def invalidate_global(self, *sections: str):
+        """Mark sections as changed for every user (shared inputs such as rates)"""
+        with self._lock:
+            for section in sections:
+                self._global_versions[section] = self._global_versions.get(section, 0) + 1
+
+    def get(self, user_id, variant: Any, builders: Dict[str, Any]) -> Dict[str, Any]:
+        """Snapshot entry with "document", "sections", "etag", "version" and "built_at".
+
+        builders maps section name to a callable returning that section's part
+        of the document; the document is their union in builders order. The
+        version only moves when a rebuilt section actually differs, so the ETag
+        is a strong validator derived from data watermarks, not from a hash of
+        the whole response.
+        """
+        user_key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_key, {}).get(variant)
+            versions = {section: self._version(user_key, section) for section in builders}
+            expired = entry is None or time.monotonic() - entry["built_monotonic"] > self.max_age_seconds
+            if expired:
+                stale = list(builders)
+            else:
+                stale = [section for section in builders if entry["versions"].get(section) != versions[section]]
+            if not stale:
+                self.hits += 1
+                return entry
+        
+        # Sections are rebuilt outside the lock; a write that lands meanwhile
+        # bumps the version again and the next read picks it up
+        rebuilt = {section: builders[section]() for section in stale}
+        digests = {
+            section: hashlib.sha256(json.dumps(part, sort_keys=True, default=str).encode()).hexdigest()
+            for section, part in rebuilt.items()
+        }
+        
+        with self._lock:
+            current = self._entries.get(user_key, {}).get(variant) or entry
+            sections = dict(current["sections"]) if current else {}
+            section_digests = dict(current["section_digests"]) if current else {}
+            section_versions = dict(current["section_versions"]) if current else {}
+            version = current["version"] if current else 0
+            
+            changed = [section for section in stale if section_digests.get(section) != digests[section]]
+            if changed or current is None:
+                version += 1
+            for section in changed:
+                sections[section] = rebuilt[section]
+                section_digests[section] = digests[section]
+                section_versions[section] = version
+            
+            if changed or current is None:
+                document = {}
+                for section in builders:
+                    document.update(sections[section])
+                built_at = datetime.utcnow()
+            else:
+                document = current["document"]
+                built_at = current["built_at"]
+            
+            # The user tag keeps validators of different users on one browser apart
+            user_tag = hashlib.sha256(user_key.encode()).hexdigest()[:8]
+            new_entry = {
+                "sections": sections,
+                "section_digests": section_digests,
+                "section_versions": section_versions,
+                "versions": versions,
+                "document": document,
+                "version": version,
+                "user_tag": user_tag,
+                "version_token": f"{DASHBOARD_SNAPSHOT_EPOCH}.{user_tag}.{version}",
+                "etag": f'"{variant}.{DASHBOARD_SNAPSHOT_EPOCH}.{user_tag}.{version}"',
+                "built_at": built_at,
+                # max_age is measured from the last full rebuild
+                "built_monotonic": time.monotonic() if expired else current["built_monotonic"]
+            }
+            self._entries.setdefault(user_key, {})[variant] = new_entry
+            self.section_rebuilds += len(stale)
+        return new_entry
+
+    @staticmethod
+    def changed_sections(entry: Dict[str, Any], since: Optional[str]) -> Optional[List[str]]:
+        """Sections changed after the given version token, None if a full document is needed"""
+        if not since:
+            return None
+        epoch, _, rest = since.partition(".")
+        user_tag, _, version = rest.partition(".")
+        if (epoch != DASHBOARD_SNAPSHOT_EPOCH or user_tag != entry["user_tag"]
+                or not version.isdigit() or int(version) > entry["version"]):
+            return None
+        return [section for section, changed_at in entry["section_versions"].items() if changed_at > int(version)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "hits": self.hits,
+                "section_rebuilds": self.section_rebuilds
+            }
+
+dashboard_snapshots = DashboardSnapshotStore()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches the given ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [candidate.strip() for candidate in if_none_match.split(",")]
+
+# Models whose writes change a user's dashboard, and the sections they feed
+DASHBOARD_SECTIONS_BY_MODEL = {
+    BankAccount: ("accounts",),
+    CashFlow: ("cash_flows",),
+    Notification: ("notifications",),
+}
+
+@event.listens_for(Session, "after_flush")
+def collect_dashboard_invalidations(session, flush_context):
+    pending = session.info.setdefault("dashboard_invalidations", set())
+    live_events = session.info.setdefault("live_events", [])
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        sections = DASHBOARD_SECTIONS_BY_MODEL.get(type(obj))
+        if sections and getattr(obj, "user_id", None):
+            pending.update((str(obj.user_id), section) for section in sections)
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            live_events.append((str(obj.user_id), "notification", {
+                "id": str(obj.id),
+                "title": obj.title,
+                "message": obj.message,
+                "type": obj.notification_type,
+                "action_url": obj.action_url
+            }))
+
+@event.listens_for(Session, "after_commit")
+def apply_dashboard_invalidations(session):
+    # Applied only after commit so a concurrent rebuild cannot cache uncommitted state
+    changed_sections: Dict[str, set] = {}
+    for user_id, section in session.info.pop("dashboard_invalidations", ()):
+        dashboard_snapshots.invalidate(user_id, section)
+        changed_sections.setdefault(user_id, set()).add(section)
+    
+    for user_id, sections in changed_sections.items():
+        event_broker.publish(user_id, "dashboard.changed", {"sections": sorted(sections)})
+    for user_id, event_type, data in session.info.pop("live_events", ()):
+        event_broker.publish(user_id, event_type, data)
+
+@event.listens_for(Session, "after_rollback")
+def discard_dashboard_invalidations(session):
+    session.info.pop("dashboard_invalidations", None)
+    session.info.pop("live_events", None)
+
 # =============================================================================
 # Report Generation Functions (Enhanced for Mobile)
 # =============================================================================
 
-def generate_liquidity_report(user_id: str, db: Session, mobile_optimized: bool = False) -> Dict[str, Any]:
-    """Generate liquidity analysis report with mobile optimization"""
+# Report HTML templates live in templates/reports/<version>/<desktop|mobile>/<report_type>.html.
+# Compiled templates stay in the environment's cache, and their bytecode is also
+# written to disk so a fresh process skips parsing.
+REPORT_TEMPLATE_DIR = os.getenv("REPORT_TEMPLATE_DIR", "templates")
+REPORT_TEMPLATE_VERSION = os.getenv("REPORT_TEMPLATE_VERSION", "v1")
+REPORT_TEMPLATE_BYTECODE_DIR = os.getenv("REPORT_TEMPLATE_BYTECODE_DIR", "data/cache/jinja")
+REPORT_TEMPLATE_AUTO_RELOAD = os.getenv("REPORT_TEMPLATE_AUTO_RELOAD", "false").lower() == "true"
+
+def format_money(value) -> str:
+    """Amount with thousands separators and no decimals, e.g. 1,234,568"""
+    return f"{value or 0:,.0f}"
+
+def format_share(value, total) -> str:
+    """Share of a total as a percentage"""
+    return f"{(value or 0) / total * 100:.1f}%" if total else "0.0%"
+
+def format_report_date(value: str) -> str:
+    """ISO timestamp as shown in report headers"""
+    return datetime.fromisoformat(value).strftime("%d.%m.%Y %H:%M")
+
+Path(REPORT_TEMPLATE_BYTECODE_DIR).mkdir(parents=True, exist_ok=True)
+report_templates = Environment(
+    loader=FileSystemLoader(REPORT_TEMPLATE_DIR),
+    bytecode_cache=FileSystemBytecodeCache(REPORT_TEMPLATE_BYTECODE_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=REPORT_TEMPLATE_AUTO_RELOAD,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+report_templates.filters.update(money=format_money, share=format_share, report_date=format_report_date)
+
+def render_report_html(report_data: Dict[str, Any], mobile_optimized: bool = False) -> str:
+    """Render a projected report with the current template version"""
+    variant = "mobile" if mobile_optimized else "desktop"
+    template = report_templates.get_template(
+        f"reports/{REPORT_TEMPLATE_VERSION}/{variant}/{report_data['report_type']}.html"
+    )
+    return template.render(report=report_data)
+
+# Upper bound on individual flows listed in a desktop cash flow report
+CASHFLOW_REPORT_MAX_FLOWS = int(os.getenv("CASHFLOW_REPORT_MAX_FLOWS", "500"))
+
+def generate_liquidity_report(user_id: str, db: Session) -> Dict[str, Any]:
+    """Generate liquidity analysis report dataset (see project_report for the variants)"""
     user = db.query(User).filter(User.id == user_id).first()
-    accounts = db.query(BankAccount).filter(BankAccount.user_id == user_id, BankAccount.is_active == True).all()
-    
-    # Sort by mobile priority for mobile clients
-    if mobile_optimized:
-        accounts = sorted(accounts, key=lambda x: x.mobile_priority or 0, reverse=True)
+    accounts = AccountBalances.load(db, user_id, with_details=True)
     
     # Calculate total balance
-    total_balance_kzt = 0
-    account_data = []
-    
-    for account in accounts:
-        # Convert to KZT (mock exchange rates)
-        if account.currency == "USD":
-            balance_kzt = account.balance * 480
-        elif account.currency == "EUR":
-            balance_kzt = account.balance * 520
-        else:
-            balance_kzt = account.balance
-            
-        total_balance_kzt += balance_kzt
-        account_data.append({
-            "name": account.name,
-            "bank": account.bank,
-            "balance": account.balance,
-            "currency": account.currency,
-            "balance_kzt": balance_kzt,
-            "account_type": account.account_type,
-            "mobile_priority": getattr(account, 'mobile_priority', 0)
-        })
+    balances = accounts.aggregate(fx_rates.snapshot(db))
+    total_balance_kzt = balances.total
+    
+    account_data = [
+        {
+            "name": accounts.details["name"][i],
+            "bank": str(accounts.banks[accounts.bank_index[i]]),
+            "balance": float(accounts.balances[i]),
+            "currency": str(accounts.currencies[accounts.currency_index[i]]),
+            "balance_kzt": float(balances.balances_base[i]),
+            "account_type": accounts.details["account_type"][i],
+            "mobile_priority": accounts.details["mobile_priority"][i] or 0
+        }
+        for i in range(len(accounts))
+    ]
     
     # Get cash flows with mobile importance
     cash_flows = db.query(CashFlow).filter(
@@ -412,10 +1481,6 @@ def generate_liquidity_report(user_id: str, db: Session, mobile_optimized: bool
         CashFlow.planned_date <= datetime.utcnow() + timedelta(days=30)
     ).all()
     
-    if mobile_optimized:
-        # Prioritize important cash flows for mobile
-        cash_flows = sorted(cash_flows, key=lambda x: (x.mobile_important or False, abs(x.amount)), reverse=True)
-    
     inflows = sum([cf.amount for cf in cash_flows if cf.flow_type == "inflow"])
     outflows = sum([abs(cf.amount) for cf in cash_flows if cf.flow_type == "outflow"])
     net_cash_flow = inflows - outflows
@@ -447,7 +1512,6 @@ def generate_liquidity_report(user_id: str, db: Session, mobile_optimized: bool
     
     return {
         "report_type": "liquidity_daily",
-        "mobile_optimized": mobile_optimized,
         "generated_at": datetime.utcnow().isoformat(),
         "company_name": user.company,
         "user_name": user.name,
@@ -462,65 +1526,62 @@ def generate_liquidity_report(user_id: str, db: Session, mobile_optimized: bool
             "risk_level": risk_level,
             "net_cash_flow_30d": net_cash_flow
         },
-        "accounts": account_data[:3] if mobile_optimized else account_data,  # Limit for mobile
+        "accounts": account_data,
         "cash_flows": {
             "inflows": inflows,
             "outflows": outflows,
             "net": net_cash_flow
         },
-        "recommendations": recommendations[:2] if mobile_optimized else recommendations
+        "recommendations": recommendations
+    }
+
+def summarize_risks(risks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Overall risk assessment over a list of identified risks"""
+    high_risks = len([r for r in risks if r["level"] == "HIGH"])
+    medium_risks = len([r for r in risks if r["level"] == "MEDIUM"])
+    
+    if high_risks > 0:
+        overall_risk = "HIGH"
+    elif medium_risks > 1:
+        overall_risk = "MEDIUM"
+    else:
+        overall_risk = "LOW"
+    
+    return {
+        "overall_risk": overall_risk,
+        "total_risks": len(risks),
+        "high_risks": high_risks,
+        "medium_risks": medium_risks
     }
 
-def generate_risk_report(user_id: str, db: Session, mobile_optimized: bool = False) -> Dict[str, Any]:
-    """Generate risk analysis report with mobile optimization"""
+def generate_risk_report(user_id: str, db: Session) -> Dict[str, Any]:
+    """Generate risk analysis report dataset (see project_report for the variants)"""
     user = db.query(User).filter(User.id == user_id).first()
-    accounts = db.query(BankAccount).filter(BankAccount.user_id == user_id, BankAccount.is_active == True).all()
+    accounts = AccountBalances.load(db, user_id)
     
     # Risk analysis
     risks = []
     
-    # Currency concentration risk
-    currencies = {}
-    total_balance = 0
-    for account in accounts:
-        balance_kzt = account.balance
-        if account.currency == "USD":
-            balance_kzt = account.balance * 480
-        elif account.currency == "EUR":
-            balance_kzt = account.balance * 520
-        
-        currencies[account.currency] = currencies.get(account.currency, 0) + balance_kzt
-        total_balance += balance_kzt
+    # Currency and bank concentration risk from one aggregation pass
+    balances = accounts.aggregate(fx_rates.snapshot(db))
+    total_balance = balances.total
     
-    for currency, amount in currencies.items():
-        percentage = (amount / total_balance) * 100 if total_balance > 0 else 0
+    for currency, percentage in balances.currency_shares().items():
         if percentage > 70:
             risks.append({
                 "type": "currency_concentration",
                 "level": "HIGH",
-                "description": f"📱 Концентрация в валюте {currency}: {percentage:.1f}%" if mobile_optimized else f"Концентрация в валюте {currency}: {percentage:.1f}%",
+                "description": f"Концентрация в валюте {currency}: {percentage:.1f}%",
                 "recommendation": "Диверсифицируйте валютную структуру портфеля",
                 "mobile_priority": True
             })
     
-    # Bank concentration risk
-    banks = {}
-    for account in accounts:
-        balance_kzt = account.balance
-        if account.currency == "USD":
-            balance_kzt = account.balance * 480
-        elif account.currency == "EUR":
-            balance_kzt = account.balance * 520
-        
-        banks[account.bank] = banks.get(account.bank, 0) + balance_kzt
-    
-    for bank, amount in banks.items():
-        percentage = (amount / total_balance) * 100 if total_balance > 0 else 0
+    for bank, percentage in balances.bank_shares().items():
         if percentage > 60:
             risks.append({
                 "type": "bank_concentration",
                 "level": "MEDIUM",
-                "description": f"🏦 Концентрация в банке {bank}: {percentage:.1f}%" if mobile_optimized else f"Концентрация в банке {bank}: {percentage:.1f}%",
+                "description": f"Концентрация в банке {bank}: {percentage:.1f}%",
                 "recommendation": "Рассмотрите распределение средств между несколькими банками",
                 "mobile_priority": False
             })
@@ -530,29 +1591,13 @@ def generate_risk_report(user_id: str, db: Session, mobile_optimized: bool = Fal
         risks.append({
             "type": "liquidity",
             "level": "HIGH",
-            "description": "💧 Низкий уровень ликвидности для операционных нужд" if mobile_optimized else "Низкий уровень ликвидности для операционных нужд",
+            "description": "Низкий уровень ликвидности для операционных нужд",
             "recommendation": "Увеличьте резервы ликвидности или привлеките дополнительное финансирование",
             "mobile_priority": True
         })
     
-    if mobile_optimized:
-        # Sort and limit risks for mobile
-        risks = sorted(risks, key=lambda x: (x.get('mobile_priority', False), x['level'] == 'HIGH'), reverse=True)[:3]
-    
-    # Overall risk assessment
-    high_risks = len([r for r in risks if r["level"] == "HIGH"])
-    medium_risks = len([r for r in risks if r["level"] == "MEDIUM"])
-    
-    if high_risks > 0:
-        overall_risk = "HIGH"
-    elif medium_risks > 1:
-        overall_risk = "MEDIUM"
-    else:
-        overall_risk = "LOW"
-    
     return {
         "report_type": "risk_weekly",
-        "mobile_optimized": mobile_optimized,
         "generated_at": datetime.utcnow().isoformat(),
         "company_name": user.company,
         "user_name": user.name,
@@ -561,65 +1606,81 @@ def generate_risk_report(user_id: str, db: Session, mobile_optimized: bool = Fal
             "to": datetime.utcnow().date().isoformat()
         },
         "summary": {
-            "overall_risk": overall_risk,
-            "total_risks": len(risks),
-            "high_risks": high_risks,
-            "medium_risks": medium_risks,
+            **summarize_risks(risks),
             "total_balance_kzt": total_balance
         },
         "risk_breakdown": {
-            "currency_distribution": currencies,
-            "bank_distribution": banks
+            "currency_distribution": balances.by_currency,
+            "bank_distribution": balances.by_bank
         },
         "identified_risks": risks
     }
 
-def generate_cashflow_report(user_id: str, db: Session, mobile_optimized: bool = False) -> Dict[str, Any]:
-    """Generate cash flow report with mobile optimization"""
+def generate_cashflow_report(user_id: str, db: Session) -> Dict[str, Any]:
+    """Generate cash flow report dataset (see project_report for the variants)"""
     user = db.query(User).filter(User.id == user_id).first()
     
     # Get cash flows for the last month and next month
-    start_date = datetime.utcnow() - timedelta(days=30)
-    end_date = datetime.utcnow() + timedelta(days=30)
+    start_date = datetime.utcnow() - timedelta(days=REPORT_CASH_FLOW_WINDOW_DAYS)
+    end_date = datetime.utcnow() + timedelta(days=REPORT_CASH_FLOW_WINDOW_DAYS)
     
-    cash_flows = db.query(CashFlow).filter(
+    period_filter = (
         CashFlow.user_id == user_id,
         CashFlow.planned_date >= start_date,
         CashFlow.planned_date <= end_date
-    ).all()
+    )
     
-    if mobile_optimized:
-        # Prioritize important flows for mobile
-        cash_flows = sorted(cash_flows, key=lambda x: (x.mobile_important or False, abs(x.amount)), reverse=True)
+    # Weekly breakdown and totals aggregated in the database
+    week = func.date_trunc('week', CashFlow.planned_date).label("week")
+    weekly_rows = db.query(
+        week,
+        CashFlow.flow_type,
+        func.sum(CashFlow.amount).label("amount"),
+        func.sum(func.abs(CashFlow.amount)).label("abs_amount")
+    ).filter(*period_filter).group_by(week, CashFlow.flow_type).order_by(week).all()
     
-    # Group by week
+    # Weeks are ISO weeks (Monday start), labelled by their start date
     weekly_data = {}
     total_inflows = 0
     total_outflows = 0
     
-    for cf in cash_flows:
-        week = cf.planned_date.strftime("%Y-W%U")
-        if week not in weekly_data:
-            weekly_data[week] = {"inflows": 0, "outflows": 0, "net": 0}
+    for row in weekly_rows:
+        label = row.week.strftime("%Y-W%W")
+        bucket = weekly_data.setdefault(label, {"inflows": 0, "outflows": 0, "net": 0})
         
-        if cf.flow_type == "inflow":
-            weekly_data[week]["inflows"] += cf.amount
-            total_inflows += cf.amount
+        if row.flow_type == "inflow":
+            bucket["inflows"] += row.amount
+            total_inflows += row.amount
         else:
-            weekly_data[week]["outflows"] += abs(cf.amount)
-            total_outflows += abs(cf.amount)
+            bucket["outflows"] += row.abs_amount
+            total_outflows += row.abs_amount
         
-        weekly_data[week]["net"] = weekly_data[week]["inflows"] - weekly_data[week]["outflows"]
+        bucket["net"] = bucket["inflows"] - bucket["outflows"]
     
     # Calculate forecast
     net_cash_flow = total_inflows - total_outflows
     
-    # Limit cash flows for mobile
-    mobile_cash_flows = cash_flows[:5] if mobile_optimized else cash_flows
+    # Only the listed flows are loaded: capped list for desktop, top 5 important ones for mobile
+    cash_flows_query = db.query(CashFlow).filter(*period_filter)
+    listed_cash_flows = cash_flows_query.order_by(CashFlow.planned_date).limit(CASHFLOW_REPORT_MAX_FLOWS).all()
+    priority_cash_flows = cash_flows_query.order_by(
+        CashFlow.mobile_important.desc().nulls_last(),
+        func.abs(CashFlow.amount).desc()
+    ).limit(5).all()
+    
+    def flow_row(cf: CashFlow) -> Dict[str, Any]:
+        return {
+            "date": cf.planned_date.isoformat(),
+            "amount": cf.amount,
+            "type": cf.flow_type,
+            "description": cf.description,
+            "category": cf.category,
+            "probability": cf.probability,
+            "mobile_important": getattr(cf, 'mobile_important', False)
+        }
     
     return {
         "report_type": "cashflow_monthly",
-        "mobile_optimized": mobile_optimized,
         "generated_at": datetime.utcnow().isoformat(),
         "company_name": user.company,
         "user_name": user.name,
@@ -634,333 +1695,332 @@ def generate_cashflow_report(user_id: str, db: Session, mobile_optimized: bool =
             "weeks_analyzed": len(weekly_data)
         },
         "weekly_breakdown": weekly_data,
-        "cash_flows": [
-            {
-                "date": cf.planned_date.isoformat(),
-                "amount": cf.amount,
-                "type": cf.flow_type,
-                "description": cf.description,
-                "category": cf.category,
-                "probability": cf.probability,
-                "mobile_important": getattr(cf, 'mobile_important', False)
-            }
-            for cf in mobile_cash_flows
-        ]
+        "cash_flows": [flow_row(cf) for cf in listed_cash_flows],
+        "priority_cash_flows": [flow_row(cf) for cf in priority_cash_flows]
     }
 
-def create_mobile_optimized_report_html(report_data: Dict[str, Any]) -> str:
-    """Generate mobile-optimized HTML report"""
-    
-    mobile_html_template = """
-    <!DOCTYPE html>
-    <html lang="ru">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0, user-scalable=yes">
-        <title>{{ report_title }}</title>
-        <style>
-            * { box-sizing: border-box; }
-            body { 
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; 
-                margin: 0; 
-                padding: 10px; 
-                background: #f8fafc; 
-                font-size: 16px;
-                line-height: 1.5;
-            }
-            .container { 
-                max-width: 100%; 
-                margin: 0 auto; 
-                background: white; 
-                padding: 15px; 
-                border-radius: 12px; 
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1); 
-            }
-            .header { 
-                text-align: center; 
-                border-bottom: 2px solid #3B82F6; 
-                padding-bottom: 15px; 
-                margin-bottom: 20px; 
-            }
-            .logo { 
-                font-size: 18px; 
-                font-weight: bold; 
-                color: #3B82F6; 
-                margin-bottom: 5px; 
-            }
-            h1 { 
-                color: #1F2937; 
-                margin: 0; 
-                font-size: 20px;
-            }
-            h2 { 
-                color: #374151; 
-                border-left: 4px solid #3B82F6; 
-                padding-left: 10px; 
-                font-size: 18px;
-                margin-top: 25px;
-            }
-            .summary { 
-                display: grid; 
-                grid-template-columns: 1fr; 
-                gap: 10px; 
-                margin: 15px 0; 
-            }
-            @media (min-width: 480px) {
-                .summary { grid-template-columns: repeat(2, 1fr); }
-            }
-            .summary-card { 
-                background: #F8FAFC; 
-                padding: 15px; 
-                border-radius: 8px; 
-                border-left: 4px solid #10B981; 
-                min-height: 80px;
-            }
-            .summary-card.warning { border-left-color: #F59E0B; }
-            .summary-card.danger { border-left-color: #EF4444; }
-            .summary-card h3 { 
-                margin: 0 0 5px 0; 
-                font-size: 12px; 
-                color: #6B7280; 
-                text-transform: uppercase; 
-                font-weight: 600;
-            }
-            .summary-card .value { 
-                font-size: 20px; 
-                font-weight: bold; 
-                color: #1F2937; 
-            }
-            .mobile-table {
-                width: 100%;
-                margin: 15px 0;
-                background: white;
-                border-radius: 8px;
-                overflow: hidden;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            }
-            .mobile-table-row {
-                padding: 15px;
-                border-bottom: 1px solid #E5E7EB;
-                display: flex;
-                flex-direction: column;
-                gap: 5px;
-            }
-            .mobile-table-row:last-child {
-                border-bottom: none;
-            }
-            .mobile-table-header {
-                font-weight: 600;
-                color: #1F2937;
-                font-size: 16px;
-            }
-            .mobile-table-data {
-                color: #6B7280;
-                font-size: 14px;
-            }
-            .status-adequate { color: #059669; font-weight: bold; }
-            .status-low { color: #D97706; font-weight: bold; }
-            .status-critical { color: #DC2626; font-weight: bold; }
-            .status-excess { color: #7C3AED; font-weight: bold; }
-            .recommendations { 
-                background: #FEF3C7; 
-                padding: 15px; 
-                border-radius: 8px; 
-                border-left: 4px solid #F59E0B; 
-                margin-top: 20px;
-            }
-            .recommendations h3 { 
-                margin-top: 0; 
-                color: #92400E; 
-                font-size: 16px;
-            }
-            .recommendations ul { 
-                margin: 10px 0; 
-                padding-left: 20px;
-            }
-            .recommendations li { 
-                margin: 8px 0; 
-                line-height: 1.6;
-            }
-            .footer { 
-                text-align: center; 
-                margin-top: 25px; 
-                padding-top: 15px; 
-                border-top: 1px solid #E5E7EB; 
-                color: #6B7280; 
-                font-size: 12px; 
-            }
-            .date { 
-                color: #6B7280; 
-                font-size: 14px; 
-            }
-            .emoji {
-                margin-right: 5px;
-            }
-            @media (max-width: 480px) {
-                body { padding: 5px; font-size: 15px; }
-                .container { padding: 10px; }
-                h1 { font-size: 18px; }
-                h2 { font-size: 16px; }
-                .summary-card .value { font-size: 18px; }
-                .mobile-table-row { padding: 12px; }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div class="logo">💰 Financial AI Dashboard</div>
-                <h1>{{ report_title }}</h1>
-                <div class="date">{{ company_name }} • {{ generated_date }}</div>
-            </div>
-            
-            {{ content }}
-            
-            <div class="footer">
-                <p>📱 Мобильная версия отчета</p>
-                <p>© 2025 Financial AI Dashboard</p>
-            </div>
-        </div>
-    </body>
-    </html>
+REPORT_GENERATORS = {
+    "liquidity_daily": generate_liquidity_report,
+    "risk_weekly": generate_risk_report,
+    "cashflow_monthly": generate_cashflow_report,
+}
+
+# Marker prepended to risk descriptions in the mobile variant
+MOBILE_RISK_ICONS = {"currency_concentration": "📱", "bank_concentration": "🏦", "liquidity": "💧"}
+
+def project_report(dataset: Dict[str, Any], mobile_optimized: bool = False) -> Dict[str, Any]:
+    """Desktop or mobile view of a report dataset.
+
+    The mobile view only sorts and truncates the dataset, so both variants
+    of a run are rendered from one query pass.
     """
-    
-    if report_data["report_type"] == "liquidity_daily":
-        content = f"""
-        <div class="summary">
-            <div class="summary-card">
-                <h3><span class="emoji">💰</span>Общий баланс</h3>
-                <div class="value">{report_data['summary']['total_balance_kzt']:,.0f} ₸</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">🏦</span>Счета</h3>
-                <div class="value">{report_data['summary']['accounts_count']}</div>
-            </div>
-            <div class="summary-card {'warning' if report_data['summary']['liquidity_status'] in ['LOW', 'CRITICAL'] else ''}">
-                <h3><span class="emoji">📊</span>Ликвидность</h3>
-                <div class="value status-{report_data['summary']['liquidity_status'].lower()}">{report_data['summary']['liquidity_status']}</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">💸</span>Чистый поток</h3>
-                <div class="value">{report_data['summary']['net_cash_flow_30d']:,.0f} ₸</div>
-            </div>
-        </div>
-        
-        <h2>🏦 Банковские счета</h2>
-        <div class="mobile-table">
-            {chr(10).join([f'''
-            <div class="mobile-table-row">
-                <div class="mobile-table-header">{acc["name"]}</div>
-                <div class="mobile-table-data">{acc["bank"]} • {acc["balance"]:,.0f} {acc["currency"]}</div>
-                <div class="mobile-table-data">В тенге: {acc["balance_kzt"]:,.0f} ₸</div>
-            </div>''' for acc in report_data["accounts"]])}
-        </div>
-        
-        <h2>💸 Денежные потоки</h2>
-        <div class="summary">
-            <div class="summary-card">
-                <h3><span class="emoji">📈</span>Поступления</h3>
-                <div class="value">{report_data['cash_flows']['inflows']:,.0f} ₸</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">📉</span>Платежи</h3>
-                <div class="value">{report_data['cash_flows']['outflows']:,.0f} ₸</div>
-            </div>
-        </div>
-        """
-        
-        if report_data.get("recommendations"):
-            content += f"""
-            <div class="recommendations">
-                <h3>🎯 Рекомендации</h3>
-                <ul>
-                    {chr(10).join([f'<li>{rec}</li>' for rec in report_data["recommendations"]])}
-                </ul>
-            </div>
-            """
-        
-        report_title = "📊 Отчет по ликвидности"
-        
-    elif report_data["report_type"] == "risk_weekly":
-        content = f"""
-        <div class="summary">
-            <div class="summary-card {'danger' if report_data['summary']['overall_risk'] == 'HIGH' else 'warning' if report_data['summary']['overall_risk'] == 'MEDIUM' else ''}">
-                <h3><span class="emoji">⚠️</span>Общий риск</h3>
-                <div class="value">{report_data['summary']['overall_risk']}</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">📋</span>Всего рисков</h3>
-                <div class="value">{report_data['summary']['total_risks']}</div>
-            </div>
-            <div class="summary-card danger">
-                <h3><span class="emoji">🚨</span>Высоких</h3>
-                <div class="value">{report_data['summary']['high_risks']}</div>
-            </div>
-            <div class="summary-card warning">
-                <h3><span class="emoji">⚡</span>Средних</h3>
-                <div class="value">{report_data['summary']['medium_risks']}</div>
-            </div>
-        </div>
+    report = {"report_type": dataset["report_type"], "mobile_optimized": mobile_optimized}
+    report.update((key, value) for key, value in dataset.items() if key != "priority_cash_flows")
+    if not mobile_optimized:
+        return report
+    
+    if dataset["report_type"] == "liquidity_daily":
+        report["accounts"] = sorted(dataset["accounts"], key=lambda account: -account["mobile_priority"])[:3]
+        report["recommendations"] = dataset["recommendations"][:2]
+    elif dataset["report_type"] == "risk_weekly":
+        risks = sorted(
+            dataset["identified_risks"],
+            key=lambda x: (x.get('mobile_priority', False), x['level'] == 'HIGH'),
+            reverse=True
+        )[:3]
+        report["identified_risks"] = [
+            {**risk, "description": f"{MOBILE_RISK_ICONS.get(risk['type'], '⚠️')} {risk['description']}"}
+            for risk in risks
+        ]
+        report["summary"] = {**dataset["summary"], **summarize_risks(risks)}
+    elif dataset["report_type"] == "cashflow_monthly":
+        report["cash_flows"] = dataset["priority_cash_flows"]
+    return report
+
+# Report datasets are reused while the data they read is unchanged
+REPORT_DATASET_CACHE_SIZE = int(os.getenv("REPORT_DATASET_CACHE_SIZE", "256"))
+REPORT_DATASET_TTL_SECONDS = int(os.getenv("REPORT_DATASET_TTL_SECONDS", "900"))
+# Widest planned_date window any report generator reads (cashflow_monthly: +-30 days)
+REPORT_CASH_FLOW_WINDOW_DAYS = 30
+
+def table_digest(table_name: str, order_column):
+    """md5 over the text form of every selected row of table_name"""
+    return func.md5(func.string_agg(
+        literal_column(f"{table_name}::text"), aggregate_order_by(literal_column("','"), order_column)
+    ))
+
+def report_data_watermark(user_id: str, db: Session) -> tuple:
+    """Cheap fingerprint of everything a report dataset reads for a user.
+
+    Accounts and cash flows are hashed in SQL over their whole rows, so any
+    column edit counts, including bulk updates that skip updated_at and
+    cash_flows, which have no updated_at at all. Only cash flows inside the
+    generators' planned_date window (padded by a day) are hashed, so the cost
+    does not grow with the user's history. The FX table version covers rates
+    and the date covers the rolling windows.
+    """
+    accounts = db.query(
+        func.count(BankAccount.id), table_digest("bank_accounts", BankAccount.id)
+    ).filter(BankAccount.user_id == user_id).one()
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    window = timedelta(days=REPORT_CASH_FLOW_WINDOW_DAYS + 1)
+    cash_flows = db.query(
+        func.count(CashFlow.id), table_digest("cash_flows", CashFlow.id)
+    ).filter(
+        CashFlow.user_id == user_id,
+        CashFlow.planned_date >= today - window,
+        CashFlow.planned_date <= today + window + timedelta(days=1)
+    ).one()
+    user_updated_at = db.query(User.updated_at).filter(User.id == user_id).scalar()
+    return (
+        tuple(accounts),
+        tuple(cash_flows),
+        user_updated_at,
+        fx_rates.snapshot(db).version,
+        datetime.utcnow().date()
+    )
+
+class ReportDatasetCache:
+    """LRU of computed report datasets keyed by (user, report type, data watermark).
+
+    Desktop and mobile renders, manual and scheduled runs all project the
+    same cached dataset until the user's data changes or the TTL expires.
+    A dataset recomputed after the TTL under an unchanged watermark keeps
+    the previous generated_at, so its renders stay byte-identical and map
+    to the same stored artifact.
+    """
+
+    def __init__(self, max_entries: int = REPORT_DATASET_CACHE_SIZE, ttl_seconds: int = REPORT_DATASET_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (dataset, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, user_id: str, report_type: str, db: Session) -> Dict[str, Any]:
+        key = (str(user_id), report_type, report_data_watermark(user_id, db))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
         
-        <h2>⚠️ Выявленные риски</h2>
-        <div class="mobile-table">
-            {chr(10).join([f'''
-            <div class="mobile-table-row">
-                <div class="mobile-table-header">{risk["description"]}</div>
-                <div class="mobile-table-data">Уровень: <span class="status-{risk["level"].lower()}">{risk["level"]}</span></div>
-                <div class="mobile-table-data">{risk["recommendation"]}</div>
-            </div>''' for risk in report_data["identified_risks"]])}
-        </div>
+        dataset = REPORT_GENERATORS[report_type](str(user_id), db)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                # Same watermark, same data: keep the timestamp the templates render
+                dataset["generated_at"] = previous[0]["generated_at"]
+            # Older watermarks of the same report can no longer be hit
+            for stale_key in [k for k in self._entries if k[:2] == key[:2]]:
+                del self._entries[stale_key]
+            self._entries[key] = (dataset, time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return dataset
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+report_datasets = ReportDatasetCache()
+
+# Rendered reports are stored once per content hash, with precompressed copies
+REPORT_ARTIFACT_DIR = os.getenv("REPORT_ARTIFACT_DIR", "static/reports/artifacts")
+REPORT_RETENTION_DAYS = int(os.getenv("REPORT_RETENTION_DAYS", "90"))
+REPORT_QUOTA_MB_PER_TENANT = int(os.getenv("REPORT_QUOTA_MB_PER_TENANT", "200"))
+REPORT_EVICTION_INTERVAL_HOURS = int(os.getenv("REPORT_EVICTION_INTERVAL_HOURS", "6"))
+# Artifacts stored or reused more recently than this are never evicted, which
+# covers the gap between put() and the commit of the history row using it
+REPORT_ARTIFACT_GRACE_SECONDS = int(os.getenv("REPORT_ARTIFACT_GRACE_SECONDS", "3600"))
+
+class ReportArtifactStore:
+    """Content-addressed store for rendered report HTML.
+
+    An artifact lives at <root>/<hash[:2]>/<hash>.html next to .gz and (if
+    the brotli package is installed) .br copies, which the /static mount
+    serves directly. Identical renders map to the same files, so a report
+    whose data has not changed is not stored again.
+
+    put() and the delete phase of evict() hold an flock on <root>/.lock, so
+    they are serialized across threads and worker processes. put() touches
+    a reused artifact and evict() skips files touched within
+    REPORT_ARTIFACT_GRACE_SECONDS, so a hash handed out by put() is never
+    deleted before its history row is committed.
+    """
+
+    def __init__(self, root: str = REPORT_ARTIFACT_DIR):
+        self.root = Path(root)
+        self.encodings = [("gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            self.encodings.append(("br", lambda data: brotli.compress(data, mode=brotli.MODE_TEXT)))
+        self.stored = 0
+        self.deduplicated = 0
+        self.evicted = 0
+
+    def path_for(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / f"{content_hash}.html"
+
+    def url_for(self, content_hash: str) -> str:
+        return f"/{self.path_for(content_hash).as_posix()}"
+
+    def _locked(self):
+        """Exclusive flock shared by put() and evict() in every process"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.root / ".lock", "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file  # closing the file releases the lock
+
+    def put(self, html_content: str) -> tuple:
+        """Store a render; returns (content_hash, path, size)"""
+        data = html_content.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path_for(content_hash)
+        with self._locked():
+            if path.exists():
+                # Refresh the mtime so evict() keeps the artifact until the new history row is committed
+                os.utime(path)
+                self.deduplicated += 1
+                return content_hash, path, len(data)
+            
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Compressed copies first and the .html last, so an existing .html means a complete artifact
+            for suffix, compress in self.encodings:
+                self._write_atomic(path.with_name(f"{path.name}.{suffix}"), compress(data))
+            self._write_atomic(path, data)
+        self.stored += 1
+        return content_hash, path, len(data)
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def delete(self, content_hash: str):
+        path = self.path_for(content_hash)
+        for candidate in [path] + [path.with_name(f"{path.name}.{suffix}") for suffix, _ in self.encodings]:
+            candidate.unlink(missing_ok=True)
+        self.evicted += 1
+
+    def evict(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Apply per-tenant retention and size quotas; returns the number of artifacts deleted.
+
+        History rows outside retention, or beyond the tenant's quota counted
+        from the newest artifact, lose their artifact reference. Files are
+        deleted once no history row references their hash any more.
         """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=REPORT_RETENTION_DAYS)
+        quota_bytes = REPORT_QUOTA_MB_PER_TENANT * 1024 * 1024
         
-        report_title = "⚠️ Анализ рисков"
+        rows = db.query(
+            ReportHistory.user_id,
+            ReportHistory.content_hash,
+            func.max(ReportHistory.generated_at).label("last_generated"),
+            func.max(ReportHistory.file_size).label("size")
+        ).filter(
+            ReportHistory.content_hash.isnot(None)
+        ).group_by(
+            ReportHistory.user_id, ReportHistory.content_hash
+        ).order_by(
+            ReportHistory.user_id, func.max(ReportHistory.generated_at).desc()
+        ).all()
         
-    else:  # cashflow_monthly
-        content = f"""
-        <div class="summary">
-            <div class="summary-card">
-                <h3><span class="emoji">📈</span>Поступления</h3>
-                <div class="value">{report_data['summary']['total_inflows']:,.0f} ₸</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">📉</span>Платежи</h3>
-                <div class="value">{report_data['summary']['total_outflows']:,.0f} ₸</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">💰</span>Чистый поток</h3>
-                <div class="value">{report_data['summary']['net_cash_flow']:,.0f} ₸</div>
-            </div>
-            <div class="summary-card">
-                <h3><span class="emoji">📅</span>Недель</h3>
-                <div class="value">{report_data['summary']['weeks_analyzed']}</div>
-            </div>
-        </div>
+        released = []  # (user_id, content_hash)
+        used: Dict[Any, int] = {}
+        for row in rows:
+            used[row.user_id] = used.get(row.user_id, 0) + (row.size or 0)
+            if row.last_generated < cutoff or used[row.user_id] > quota_bytes:
+                released.append((row.user_id, row.content_hash))
+        if not released:
+            return 0
         
-        <h2>📊 Еженедельная разбивка</h2>
-        <div class="mobile-table">
-            {chr(10).join([f'''
-            <div class="mobile-table-row">
-                <div class="mobile-table-header">Неделя {week}</div>
-                <div class="mobile-table-data">Поступления: {data["inflows"]:,.0f} ₸</div>
-                <div class="mobile-table-data">Платежи: {data["outflows"]:,.0f} ₸</div>
-                <div class="mobile-table-data">Чистый поток: {data["net"]:,.0f} ₸</div>
-            </div>''' for week, data in report_data["weekly_breakdown"].items()])}
-        </div>
-        """
+        for user_id, content_hash in released:
+            db.query(ReportHistory).filter(
+                ReportHistory.user_id == user_id,
+                ReportHistory.content_hash == content_hash
+            ).update({ReportHistory.content_hash: None, ReportHistory.file_path: None}, synchronize_session=False)
+        db.commit()
         
-        report_title = "💸 Отчет по денежным потокам"
-    
-    template = Template(mobile_html_template)
-    
-    return template.render(
-        report_title=report_title,
-        company_name=report_data["company_name"],
-        generated_date=datetime.fromisoformat(report_data["generated_at"]).strftime("%d.%m.%Y %H:%M"),
-        content=content
-    )
+        hashes = {content_hash for _, content_hash in released}
+        deleted = 0
+        with self._locked():
+            still_referenced = {
+                content_hash for (content_hash,) in
+                db.query(ReportHistory.content_hash).filter(ReportHistory.content_hash.in_(hashes)).distinct()
+            }
+            grace_cutoff = time.time() - REPORT_ARTIFACT_GRACE_SECONDS
+            for content_hash in hashes - still_referenced:
+                try:
+                    if self.path_for(content_hash).stat().st_mtime > grace_cutoff:
+                        continue  # handed out by put() recently, its history row may not be committed yet
+                except FileNotFoundError:
+                    pass
+                self.delete(content_hash)
+                deleted += 1
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "evicted": self.evicted,
+            "encodings": [suffix for suffix, _ in self.encodings]
+        }
+
+report_artifacts = ReportArtifactStore()
+
+def create_mobile_optimized_report_html(report_data: Dict[str, Any]) -> str:
+    """Generate mobile-optimized HTML report"""
+    return render_report_html(report_data, mobile_optimized=True)
 
-async def generate_and_send_report(report_id: str, db: Session, mobile_optimized: bool = False):
-    """Generate and send report with mobile optimization"""
+def create_report_html(report_data: Dict[str, Any]) -> str:
+    """Generate full (desktop / email) HTML report"""
+    return render_report_html(report_data, mobile_optimized=False)
+
+def next_scheduled_run(schedule: Optional[str], now: datetime) -> Optional[datetime]:
+    """Next run time for a report schedule, None for manual or unknown schedules"""
+    if schedule == "daily_8am":
+        next_run = now.replace(hour=8, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return next_run
+    elif schedule == "weekly_monday":
+        return now + timedelta(days=7)
+    elif schedule == "monthly_1st":
+        next_run = now.replace(day=1) + timedelta(days=32)
+        return next_run.replace(day=1)
+    return None
+
+async def generate_and_send_report(report_id: str, db: Session, mobile_optimized: bool = False) -> Optional[str]:
+    """Generate and send report with mobile optimization.
+
+    Returns the id of the ReportHistory row on success, None otherwise.
+    """
+    results = await generate_report_variants(report_id, db, (mobile_optimized,))
+    return results.get(mobile_optimized)
+
+async def generate_report_variants(report_id: str, db: Session, variants: tuple = (False,)) -> Dict[bool, Optional[str]]:
+    """Generate the given variants (False - desktop, True - mobile) of a report and send them.
+
+    The report dataset comes from report_datasets (computed once per data
+    watermark) and each variant is a projection of it. Renders go to the
+    content-addressed report_artifacts store.
+    Returns {mobile_optimized: ReportHistory id or None on failure}.
+    """
+    results: Dict[bool, Optional[str]] = {variant: None for variant in variants}
+    report = None
+    dataset = None
     try:
         start_time = datetime.utcnow()
         
@@ -968,99 +2028,108 @@ async def generate_and_send_report(report_id: str, db: Session, mobile_optimized
         report = db.query(Report).filter(Report.id == report_id).first()
         if not report or not report.is_active:
             logger.warning(f"Report {report_id} not found or inactive")
-            return
+            return results
         
-        # Generate report data with mobile optimization
-        if report.report_type == "liquidity_daily":
-            report_data = generate_liquidity_report(str(report.user_id), db, mobile_optimized)
-        elif report.report_type == "risk_weekly":
-            report_data = generate_risk_report(str(report.user_id), db, mobile_optimized)
-        elif report.report_type == "cashflow_monthly":
-            report_data = generate_cashflow_report(str(report.user_id), db, mobile_optimized)
-        else:
+        if report.report_type not in REPORT_GENERATORS:
             logger.error(f"Unknown report type: {report.report_type}")
-            return
-        
-        # Generate HTML with mobile optimization
-        if mobile_optimized:
-            html_content = create_mobile_optimized_report_html(report_data)
-        else:
-            html_content = create_report_html(report_data)
-        
-        # Save report to file
-        reports_dir = Path("static/reports")
-        reports_dir.mkdir(exist_ok=True)
-        
-        suffix = "_mobile" if mobile_optimized else ""
-        file_name = f"{report.report_type}_{report.user_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}{suffix}.html"
-        file_path = reports_dir / file_name
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        file_size = os.path.getsize(file_path)
-        generation_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
-        
-        # Save to history
-        history = ReportHistory(
-            report_id=report.id,
-            user_id=report.user_id,
-            file_path=str(file_path),
-            file_size=file_size,
-            generation_time_ms=generation_time,
-            success=True,
-            mobile_optimized=mobile_optimized
-        )
-        db.add(history)
-        
-        # Update report
-        report.last_generated = datetime.utcnow()
-        report.generation_count += 1
-        
-        # Calculate next scheduled time
-        if report.schedule and report.schedule != "manual":
-            if report.schedule == "daily_8am":
-                next_run = datetime.utcnow().replace(hour=8, minute=0, second=0, microsecond=0)
-                if next_run <= datetime.utcnow():
-                    next_run += timedelta(days=1)
-                report.next_scheduled = next_run
-            elif report.schedule == "weekly_monday":
-                next_run = datetime.utcnow() + timedelta(days=7)
-                report.next_scheduled = next_run
-            elif report.schedule == "monthly_1st":
-                next_run = datetime.utcnow().replace(day=1) + timedelta(days=32)
-                next_run = next_run.replace(day=1)
-                report.next_scheduled = next_run
-        
-        db.commit()
-        
-        # Send email
-        if report.recipients:
-            subject = f"📱 Финансовый отчет: {report.name}" if mobile_optimized else f"Финансовый отчет: {report.name}"
-            send_email_with_attachment(
-                to_emails=report.recipients,
-                subject=subject,
-                html_content=html_content,
-                attachment_path=str(file_path)
-            )
-        
-        logger.info(f"Report {report_id} generated successfully in {generation_time}ms (mobile: {mobile_optimized})")
-        
+            return results
+        dataset = report_datasets.get_or_compute(str(report.user_id), report.report_type, db)
     except Exception as e:
         logger.error(f"Failed to generate report {report_id}: {str(e)}")
-        
-        # Save error to history
-        error_history = ReportHistory(
-            report_id=report_id,
-            user_id=report.user_id if report else None,
-            success=False,
-            error_message=str(e),
-            mobile_optimized=mobile_optimized
-        )
-        db.add(error_history)
-        db.commit()
+        failure = e
+    
+    for mobile_optimized in variants:
+        try:
+            if dataset is None:
+                raise failure
+            
+            # Generate HTML with mobile optimization
+            report_data = project_report(dataset, mobile_optimized)
+            if mobile_optimized:
+                html_content = create_mobile_optimized_report_html(report_data)
+            else:
+                html_content = create_report_html(report_data)
+            
+            # Store the render; an identical render (same data, same dataset timestamp) reuses the artifact
+            content_hash, file_path, file_size = report_artifacts.put(html_content)
+            generation_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+            
+            # Save to history
+            history = ReportHistory(
+                report_id=report.id,
+                user_id=report.user_id,
+                file_path=str(file_path),
+                file_size=file_size,
+                generation_time_ms=generation_time,
+                success=True,
+                mobile_optimized=mobile_optimized,
+                content_hash=content_hash
+            )
+            db.add(history)
+            
+            # Update report
+            report.last_generated = datetime.utcnow()
+            report.generation_count += 1
+            
+            # Calculate next scheduled time
+            if report.schedule and report.schedule != "manual":
+                next_run = next_scheduled_run(report.schedule, datetime.utcnow())
+                if next_run:
+                    report.next_scheduled = next_run
+            
+            db.commit()
+            
+            event_broker.publish(report.user_id, "report.ready", {
+                "report_id": str(report.id),
+                "name": report.name,
+                "report_type": report.report_type,
+                "history_id": str(history.id),
+                "file_url": report_artifacts.url_for(content_hash),
+                "mobile_optimized": mobile_optimized
+            })
+            
+            # Send email
+            if report.recipients:
+                subject = f"📱 Финансовый отчет: {report.name}" if mobile_optimized else f"Финансовый отчет: {report.name}"
+                suffix = "_mobile" if mobile_optimized else ""
+                send_email_with_attachment(
+                    to_emails=report.recipients,
+                    subject=subject,
+                    html_content=html_content,
+                    attachment_path=str(file_path),
+                    attachment_name=f"{report.report_type}_{datetime.utcnow().strftime('%Y%m%d')}{suffix}.html"
+                )
+            
+            logger.info(f"Report {report_id} generated successfully in {generation_time}ms (mobile: {mobile_optimized})")
+            results[mobile_optimized] = str(history.id)
+            
+        except Exception as e:
+            if dataset is not None:
+                logger.error(f"Failed to render report {report_id} (mobile: {mobile_optimized}): {str(e)}")
+            db.rollback()
+            
+            # Save error to history
+            error_history = ReportHistory(
+                report_id=report_id,
+                user_id=report.user_id if report else None,
+                success=False,
+                error_message=str(e),
+                mobile_optimized=mobile_optimized
+            )
+            db.add(error_history)
+            db.commit()
+            
+            if report:
+                event_broker.publish(report.user_id, "report.failed", {
+                    "report_id": str(report.id),
+                    "name": report.name,
+                    "mobile_optimized": mobile_optimized
+                })
+    
+    return results
 
-def send_email_with_attachment(to_emails: List[str], subject: str, html_content: str, attachment_path: str = None):
+def send_email_with_attachment(to_emails: List[str], subject: str, html_content: str, attachment_path: str = None,
+                               attachment_name: str = None):
     """Send email with HTML content and optional attachment"""
     if not SMTP_USERNAME or not SMTP_PASSWORD:
         logger.warning("SMTP credentials not configured, skipping email send")
@@ -1084,7 +2153,7 @@ def send_email_with_attachment(to_emails: List[str], subject: str, html_content:
                 encoders.encode_base64(part)
                 part.add_header(
                     'Content-Disposition',
-                    f'attachment; filename= {os.path.basename(attachment_path)}',
+                    f'attachment; filename= {attachment_name or os.path.basename(attachment_path)}',
                 )
                 msg.attach(part)
         
@@ -1101,6 +2170,158 @@ def send_email_with_attachment(to_emails: List[str], subject: str, html_content:
         logger.error(f"Failed to send email: {str(e)}")
         return False
 
+# =============================================================================
+# Report Jobs
+# =============================================================================
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "100"))
+REPORT_MAX_JOBS_PER_USER = int(os.getenv("REPORT_MAX_JOBS_PER_USER", "5"))
+REPORT_JOB_RETENTION_SECONDS = int(os.getenv("REPORT_JOB_RETENTION_SECONDS", "3600"))
+
+_report_loops = threading.local()
+
+def run_report_coroutine(coro):
+    """Run a coroutine on this thread's long-lived event loop (report worker threads)"""
+    loop = getattr(_report_loops, "loop", None)
+    if loop is None:
+        loop = _report_loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+class ReportQueueFull(Exception):
+    """The report queue (or the user's share of it) has no free slots"""
+
+    def __init__(self, message: str, per_user: bool = False):
+        super().__init__(message)
+        self.per_user = per_user
+
+class ReportJobQueue:
+    """Bounded queue of report generation jobs served by worker threads.
+
+    Each worker owns its event loop and opens a fresh Session per job, so
+    generation, rendering and the SMTP send never run in the API worker.
+    A report/variant that is already queued or running is not queued again;
+    the existing job is returned instead.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, max_queue: int = REPORT_QUEUE_SIZE,
+                 max_jobs_per_user: int = REPORT_MAX_JOBS_PER_USER,
+                 retention_seconds: int = REPORT_JOB_RETENTION_SECONDS):
+        self.workers = max(1, workers)
+        self.max_jobs_per_user = max_jobs_per_user
+        self.retention_seconds = retention_seconds
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active: Dict[tuple, str] = {}  # (report_id, mobile_optimized) -> job id
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.deduplicated = 0
+        self._threads = [
+            threading.Thread(target=self._run_worker, name=f"report-worker-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, report_id: str, user_id, mobile_optimized: bool = False) -> tuple:
+        """Queue a job; returns (job, created). Raises ReportQueueFull when saturated."""
+        key = (str(report_id), mobile_optimized)
+        with self._lock:
+            self._prune()
+            job_id = self._active.get(key)
+            if job_id is not None:
+                self.deduplicated += 1
+                return dict(self._jobs[job_id]), False
+            
+            user_jobs = sum(1 for active_id in self._active.values() if self._jobs[active_id]["user_id"] == str(user_id))
+            if user_jobs >= self.max_jobs_per_user:
+                self.rejected += 1
+                raise ReportQueueFull("Too many reports in progress", per_user=True)
+            
+            job = {
+                "id": str(uuid.uuid4()),
+                "report_id": str(report_id),
+                "user_id": str(user_id),
+                "mobile_optimized": mobile_optimized,
+                "status": "queued",
+                "history_id": None,
+                "error": None,
+                "queued_at": datetime.utcnow(),
+                "started_at": None,
+                "finished_at": None
+            }
+            try:
+                self._queue.put_nowait(job["id"])
+            except queue.Full:
+                self.rejected += 1
+                raise ReportQueueFull("Report queue is full")
+            self._jobs[job["id"]] = job
+            self._active[key] = job["id"]
+            return dict(job), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def _run_worker(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = datetime.utcnow()
+            
+            db = SessionLocal()
+            history_id, error = None, None
+            try:
+                history_id = run_report_coroutine(
+                    generate_and_send_report(job["report_id"], db, job["mobile_optimized"])
+                )
+                if history_id is None:
+                    error = "Report generation failed"
+            except Exception as e:
+                logger.error(f"Report job {job_id} crashed: {str(e)}")
+                error = str(e)
+            finally:
+                db.close()
+                self._queue.task_done()
+            
+            with self._lock:
+                job["status"] = "failed" if error else "completed"
+                job["history_id"] = history_id
+                job["error"] = error
+                job["finished_at"] = datetime.utcnow()
+                self._active.pop((job["report_id"], job["mobile_optimized"]), None)
+                if error:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for job_id in self._active.values() if self._jobs[job_id]["status"] == "running")
+            return {
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "running": running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "deduplicated": self.deduplicated
+            }
+
+report_jobs = ReportJobQueue()
+
 # =============================================================================
 # Demo User Creation with Mobile Data
 # =============================================================================
@@ -1369,6 +2590,15 @@ async def health_check():
         "status": "healthy", 
         "timestamp": datetime.utcnow().isoformat(),
         "mobile_support": True,
+        "dashboard_snapshots": dashboard_snapshots.stats(),
+        "live_events": event_broker.stats(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "login_limiter": login_limiter.stats(),
+        "session_writer": session_writer.stats(),
+        "report_jobs": report_jobs.stats(),
+        "report_datasets": report_datasets.stats(),
+        "report_artifacts": report_artifacts.stats(),
         "version": "2.0.0"
     }
 
@@ -1398,7 +2628,7 @@ async def register(user: UserCreate, request: Request, db: Session = Depends(get
     user_agent = request.headers.get("user-agent", "")
     is_mobile = detect_mobile_device(user_agent)
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         email=user.email,
         name=user.name,
@@ -1412,18 +2642,15 @@ async def register(user: UserCreate, request: Request, db: Session = Depends(get
     db.commit()
     db.refresh(db_user)
     
-    # Create user session
-    session_token = str(uuid.uuid4())
-    session = UserSession(
+    # Record the user session; written in bulk by the session writer
+    session_writer.record_session(
         user_id=db_user.id,
-        session_token=session_token,
+        session_token=str(uuid.uuid4()),
         user_agent=user_agent,
         ip_address=request.client.host,
         is_mobile=is_mobile,
         expires_at=datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    db.add(session)
-    db.commit()
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -1455,33 +2682,32 @@ async def register(user: UserCreate, request: Request, db: Session = Depends(get
 @app.post("/api/auth/login")
 async def login(user_data: UserLogin, request: Request, db: Session = Depends(get_db)):
     """Login user with mobile device detection"""
+    login_limiter.check(user_data.email)
     user = db.query(User).filter(User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    if not user or not await password_hasher.verify(user_data.password, user.hashed_password):
+        login_limiter.record_failure(user_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_limiter.reset(user_data.email)
     
     user_agent = request.headers.get("user-agent", "")
     is_mobile = detect_mobile_device(user_agent)
     
-    user.last_login = datetime.utcnow()
-    db.commit()
-    
-    # Create user session
-    session_token = str(uuid.uuid4())
-    session = UserSession(
+    # last_login and the session row are written in bulk by the session writer
+    login_at = datetime.utcnow()
+    session_writer.record_login(user.id, login_at)
+    session_writer.record_session(
         user_id=user.id,
-        session_token=session_token,
+        session_token=str(uuid.uuid4()),
         device_info=user_data.device_info,
         user_agent=user_agent,
         ip_address=request.client.host,
         is_mobile=is_mobile,
-        expires_at=datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expires_at=login_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    db.add(session)
-    db.commit()
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -1506,7 +2732,7 @@ async def login(user_data: UserLogin, request: Request, db: Session = Depends(ge
             timezone=user.timezone,
             language=user.language,
             created_at=user.created_at,
-            last_login=user.last_login
+            last_login=login_at
         )
     }
 
@@ -1515,132 +2741,203 @@ async def login(user_data: UserLogin, request: Request, db: Session = Depends(ge
 async def get_dashboard_data(
     request: Request,
     mobile: bool = False,
-    current_user: User = Depends(get_current_user),
+    since: Optional[str] = None,
+    current_user: AuthPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Get dashboard data with mobile optimization"""
+    """Get dashboard data with mobile optimization.
+
+    Served from the user's precomputed snapshot; only sections whose inputs
+    changed since the last request are queried again. Answers If-None-Match
+    with 304, and with ?since=<version> returns only the sections changed
+    after that version.
+    """
     user_agent = request.headers.get("user-agent", "")
     is_mobile_request = mobile or detect_mobile_device(user_agent)
     
-    # Get accounts with mobile priority ordering
-    accounts_query = db.query(BankAccount).filter(
-        BankAccount.user_id == current_user.id,
-        BankAccount.is_active == True
-    )
+    def build_accounts():
+        # Get accounts with mobile priority ordering
+        accounts_query = db.query(BankAccount).filter(
+            BankAccount.user_id == current_user.id,
+            BankAccount.is_active == True
+        )
+        
+        if is_mobile_request:
+            accounts = accounts_query.order_by(BankAccount.mobile_priority.desc().nulls_last()).limit(3).all()
+        else:
+            accounts = accounts_query.all()
+        
+        # Calculate total balance in KZT over all active accounts, not only the ones listed
+        balances = AccountBalances.load(db, current_user.id).aggregate(fx_rates.snapshot(db))
+        total_balance = balances.total
+        
+        # Mock liquidity status calculation
+        liquidity_status = "ADEQUATE"
+        if total_balance < 50000000:  # 50M KZT
+            liquidity_status = "LOW"
+        elif total_balance > 200000000:  # 200M KZT
+            liquidity_status = "EXCESS"
+            
+        risk_level = "LOW"
+        if total_balance < 30000000:  # 30M KZT
+            risk_level = "HIGH"
+        elif total_balance < 100000000:  # 100M KZT
+            risk_level = "MEDIUM"
+        
+        return {
+            "totalBalance": total_balance,
+            "currency": "KZT",
+            "liquidityStatus": liquidity_status,
+            "riskLevel": risk_level,
+            "accountsCount": len(accounts),
+            "accounts": [
+                {
+                    "id": str(acc.id),
+                    "name": acc.name,
+                    "bank": acc.bank,
+                    "balance": acc.balance,
+                    "currency": acc.currency,
+                    "account_type": acc.account_type,
+                    "mobile_priority": getattr(acc, 'mobile_priority', 0),
+                    "lastTransaction": acc.updated_at.isoformat()
+                }
+                for acc in accounts
+            ]
+        }
     
-    if is_mobile_request:
-        accounts = accounts_query.order_by(BankAccount.mobile_priority.desc().nulls_last()).limit(3).all()
-    else:
-        accounts = accounts_query.all()
-    
-    # Calculate total balance in KZT
-    total_balance = 0
-    for account in accounts:
-        if account.currency == "KZT":
-            total_balance += account.balance
-        elif account.currency == "USD":
-            total_balance += account.balance * 480  # Mock exchange rate
-        elif account.currency == "EUR":
-            total_balance += account.balance * 520  # Mock exchange rate
-    
-    # Get recent cash flows with mobile importance
-    cash_flows_query = db.query(CashFlow).filter(
-        CashFlow.user_id == current_user.id,
-        CashFlow.planned_date >= datetime.utcnow() - timedelta(days=7)
-    )
+    def build_cash_flows():
+        # Get recent cash flows with mobile importance
+        cash_flows_query = db.query(CashFlow).filter(
+            CashFlow.user_id == current_user.id,
+            CashFlow.planned_date >= datetime.utcnow() - timedelta(days=7)
+        )
+        
+        if is_mobile_request:
+            recent_cash_flows = cash_flows_query.filter(
+                CashFlow.mobile_important == True
+            ).order_by(CashFlow.planned_date.desc()).limit(5).all()
+        else:
+            recent_cash_flows = cash_flows_query.order_by(CashFlow.planned_date.desc()).limit(10).all()
+        
+        # Calculate cash flow for this month
+        current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cash_flow_this_month = db.query(func.sum(CashFlow.amount)).filter(
+            CashFlow.user_id == current_user.id,
+            CashFlow.planned_date >= current_month,
+            CashFlow.flow_type == "inflow"
+        ).scalar() or 0
+        
+        return {
+            "cashFlowThisMonth": cash_flow_this_month,
+            "recentCashFlows": [
+                {
+                    "id": str(cf.id),
+                    "amount": cf.amount,
+                    "description": cf.description,
+                    "type": cf.flow_type,
+                    "date": cf.planned_date.isoformat(),
+                    "mobile_important": getattr(cf, 'mobile_important', False)
+                }
+                for cf in recent_cash_flows
+            ]
+        }
     
-    if is_mobile_request:
-        recent_cash_flows = cash_flows_query.filter(
-            CashFlow.mobile_important == True
-        ).order_by(CashFlow.planned_date.desc()).limit(5).all()
-    else:
-        recent_cash_flows = cash_flows_query.order_by(CashFlow.planned_date.desc()).limit(10).all()
-    
-    # Calculate cash flow for this month
-    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    cash_flow_this_month = db.query(func.sum(CashFlow.amount)).filter(
-        CashFlow.user_id == current_user.id,
-        CashFlow.planned_date >= current_month,
-        CashFlow.flow_type == "inflow"
-    ).scalar() or 0
-    
-    # Mock liquidity status calculation
-    liquidity_status = "ADEQUATE"
-    if total_balance < 50000000:  # 50M KZT
-        liquidity_status = "LOW"
-    elif total_balance > 200000000:  # 200M KZT
-        liquidity_status = "EXCESS"
+    def build_notifications():
+        # Get notifications (prioritize unread for mobile)
+        notifications_query = db.query(Notification).filter(
+            Notification.user_id == current_user.id
+        )
         
-    risk_level = "LOW"
-    if total_balance < 30000000:  # 30M KZT
-        risk_level = "HIGH"
-    elif total_balance < 100000000:  # 100M KZT
-        risk_level = "MEDIUM"
+        if is_mobile_request:
+            notifications = notifications_query.filter(
+                Notification.is_read == False
+            ).order_by(Notification.created_at.desc()).limit(3).all()
+        else:
+            notifications = notifications_query.order_by(Notification.created_at.desc()).limit(5).all()
+        
+        return {
+            "notifications": [
+                {
+                    "id": str(n.id),
+                    "title": n.title,
+                    "message": n.message,
+                    "type": n.notification_type,
+                    "isRead": n.is_read,
+                    "createdAt": n.created_at.isoformat()
+                }
+                for n in notifications
+            ]
+        }
     
-    # Get notifications (prioritize unread for mobile)
-    notifications_query = db.query(Notification).filter(
-        Notification.user_id == current_user.id
-    )
+    snapshot = dashboard_snapshots.get(current_user.id, is_mobile_request, {
+        "accounts": build_accounts,
+        "cash_flows": build_cash_flows,
+        "notifications": build_notifications,
+    })
+    
+    headers = {
+        "ETag": snapshot["etag"],
+        "X-Dashboard-Version": snapshot["version_token"],
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization, User-Agent"
+    }
+    if etag_matches(request.headers.get("if-none-match"), snapshot["etag"]):
+        return Response(status_code=304, headers=headers)
     
-    if is_mobile_request:
-        notifications = notifications_query.filter(
-            Notification.is_read == False
-        ).order_by(Notification.created_at.desc()).limit(3).all()
+    changed = dashboard_snapshots.changed_sections(snapshot, since)
+    if changed is None:
+        content = dict(snapshot["document"])
     else:
-        notifications = notifications_query.order_by(Notification.created_at.desc()).limit(5).all()
+        content = {}
+        for section in changed:
+            content.update(snapshot["sections"][section])
     
-    return {
-        "totalBalance": total_balance,
-        "currency": "KZT",
-        "cashFlowThisMonth": cash_flow_this_month,
-        "liquidityStatus": liquidity_status,
-        "riskLevel": risk_level,
-        "accountsCount": len(accounts),
-        "lastUpdated": datetime.utcnow().isoformat(),
+    content.update({
+        "lastUpdated": snapshot["built_at"].isoformat(),
         "isMobile": is_mobile_request,
-        "accounts": [
-            {
-                "id": str(acc.id),
-                "name": acc.name,
-                "bank": acc.bank,
-                "balance": acc.balance,
-                "currency": acc.currency,
-                "account_type": acc.account_type,
-                "mobile_priority": getattr(acc, 'mobile_priority', 0),
-                "lastTransaction": acc.updated_at.isoformat()
-            }
-            for acc in accounts
-        ],
-        "recentCashFlows": [
-            {
-                "id": str(cf.id),
-                "amount": cf.amount,
-                "description": cf.description,
-                "type": cf.flow_type,
-                "date": cf.planned_date.isoformat(),
-                "mobile_important": getattr(cf, 'mobile_important', False)
-            }
-            for cf in recent_cash_flows
-        ],
-        "notifications": [
-            {
-                "id": str(n.id),
-                "title": n.title,
-                "message": n.message,
-                "type": n.notification_type,
-                "isRead": n.is_read,
-                "createdAt": n.created_at.isoformat()
-            }
-            for n in notifications
-        ]
-    }
+        "version": snapshot["version_token"],
+        "delta": changed is not None,
+        "changedSections": changed if changed is not None else list(snapshot["sections"])
+    })
+    return JSONResponse(content=content, headers=headers)
+
+# Live updates channel (Server-Sent Events)
+@app.get("/api/events")
+async def live_events(request: Request, token: Optional[str] = None, last_event_id: Optional[str] = None):
+    """Push channel for dashboard changes, notifications, rates and finished reports.
+
+    EventSource cannot send an Authorization header, so the token may also be
+    passed as ?token=. Reconnecting clients resume from Last-Event-ID.
+    """
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # The session is only needed for authentication, not for the stream's lifetime
+    db = SessionLocal()
+    try:
+        user_id = str(authenticate_token(token, db).id)
+    finally:
+        db.close()
+    
+    return StreamingResponse(
+        event_broker.stream(user_id, request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Mobile-optimized AI consultation endpoint
 @app.post("/api/ai/consult")
 async def create_ai_consultation(
     consultation: AIConsultationCreate,
     request: Request,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Create AI consultation with mobile device detection"""
@@ -1691,7 +2988,7 @@ async def create_ai_consultation(
 async def create_report(
     report: MobileOptimizedReportCreate,
     request: Request,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Create a new report with mobile optimization"""
@@ -1751,13 +3048,12 @@ async def create_report(
 @app.post("/api/reports/{report_id}/generate")
 async def generate_report(
     report_id: str,
-    mobile: bool = False,
-    background_tasks: BackgroundTasks,
     request: Request,
-    current_user: User = Depends(get_current_user),
+    mobile: bool = False,
+    current_user: AuthPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Generate report manually with mobile optimization"""
+    """Queue manual report generation with mobile optimization"""
     report = db.query(Report).filter(
         Report.id == report_id,
         Report.user_id == current_user.id
@@ -1770,43 +3066,125 @@ async def generate_report(
     is_mobile_request = mobile or detect_mobile_device(user_agent)
     mobile_optimized = is_mobile_request and report.mobile_enabled
     
-    # Run report generation in background
-    background_tasks.add_task(generate_and_send_report, report_id, db, mobile_optimized)
+    # Hand off to the report workers; they use their own sessions
+    try:
+        job, created = report_jobs.submit(report_id, current_user.id, mobile_optimized)
+    except ReportQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS if e.per_user else status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "30"},
+        )
     
-    return {
-        "message": "Report generation started", 
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+        "message": "Report generation started" if created else "Report generation already in progress",
         "report_id": report_id,
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/reports/jobs/{job['id']}",
         "mobile_optimized": mobile_optimized
+    })
+
+@app.get("/api/reports/jobs/{job_id}")
+async def get_report_job(job_id: str, current_user: AuthPrincipal = Depends(get_current_principal)):
+    """Status of a queued report generation job"""
+    job = report_jobs.get(job_id)
+    if not job or job["user_id"] != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Report job not found")
+    
+    return {
+        "job_id": job["id"],
+        "report_id": job["report_id"],
+        "status": job["status"],
+        "mobile_optimized": job["mobile_optimized"],
+        "history_id": job["history_id"],
+        "error": job["error"],
+        "queued_at": job["queued_at"].isoformat(),
+        "started_at": job["started_at"].isoformat() if job["started_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None
     }
 
 # Scheduled report generation (run in background)
-def check_and_run_scheduled_reports():
-    """Check for scheduled reports and run them"""
+REPORT_SCHEDULER_PARALLELISM = int(os.getenv("REPORT_SCHEDULER_PARALLELISM", "4"))
+REPORT_SCHEDULER_BATCH_SIZE = int(os.getenv("REPORT_SCHEDULER_BATCH_SIZE", "20"))
+# A claimed report that fails or whose worker dies is retried after the lease
+REPORT_CLAIM_LEASE_MINUTES = int(os.getenv("REPORT_CLAIM_LEASE_MINUTES", "60"))
+scheduled_report_executor = ThreadPoolExecutor(max_workers=REPORT_SCHEDULER_PARALLELISM, thread_name_prefix="scheduled-report")
+
+def claim_due_reports(db: Session, now: datetime, limit: int) -> List[tuple]:
+    """Claim a batch of due reports; returns [(report_id, name, mobile_enabled)].
+
+    Rows are locked with FOR UPDATE SKIP LOCKED and next_scheduled is set to
+    a short lease before the commit, so concurrent schedulers (other processes
+    or overlapping runs) never pick the same report. Only a successful run
+    advances next_scheduled to the next period; a failed one is retried once
+    the lease expires.
+    """
+    due_reports = db.query(Report).filter(
+        Report.is_active == True,
+        Report.next_scheduled <= now,
+        Report.schedule != "manual"
+    ).order_by(Report.next_scheduled).limit(limit).with_for_update(skip_locked=True).all()
+    
+    claimed = []
+    for report in due_reports:
+        report.next_scheduled = now + timedelta(minutes=REPORT_CLAIM_LEASE_MINUTES)
+        claimed.append((str(report.id), report.name, bool(report.mobile_enabled)))
+    db.commit()
+    return claimed
+
+def run_claimed_report(report_id: str, mobile_enabled: bool):
+    """Generate a claimed report (both variants when mobile is enabled) with its own session"""
     db = SessionLocal()
     try:
-        now = datetime.utcnow()
-        scheduled_reports = db.query(Report).filter(
-            Report.is_active == True,
-            Report.next_scheduled <= now,
-            Report.schedule != "manual"
-        ).all()
+        variants = (False, True) if mobile_enabled else (False,)
+        run_report_coroutine(generate_report_variants(report_id, db, variants))
+    except Exception as e:
+        logger.error(f"Scheduled report {report_id} failed: {str(e)}")
+    finally:
+        db.close()
+
+def check_and_run_scheduled_reports():
+    """Claim due reports batch by batch and generate them in parallel"""
+    started = time.monotonic()
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            claimed = claim_due_reports(db, datetime.utcnow(), REPORT_SCHEDULER_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Error in scheduled report check: {str(e)}")
+            break
+        finally:
+            db.close()
         
-        for report in scheduled_reports:
-            logger.info(f"Running scheduled report: {report.name} (ID: {report.id})")
-            
-            # Generate both regular and mobile versions if mobile is enabled
-            asyncio.run(generate_and_send_report(str(report.id), db, False))
-            
-            if report.mobile_enabled:
-                asyncio.run(generate_and_send_report(str(report.id), db, True))
-            
+        if not claimed:
+            break
+        
+        for report_id, name, _ in claimed:
+            logger.info(f"Running scheduled report: {name} (ID: {report_id})")
+        # Wait for the batch so at most one batch is claimed but not yet generated
+        list(scheduled_report_executor.map(lambda item: run_claimed_report(item[0], item[2]), claimed))
+        total += len(claimed)
+    
+    if total:
+        logger.info(f"Generated {total} scheduled reports in {time.monotonic() - started:.1f}s")
+
+def evict_report_artifacts():
+    """Apply report retention and per-tenant quotas"""
+    db = SessionLocal()
+    try:
+        deleted = report_artifacts.evict(db)
+        if deleted:
+            logger.info(f"Evicted {deleted} report artifacts")
     except Exception as e:
-        logger.error(f"Error in scheduled report check: {str(e)}")
+        logger.error(f"Error evicting report artifacts: {str(e)}")
     finally:
         db.close()
 
 # Schedule the report checker to run every hour
 schedule.every().hour.do(check_and_run_scheduled_reports)
+schedule.every(REPORT_EVICTION_INTERVAL_HOURS).hours.do(evict_report_artifacts)
 
 def run_scheduler():
     """Run the scheduler in a separate thread"""
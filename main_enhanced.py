@@ -4,11 +4,13 @@ from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, Re
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, JSON, Integer, Float, func
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse, Response
+from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, JSON, Integer, Float, Index, func, and_, or_, text, event, select, delete, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
@@ -18,7 +20,9 @@ import uuid
 import os
 import httpx
 import asyncio
+import anyio
 import json
+import hashlib
 import logging
 from pathlib import Path
 import smtplib
@@ -27,15 +31,18 @@ from email.mime.multipart import MIMEMultipart
 import schedule
 import threading
 import time
+import weakref
 import random
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from jinja2 import Template
 import xml.etree.ElementTree as ET
 import feedparser
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
 import requests
 from bs4 import BeautifulSoup
 import re
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
 # Настройка логирования
 logging.basicConfig(
@@ -59,17 +66,71 @@ engine = create_engine(DATABASE_URL, echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Асинхронный движок (asyncpg) для обработчиков запросов: запросы к БД не блокируют event loop
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "10"))
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_pre_ping=True
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Настройки API
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 NBK_API_URL = "https://www.nationalbank.kz/rss/get_rates.cfm"  # НБ РК API
 NEWS_API_KEY = os.getenv("NEWS_API_KEY", "")
 
-# Инициализация OpenAI
-if OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    client = None
-    logger.warning("OpenAI API key not configured")
+# Настройки параллельной загрузки RSS
+RSS_FETCH_MAX_CONNECTIONS = int(os.getenv("RSS_FETCH_MAX_CONNECTIONS", "50"))
+RSS_FETCH_PER_HOST_LIMIT = int(os.getenv("RSS_FETCH_PER_HOST_LIMIT", "4"))
+RSS_FETCH_TIMEOUT_SECONDS = float(os.getenv("RSS_FETCH_TIMEOUT_SECONDS", "20"))
+RSS_FETCH_DEADLINE_SECONDS = float(os.getenv("RSS_FETCH_DEADLINE_SECONDS", "60"))
+
+# Общий кеш содержимого RSS лент (одна загрузка URL на всех подписчиков)
+RSS_SHARED_CACHE_MAX_URLS = int(os.getenv("RSS_SHARED_CACHE_MAX_URLS", "2000"))
+RSS_SHARED_CACHE_MAX_ENTRIES = 15  # максимум статей на канал (priority 5 * 3)
+
+# Кеш AI анализа статей. Версию промпта нужно менять при изменении промпта
+# или формата ответа - это автоматически инвалидирует кеш.
+RSS_ANALYSIS_PROMPT_VERSION = "rss-analysis-v1"
+AI_ANALYSIS_CACHE_MEMORY_SIZE = int(os.getenv("AI_ANALYSIS_CACHE_MEMORY_SIZE", "5000"))
+
+# Таблица валютных курсов. Резервные курсы используются до первой загрузки
+# и для валют, которых нет в представлении latest_exchange_rates
+FX_FALLBACK_RATES = {"USD": 480.5, "EUR": 520.3}
+FX_RATE_TABLE_MAX_AGE_SECONDS = int(os.getenv("FX_RATE_TABLE_MAX_AGE_SECONDS", "300"))
+
+# Максимальный возраст снимка дашборда пользователя
+DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS", "60"))
+
+# Кеш ответов AI консультанта (на пользователя, по нормализованному вопросу)
+CONSULTATION_CACHE_MAX_ENTRIES = int(os.getenv("CONSULTATION_CACHE_MAX_ENTRIES", "2000"))
+CONSULTATION_CACHE_TTL_SECONDS = int(os.getenv("CONSULTATION_CACHE_TTL_SECONDS", "3600"))
+
+# Пакетный AI анализ статей (несколько статей в одном запросе к модели)
+RSS_BATCH_MAX_ARTICLES = int(os.getenv("RSS_BATCH_MAX_ARTICLES", "10"))
+RSS_BATCH_PROMPT_TOKEN_BUDGET = int(os.getenv("RSS_BATCH_PROMPT_TOKEN_BUDGET", "4000"))
+RSS_BATCH_OUTPUT_TOKENS_PER_ARTICLE = 250
+RSS_BATCH_MAX_CONTENT_CHARS = 2000
+RSS_ANALYSIS_MODEL_CONTEXT_TOKENS = 8192  # gpt-4
+
+# Интервалы обновления RSS каналов по fetch_frequency
+RSS_FETCH_INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+# Настройки асинхронного шлюза к OpenAI
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY_SECONDS = 0.5
+LLM_RETRY_MAX_DELAY_SECONDS = 8.0
 
 # Хеширование паролей
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -162,6 +223,8 @@ class NewsArticle(Base):
     risk_level = Column(String)  # low, medium, high
     relevance_score = Column(Float, default=0.5)  # AI оценка релевантности
     ai_tags = Column(JSON)  # AI теги для категоризации
+    fingerprint = Column(String(64), unique=True, index=True)  # дедупликация: нормализованный URL или хеш текста
+    content_hash = Column(String(64))  # sha256 нормализованных заголовка и текста
     created_at = Column(DateTime, default=datetime.utcnow)
 
 # НОВАЯ МОДЕЛЬ: Пользовательские RSS каналы
@@ -185,6 +248,11 @@ class UserRSSFeed(Base):
     articles_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Выборка каналов, которые пора обновить (см. EnhancedNewsService.get_due_feeds)
+        Index('idx_user_rss_feeds_due', 'is_active', 'fetch_frequency', 'last_fetched'),
+    )
 
 # НОВАЯ МОДЕЛЬ: Анализ RSS контента
 class RSSContentAnalysis(Base):
@@ -234,6 +302,27 @@ class Report(Base):
     rss_feeds_included = Column(JSON)  # НОВОЕ: RSS каналы включенные в отчет
     generated_at = Column(DateTime, default=datetime.utcnow)
     
+# Валидаторы условных HTTP запросов (ETag / Last-Modified / хеш содержимого)
+class HTTPValidatorCache(Base):
+    __tablename__ = "http_validator_cache"
+    
+    url = Column(String, primary_key=True)
+    etag = Column(String)
+    last_modified = Column(String)
+    content_hash = Column(String(64))  # sha256 последнего обработанного ответа
+    checked_at = Column(DateTime, default=datetime.utcnow)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+# Кеш результатов AI анализа статей по хешу содержимого
+class AIAnalysisCacheEntry(Base):
+    __tablename__ = "ai_analysis_cache"
+    
+    content_hash = Column(String(64), primary_key=True)  # NewsArticle.content_hash
+    prompt_version = Column(String(50), primary_key=True)
+    result = Column(JSON, nullable=False)
+    processing_time_ms = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class WebhookLog(Base):
     __tablename__ = "webhook_logs"
     
@@ -321,12 +410,182 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+async def run_with_session(db, fn, *args):
+    """Выполнить синхронную функцию fn(session, *args) с любой сессией.
+
+    Для AsyncSession код выполняется через run_sync: ORM запросы идут через
+    asyncpg и не блокируют event loop. Без сессии открывается своя асинхронная.
+    """
+    if db is None:
+        async with AsyncSessionLocal() as own_db:
+            return await own_db.run_sync(fn, *args)
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return fn(db, *args)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt выполняется в отдельном ограниченном пуле, чтобы логин не блокировал event loop.
+# Backend bcrypt отпускает GIL, поэтому потоки хешируют параллельно на всех ядрах.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_LIMITER_MAX_ACCOUNTS = int(os.getenv("LOGIN_LIMITER_MAX_ACCOUNTS", "100000"))
+
+class PasswordHasher:
+    """Ограниченный пул для bcrypt hash/verify с метриками глубины очереди.
+
+    Если все воркеры заняты и уже ждут PASSWORD_HASH_MAX_QUEUE вызовов,
+    новые отклоняются с 503, а не копятся в очереди.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.peak_queued = 0
+        self._wait_total = 0.0
+        self._work_total = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(pwd_context.verify, plain_password, hashed_password)
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Сервис авторизации перегружен, повторите попытку",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self.peak_queued = max(self.peak_queued, self._pending - self._running)
+        submitted_at = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, submitted_at, func, args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _timed(self, submitted_at: float, func, args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self._wait_total += started_at - submitted_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self._work_total += time.perf_counter() - started_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_queue": self.max_queue,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total / self.completed * 1000, 2) if self.completed else 0.0,
+                "avg_hash_ms": round(self._work_total / self.completed * 1000, 2) if self.completed else 0.0
+            }
+
+class LoginRateLimiter:
+    """Скользящее окно неудачных попыток входа по аккаунту (ключ - email).
+
+    Проверяется до любой работы bcrypt, чтобы один аккаунт не мог
+    забить пул хеширования.
+    """
+
+    def __init__(self, max_attempts: int = LOGIN_MAX_ATTEMPTS, window_seconds: int = LOGIN_WINDOW_SECONDS,
+                 max_accounts: int = LOGIN_LIMITER_MAX_ACCOUNTS):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self.max_accounts = max_accounts
+        self._failures: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.blocked = 0
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return email.strip().lower()
+
+    def check(self, email: str):
+        """429 с Retry-After, пока аккаунт превышает лимит попыток"""
+        key = self._key(email)
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key)
+            if not failures:
+                return
+            while failures and failures[0] <= now - self.window_seconds:
+                failures.popleft()
+            if not failures:
+                del self._failures[key]
+                return
+            if len(failures) < self.max_attempts:
+                return
+            self.blocked += 1
+            retry_after = int(failures[0] + self.window_seconds - now) + 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много попыток входа, попробуйте позже",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def record_failure(self, email: str):
+        key = self._key(email)
+        with self._lock:
+            failures = self._failures.get(key)
+            if failures is None:
+                failures = self._failures[key] = deque(maxlen=self.max_attempts)
+            failures.append(time.monotonic())
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_accounts:
+                self._failures.popitem(last=False)
+
+    def reset(self, email: str):
+        with self._lock:
+            self._failures.pop(self._key(email), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked_accounts": len(self._failures),
+                "blocked": self.blocked,
+                "max_attempts": self.max_attempts,
+                "window_seconds": self.window_seconds
+            }
+
+password_hasher = PasswordHasher()
+login_limiter = LoginRateLimiter()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -352,6 +611,137 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
+# Кеш проверенных токенов: аутентифицированные запросы не обращаются к таблице users.
+# TTL ограничивает, сколько другие процессы-воркеры видят старые данные пользователя.
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+
+class AuthPrincipal:
+    """Облегченный аутентифицированный пользователь, построенный из строки users"""
+    __slots__ = ("id", "email", "name", "role", "company", "subscription_plan", "is_active")
+
+    def __init__(self, user: "User"):
+        for attribute in self.__slots__:
+            setattr(self, attribute, getattr(user, attribute))
+
+class AuthPrincipalCache:
+    """Ограниченный LRU кеш: проверенный токен -> principal.
+
+    Запись живет AUTH_CACHE_TTL_SECONDS или до истечения самого токена (что
+    раньше) и удаляется сразу при изменении строки пользователя. Сброс
+    действует только в текущем процессе: при нескольких воркерах uvicorn или
+    gunicorn остальные видят отключенного или измененного пользователя еще
+    до AUTH_CACHE_TTL_SECONDS, поэтому TTL должен быть коротким.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl_seconds: int = AUTH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[AuthPrincipal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: AuthPrincipal, token_expires_at: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        user_key = str(principal.id)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            self._tokens_by_user.setdefault(user_key, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, token: str):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(str(principal.id))
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[str(principal.id)]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(str(user_id), ())):
+                self._drop(token)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+auth_cache = AuthPrincipalCache()
+
+@event.listens_for(Session, "after_flush")
+def collect_auth_invalidations(session, flush_context):
+    changed = [obj for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)]
+    for user in changed:
+        # Сбрасываем сразу и еще раз после commit, чтобы запрос, совпавший с commit, не закешировал старые данные
+        auth_cache.invalidate_user(user.id)
+        session.info.setdefault("auth_invalidations", set()).add(str(user.id))
+
+@event.listens_for(Session, "after_commit")
+def apply_auth_invalidations(session):
+    for user_id in session.info.pop("auth_invalidations", ()):
+        auth_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def discard_auth_invalidations(session):
+    session.info.pop("auth_invalidations", None)
+
+def authenticate_token(token: str, db: Session) -> AuthPrincipal:
+    """Проверка bearer токена, principal по возможности берется из кеша"""
+    principal = auth_cache.get(token)
+    if principal is not None:
+        return principal
+    return load_principal(db, token)
+
+def load_principal(db: Session, token: str) -> AuthPrincipal:
+    """Разбор токена и загрузка пользователя в обход кеша; результат кладется в кеш"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        email: str = payload.get("sub")
+        if email is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user = db.query(User).filter(User.email == email).first()
+    if user is None or user.is_active is False:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    principal = AuthPrincipal(user)
+    auth_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+async def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security),
+                                db: AsyncSession = Depends(get_async_db)) -> AuthPrincipal:
+    """Аутентифицированный principal; при попадании в кеш БД не используется"""
+    principal = auth_cache.get(credentials.credentials)
+    if principal is not None:
+        return principal
+    return await db.run_sync(load_principal, credentials.credentials)
+
 def validate_rss_url(url: str) -> bool:
     """Валидация RSS URL"""
     try:
@@ -365,6 +755,1010 @@ def validate_rss_url(url: str) -> bool:
     except:
         return False
 
+# =============================================================================
+# Асинхронный шлюз к OpenAI
+# =============================================================================
+
+class LLMGateway:
+    """Неблокирующий доступ к OpenAI для async обработчиков.
+
+    Использует AsyncOpenAI с пулом соединений, ограничивает число
+    одновременных запросов семафором, применяет таймаут и повторяет
+    временные ошибки (429, 5xx, таймауты, обрывы соединения) с
+    экспоненциальной задержкой и случайным разбросом.
+
+    Ресурсы создаются отдельно для каждого event loop: API работает в цикле
+    uvicorn, а задачи планировщика - в asyncio.run() своего потока. Пул
+    соединений loop закрывается через aclose() до завершения loop: для
+    uvicorn - в обработчике shutdown, для задач - в run_scheduled_job.
+    """
+
+    RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, asyncio.TimeoutError)
+
+    def __init__(self, api_key: str,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._loop_resources = weakref.WeakKeyDictionary()
+
+    def _resources(self):
+        loop = asyncio.get_running_loop()
+        resources = self._loop_resources.get(loop)
+        if resources is None:
+            http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 2,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            openai_client = AsyncOpenAI(
+                api_key=self.api_key,
+                http_client=http_client,
+                timeout=self.timeout,
+                max_retries=0  # повторы выполняет шлюз
+            )
+            resources = (openai_client, asyncio.Semaphore(self.max_concurrency))
+            self._loop_resources[loop] = resources
+        return resources
+
+    async def aclose(self):
+        """Закрытие клиента и пула соединений текущего event loop"""
+        resources = self._loop_resources.pop(asyncio.get_running_loop(), None)
+        if resources is not None:
+            await resources[0].close()  # закрывает и переданный httpx.AsyncClient
+
+    def _retry_delay(self, attempt: int) -> float:
+        delay = min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def chat(self, messages: List[Dict[str, str]], max_tokens: int,
+                   temperature: float, model: str = "gpt-4") -> str:
+        """Chat completion, возвращает текст ответа"""
+        openai_client, semaphore = self._resources()
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    response = await asyncio.wait_for(
+                        openai_client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature
+                        ),
+                        timeout=self.timeout
+                    )
+                return response.choices[0].message.content
+            except self.RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"LLM request failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def stream_chat(self, messages: List[Dict[str, str]], max_tokens: int,
+                          temperature: float, model: str = "gpt-4"):
+        """Потоковый chat completion, отдает фрагменты текста по мере генерации.
+
+        Повтор возможен только до получения первого фрагмента - после этого
+        часть ответа уже отправлена клиенту.
+        """
+        openai_client, semaphore = self._resources()
+        
+        async with semaphore:
+            stream = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    stream = await asyncio.wait_for(
+                        openai_client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            stream=True
+                        ),
+                        timeout=self.timeout
+                    )
+                    break
+                except self.RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._retry_delay(attempt)
+                    logger.warning(f"LLM stream failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+if OPENAI_API_KEY:
+    llm_gateway = LLMGateway(OPENAI_API_KEY)
+else:
+    llm_gateway = None
+    logger.warning("OpenAI API key not configured")
+
+@app.on_event("shutdown")
+async def close_llm_gateway():
+    if llm_gateway:
+        await llm_gateway.aclose()
+
+# =============================================================================
+# Параллельная загрузка RSS
+# =============================================================================
+
+class FetchResult:
+    """Результат условной загрузки одного URL"""
+
+    def __init__(self, url: str, content: Optional[bytes], etag: Optional[str],
+                 last_modified: Optional[str], content_hash: Optional[str], not_modified: bool):
+        self.url = url
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.not_modified = not_modified
+
+class HTTPValidatorStore:
+    """Хранилище ETag / Last-Modified / хеша содержимого по URL"""
+
+    @staticmethod
+    def load(db: Session, urls: List[str]) -> Dict[str, Dict[str, Optional[str]]]:
+        """Загрузка валидаторов для списка URL одним запросом"""
+        if not urls:
+            return {}
+        rows = db.query(HTTPValidatorCache).filter(HTTPValidatorCache.url.in_(list(set(urls)))).all()
+        return {
+            row.url: {
+                'etag': row.etag,
+                'last_modified': row.last_modified,
+                'content_hash': row.content_hash
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def remember(db: Session, result: FetchResult, key: Optional[str] = None):
+        """Сохранение валидаторов после успешной обработки ответа (без commit)"""
+        now = datetime.utcnow()
+        key = key or result.url
+        row = db.get(HTTPValidatorCache, key)
+        if row is None:
+            row = HTTPValidatorCache(url=key)
+            db.add(row)
+        if not result.not_modified:
+            row.changed_at = now
+        row.etag = result.etag
+        row.last_modified = result.last_modified
+        row.content_hash = result.content_hash
+        row.checked_at = now
+
+class RSSFetchEngine:
+    """Параллельная загрузка RSS лент через общий пул соединений.
+
+    Все URL загружаются одновременно через один httpx.AsyncClient, число
+    одновременных запросов к одному хосту ограничено семафором, а весь цикл
+    загрузки ограничен общим дедлайном. Незавершенные к дедлайну загрузки
+    отменяются и возвращаются как ошибки по таймауту.
+
+    Если переданы валидаторы, запросы отправляются как условные
+    (If-None-Match / If-Modified-Since). Ответ 304 или тело с тем же хешем
+    возвращаются с not_modified=True, и их не нужно разбирать повторно.
+    """
+
+    def __init__(self,
+                 max_connections: int = RSS_FETCH_MAX_CONNECTIONS,
+                 per_host_limit: int = RSS_FETCH_PER_HOST_LIMIT,
+                 timeout: float = RSS_FETCH_TIMEOUT_SECONDS,
+                 deadline: float = RSS_FETCH_DEADLINE_SECONDS):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.deadline = deadline
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+        self._client = None
+        self._host_semaphores.clear()
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    async def _fetch_one(self, url: str, validator: Optional[Dict[str, Optional[str]]]) -> FetchResult:
+        validator = validator or {}
+        headers = {}
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+        
+        async with self._host_semaphore(url):
+            response = await self._client.get(url, headers=headers)
+        
+        if response.status_code == 304:
+            return FetchResult(
+                url=url,
+                content=None,
+                etag=response.headers.get('etag') or validator.get('etag'),
+                last_modified=response.headers.get('last-modified') or validator.get('last_modified'),
+                content_hash=validator.get('content_hash'),
+                not_modified=True
+            )
+        
+        response.raise_for_status()
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        return FetchResult(
+            url=url,
+            content=response.content,
+            etag=response.headers.get('etag'),
+            last_modified=response.headers.get('last-modified'),
+            content_hash=content_hash,
+            not_modified=content_hash == validator.get('content_hash')
+        )
+
+    async def fetch_all(self, urls: List[str],
+                        validators: Optional[Dict[str, Dict[str, Optional[str]]]] = None) -> Dict[str, Any]:
+        """Загрузка списка URL. Возвращает {url: FetchResult | Exception}"""
+        validators = validators or {}
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+
+        tasks = {url: asyncio.create_task(self._fetch_one(url, validators.get(url))) for url in unique_urls}
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.deadline)
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"RSS fetch deadline {self.deadline}s exceeded, {len(pending)} feeds cancelled")
+
+        results: Dict[str, Any] = {}
+        for url, task in tasks.items():
+            if task in pending:
+                results[url] = asyncio.TimeoutError(f"Превышен общий лимит времени загрузки ({self.deadline}s)")
+            elif task.exception() is not None:
+                results[url] = task.exception()
+            else:
+                results[url] = task.result()
+        return results
+
+def normalize_feed_url(url: str) -> str:
+    """Нормализация URL ленты для общего кеша и валидаторов"""
+    parsed = urlparse(str(url).strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parsed.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+class SharedFeedCache:
+    """Общий для всех пользователей кеш разобранных RSS лент.
+
+    Ключ - нормализованный URL, TTL записи равен самому короткому интервалу
+    fetch_frequency среди подписчиков этого URL. Лента загружается и
+    разбирается один раз, а фильтрация по ключевым словам и лимит по
+    приоритету применяются отдельно для каждого подписчика.
+    """
+
+    def __init__(self, max_urls: int = RSS_SHARED_CACHE_MAX_URLS):
+        self.max_urls = max_urls
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        """Свежие записи ленты или None"""
+        with self._lock:
+            cached = self._entries.get(key)
+            if not cached:
+                return None
+            if datetime.utcnow() - cached['fetched_at'] >= cached['ttl']:
+                del self._entries[key]
+                return None
+            return cached['entries']
+
+    def put(self, key: str, entries: List[Any], ttl: timedelta):
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_urls:
+                # Вытесняем самую старую запись
+                oldest = min(self._entries, key=lambda k: self._entries[k]['fetched_at'])
+                del self._entries[oldest]
+            self._entries[key] = {
+                'entries': entries[:RSS_SHARED_CACHE_MAX_ENTRIES],
+                'fetched_at': datetime.utcnow(),
+                'ttl': ttl
+            }
+
+    def touch(self, key: str, ttl: timedelta):
+        """Продление записи после ответа 304"""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached:
+                cached['fetched_at'] = datetime.utcnow()
+                cached['ttl'] = ttl
+
+shared_feed_cache = SharedFeedCache()
+
+def article_fingerprint(title: str, content: str, url: Optional[str]) -> tuple:
+    """Отпечаток статьи для дедупликации: (fingerprint, content_hash)"""
+    normalized_text = re.sub(r"\s+", " ", f"{title or ''}\n{content or ''}".lower()).strip()
+    content_hash = hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+    if url:
+        source_key = "url:" + normalize_feed_url(url)
+    else:
+        source_key = "text:" + content_hash
+    return hashlib.sha256(source_key.encode("utf-8")).hexdigest(), content_hash
+
+class NewsArticleStore:
+    """Пакетное сохранение статей с дедупликацией по отпечатку"""
+
+    @staticmethod
+    def insert_batch(db: Session, articles: List[Dict], resolve_existing: bool = False) -> Dict[str, tuple]:
+        """INSERT ... ON CONFLICT (fingerprint) DO NOTHING одним запросом на пакет.
+        
+        Проставляет в словари статей ключи 'fingerprint' и 'content_hash'.
+        Возвращает {fingerprint: (article_id, inserted)}; уже существующие статьи
+        попадают в результат только при resolve_existing=True (еще один запрос).
+        """
+        rows = []
+        seen = set()
+        now = datetime.utcnow()
+        for article in articles:
+            fingerprint, content_hash = article_fingerprint(
+                article.get('title', ''), article.get('content', ''), article.get('url')
+            )
+            article['fingerprint'] = fingerprint
+            article['content_hash'] = content_hash
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            rows.append({
+                'id': uuid.uuid4(),
+                'title': article.get('title', ''),
+                'content': article.get('content'),
+                'url': article.get('url'),
+                'published_at': article.get('published_at'),
+                'source': article.get('source'),
+                'category': article.get('category', 'financial'),
+                'sentiment': article.get('sentiment'),
+                'risk_level': article.get('risk_level'),
+                'relevance_score': article.get('relevance_score', 0.5),
+                'fingerprint': fingerprint,
+                'content_hash': content_hash,
+                'created_at': now
+            })
+        
+        if not rows:
+            return {}
+        
+        stmt = pg_insert(NewsArticle).values(rows).on_conflict_do_nothing(
+            index_elements=[NewsArticle.fingerprint]
+        ).returning(NewsArticle.id, NewsArticle.fingerprint)
+        result = {fingerprint: (article_id, True) for article_id, fingerprint in db.execute(stmt)}
+        
+        missing = [row['fingerprint'] for row in rows if row['fingerprint'] not in result]
+        if resolve_existing and missing:
+            existing = db.query(NewsArticle.id, NewsArticle.fingerprint).filter(
+                NewsArticle.fingerprint.in_(missing)
+            ).all()
+            for article_id, fingerprint in existing:
+                result[fingerprint] = (article_id, False)
+        
+        return result
+
+class AIAnalysisCache:
+    """Двухуровневый кеш AI анализа статей: LRU в памяти + таблица ai_analysis_cache.
+
+    Ключ - хеш содержимого статьи и версия промпта, поэтому одна и та же
+    статья у разных пользователей и при повторных обновлениях ленты
+    анализируется моделью один раз.
+    """
+
+    def __init__(self, max_size: int = AI_ANALYSIS_CACHE_MEMORY_SIZE,
+                 prompt_version: str = RSS_ANALYSIS_PROMPT_VERSION):
+        self.max_size = max_size
+        self.prompt_version = prompt_version
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, content_hash: str, result: Dict):
+        with self._lock:
+            self._memory[content_hash] = result
+            self._memory.move_to_end(content_hash)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def get(self, db: Session, content_hash: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._memory.get(content_hash)
+            if result is not None:
+                self._memory.move_to_end(content_hash)
+                self.memory_hits += 1
+                return result
+        
+        entry = db.get(AIAnalysisCacheEntry, (content_hash, self.prompt_version))
+        if entry is not None:
+            self._remember(content_hash, entry.result)
+            with self._lock:
+                self.db_hits += 1
+            return entry.result
+        
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, db: Session, content_hash: str, result: Dict, processing_time_ms: Optional[int] = None):
+        """Сохранение результата (без commit, конкурентная запись игнорируется)"""
+        self._remember(content_hash, result)
+        db.execute(pg_insert(AIAnalysisCacheEntry).values(
+            content_hash=content_hash,
+            prompt_version=self.prompt_version,
+            result=result,
+            processing_time_ms=processing_time_ms,
+            created_at=datetime.utcnow()
+        ).on_conflict_do_nothing())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "prompt_version": self.prompt_version,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else 0.0
+            }
+
+ai_analysis_cache = AIAnalysisCache()
+
+CONSULTATION_VOLATILE_CONTEXT_KEYS = ("session_id",)
+
+def normalize_question(question: str) -> str:
+    """Нормализация вопроса для кеша: регистр, пробелы, завершающая пунктуация"""
+    normalized = re.sub(r"\s+", " ", question.strip().lower().replace("ё", "е"))
+    return normalized.rstrip(" ?!.…")
+
+class ConsultationAnswerCache:
+    """Кеш ответов AI консультанта с разделением по пользователям.
+
+    Ключ - пользователь, нормализованный вопрос, дополнительный контекст и
+    отпечаток данных, на которых строится промпт (последние курсы, новости
+    и RSS анализ пользователя). Новые курсы или анализ меняют отпечаток, так
+    что устаревший ответ не будет выдан; invalidate() дополнительно
+    освобождает память сразу после записи.
+    """
+
+    def __init__(self, max_entries: int = CONSULTATION_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = CONSULTATION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (answer, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def context_fingerprint(db: Session, user_id: Optional[str]) -> str:
+        """Отпечаток данных контекста одним запросом к БД"""
+        rss_watermark = None
+        columns = [
+            db.query(func.max(ExchangeRate.created_at)).scalar_subquery(),
+            db.query(func.max(NewsArticle.created_at)).scalar_subquery()
+        ]
+        if user_id:
+            columns.append(
+                db.query(func.max(RSSContentAnalysis.created_at)).filter(
+                    RSSContentAnalysis.user_id == user_id
+                ).scalar_subquery()
+            )
+        row = db.query(*columns).one()
+        rates_watermark, news_watermark = row[0], row[1]
+        if user_id:
+            rss_watermark = row[2]
+        # Дата входит в отпечаток: окно "последние сутки" сдвигается без новых записей
+        parts = [datetime.now().date(), rates_watermark, news_watermark, rss_watermark]
+        return "|".join(value.isoformat() if value else "-" for value in parts)
+
+    def make_key(self, db: Session, question: str, context: Optional[Dict], user_id: Optional[str]) -> tuple:
+        tenant = str(user_id or (context or {}).get("user_id") or "anonymous")
+        stable_context = {
+            key: value for key, value in (context or {}).items()
+            if key not in CONSULTATION_VOLATILE_CONTEXT_KEYS
+        }
+        return (
+            tenant,
+            normalize_question(question),
+            json.dumps(stable_context, sort_keys=True, ensure_ascii=False, default=str),
+            bool(user_id),
+            self.context_fingerprint(db, user_id)
+        )
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, answer: str):
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Сброс ответов пользователя (или всех, если пользователь не указан)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            tenant = str(user_id)
+            for key in [key for key in self._entries if key[0] == tenant]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+consultation_answer_cache = ConsultationAnswerCache()
+
+# =============================================================================
+# Таблица валютных курсов
+# =============================================================================
+
+class FXSnapshot:
+    """Неизменяемый снимок таблицы курсов: единиц базовой валюты за единицу валюты"""
+    __slots__ = ("base_currency", "rates", "rows", "version", "as_of")
+
+    def __init__(self, base_currency: str, rates: Dict[str, float], rows: List[Dict[str, Any]],
+                 version: int, as_of: Optional[datetime]):
+        self.base_currency = base_currency
+        self.rates = rates
+        self.rows = rows
+        self.version = version
+        self.as_of = as_of
+
+    def rate(self, from_currency: str, to_currency: Optional[str] = None) -> float:
+        """Курс между двумя валютами, кросс-курсы считаются через базовую валюту"""
+        to_currency = to_currency or self.base_currency
+        if from_currency == to_currency:
+            return 1.0
+        return self.rates.get(from_currency, 1.0) / self.rates.get(to_currency, 1.0)
+
+    def to_base(self, amount: float, currency: str) -> float:
+        return amount * self.rates.get(currency, 1.0)
+
+class FXRateTable:
+    """Последний курс по каждой паре валют из представления latest_exchange_rates.
+
+    Дашборд и отчеты читают один и тот же снимок. Обновление строит новый
+    снимок и подменяет ссылку, поэтому читатели не видят частично
+    обновленную таблицу. update_exchange_rates обновляет таблицу сразу
+    после записи курсов; max_age_seconds нужен для других процессов.
+    """
+
+    def __init__(self, base_currency: str = "KZT", fallback_rates: Optional[Dict[str, float]] = None,
+                 max_age_seconds: int = FX_RATE_TABLE_MAX_AGE_SECONDS):
+        self.base_currency = base_currency
+        self.fallback_rates = dict(fallback_rates or {})
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._snapshot = FXSnapshot(base_currency, {base_currency: 1.0, **self.fallback_rates}, [], 0, None)
+
+    def refresh(self, db: Session) -> FXSnapshot:
+        rows = db.execute(text(
+            "SELECT from_currency, to_currency, rate, date, source FROM latest_exchange_rates"
+        )).mappings().all()
+        
+        direct, inverse = {}, {}
+        for row in rows:
+            if not row["rate"]:
+                continue
+            if row["to_currency"] == self.base_currency:
+                direct[row["from_currency"]] = float(row["rate"])
+            elif row["from_currency"] == self.base_currency:
+                inverse[row["to_currency"]] = 1.0 / float(row["rate"])
+        # Прямые котировки важнее обратных, обе - важнее резервных курсов
+        rates = {**self.fallback_rates, **inverse, **direct, self.base_currency: 1.0}
+        
+        as_of = max((row["date"] for row in rows if row["date"]), default=None)
+        with self._lock:
+            self._snapshot = FXSnapshot(
+                self.base_currency,
+                rates,
+                [{**row, "rate": float(row["rate"]) if row["rate"] is not None else None} for row in rows],
+                self._snapshot.version + 1,
+                as_of
+            )
+            self._loaded_at = time.monotonic()
+            return self._snapshot
+
+    def snapshot(self, db: Optional[Session] = None) -> FXSnapshot:
+        """Текущий снимок; если он старше max_age_seconds - сначала обновляется"""
+        if db is not None and time.monotonic() - self._loaded_at > self.max_age_seconds:
+            try:
+                # Точка сохранения: при ошибке запроса транзакция вызывающего кода остается рабочей
+                with db.begin_nested():
+                    return self.refresh(db)
+            except Exception as e:
+                logger.error(f"Error refreshing FX rate table: {e}")
+                self._loaded_at = time.monotonic()
+        return self._snapshot
+
+fx_rates = FXRateTable(fallback_rates=FX_FALLBACK_RATES)
+
+# =============================================================================
+# События в реальном времени
+# =============================================================================
+
+EVENT_BACKEND = os.getenv("EVENT_BACKEND", "memory")
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+EVENT_SUBSCRIBER_QUEUE_SIZE = 100
+
+# События этого канала получают все подключенные пользователи
+BROADCAST_CHANNEL = "*"
+
+class InMemoryEventBackend:
+    """Pub/sub внутри процесса: кольцевой буфер для возобновления и очереди подписчиков.
+
+    Другому бэкенду (например, Redis pub/sub с ограниченным stream для истории)
+    достаточно тех же методов publish / replay / subscribe / unsubscribe.
+    publish() можно вызывать из любого потока (в том числе из планировщика):
+    доставка ставится в event loop каждого подписчика.
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)  # (sequence, channel, event)
+        self._subscribers: Dict[str, set] = {}  # channel -> {(loop, queue)}
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._sequence += 1
+            event = {
+                "id": f"{self.epoch}-{self._sequence}",
+                "sequence": self._sequence,
+                "type": event_type,
+                "data": data,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            self._history.append((self._sequence, channel, event))
+            subscribers = list(self._subscribers.get(channel, ()))
+            if channel == BROADCAST_CHANNEL:
+                for channel_subscribers in self._subscribers.values():
+                    subscribers.extend(channel_subscribers)
+        
+        for loop, subscriber_queue in set(subscribers):
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriber_queue, event)
+            except RuntimeError:
+                pass  # цикл подписчика уже закрыт
+        return event
+
+    @staticmethod
+    def _deliver(subscriber_queue: asyncio.Queue, event: Dict[str, Any]):
+        if subscriber_queue.full():
+            # Медленный клиент: отбрасываем самое старое событие, клиент догонит по id
+            subscriber_queue.get_nowait()
+        subscriber_queue.put_nowait(event)
+
+    def replay(self, channel: str, last_event_id: str) -> Optional[List[Dict[str, Any]]]:
+        """События после last_event_id или None, если они уже недоступны"""
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self._lock:
+            if self._history and self._history[0][0] > sequence + 1:
+                return None
+            return [
+                event for event_sequence, event_channel, event in self._history
+                if event_sequence > sequence and event_channel in (channel, BROADCAST_CHANNEL)
+            ]
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        subscriber_queue = asyncio.Queue(maxsize=EVENT_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add((asyncio.get_running_loop(), subscriber_queue))
+        return subscriber_queue
+
+    def unsubscribe(self, channel: str, subscriber_queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is subscriber_queue})
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "channels": len(self._subscribers),
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "history": len(self._history)
+            }
+
+EVENT_BACKENDS = {
+    "memory": InMemoryEventBackend,
+}
+
+class EventBroker:
+    """Канал событий пользователя, отдается как Server-Sent Events"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def publish(self, user_id, event_type: str, data: Optional[Dict[str, Any]] = None):
+        try:
+            self.backend.publish(str(user_id), event_type, data or {})
+        except Exception as e:
+            logger.error(f"Error publishing event {event_type}: {e}")
+
+    def broadcast(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        self.publish(BROADCAST_CHANNEL, event_type, data)
+
+    @staticmethod
+    def format(event: Dict[str, Any]) -> str:
+        payload = json.dumps({**event["data"], "timestamp": event["timestamp"]}, ensure_ascii=False, default=str)
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+    async def stream(self, user_id, last_event_id: Optional[str] = None):
+        """Кадры SSE для одного подключения: сначала пропущенные события, затем новые и heartbeat"""
+        channel = str(user_id)
+        subscriber_queue = self.backend.subscribe(channel)
+        try:
+            yield f"retry: {int(EVENT_HEARTBEAT_SECONDS * 1000)}\n\n"
+            last_sequence = 0
+            if last_event_id:
+                missed = self.backend.replay(channel, last_event_id)
+                if missed is None:
+                    # История потеряна (перезапуск или переполнение) - клиенту нужно перезапросить данные
+                    yield self.format({"id": last_event_id, "type": "resync", "data": {}, "timestamp": datetime.utcnow().isoformat()})
+                else:
+                    for missed_event in missed:
+                        last_sequence = missed_event["sequence"]
+                        yield self.format(missed_event)
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber_queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                # События, опубликованные во время повтора, уже отправлены
+                if event["sequence"] <= last_sequence:
+                    continue
+                yield self.format(event)
+        finally:
+            self.backend.unsubscribe(channel, subscriber_queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+if EVENT_BACKEND not in EVENT_BACKENDS:
+    logger.warning(f"Unknown EVENT_BACKEND '{EVENT_BACKEND}', using in-process events")
+event_broker = EventBroker(EVENT_BACKENDS.get(EVENT_BACKEND, InMemoryEventBackend)())
+
+# =============================================================================
+# Снимки дашборда
+# =============================================================================
+
+# Отличает версии снимков между перезапусками процесса
+DASHBOARD_SNAPSHOT_EPOCH = uuid.uuid4().hex[:8]
+
+class DashboardSnapshotStore:
+    """Предрасчитанные документы дашборда по пользователям, пересборка по секциям.
+
+    У каждой секции (счета, RSS, курсы, ...) есть версия для пользователя и
+    глобальная версия. Запись увеличивает версии затронутых секций, и при
+    следующем чтении пересобираются только они, остальные отдаются из памяти.
+    Снимок старше max_age_seconds пересобирается целиком - это покрывает
+    окна "за последние сутки" и записи из других процессов.
+    """
+
+    def __init__(self, max_age_seconds: int = DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        self._entries: Dict[str, Dict[Any, Dict[str, Any]]] = {}  # user -> variant -> entry
+        self._user_versions: Dict[str, Dict[str, int]] = {}
+        self._global_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.section_rebuilds = 0
+
+    def _version(self, user_key: str, section: str) -> tuple:
+        return (self._user_versions.get(user_key, {}).get(section, 0), self._global_versions.get(section, 0))
+
+    def invalidate(self, user_id, *sections: str):
+        """Пометить секции дашборда пользователя как измененные"""
+        with self._lock:
+            versions = self._user_versions.setdefault(str(user_id), {})
+            for section in sections:
+                versions[section] = versions.get(section, 0) + 1
+
+    def invalidate_global(self, *sections: str):
+        """Пометить секции измененными для всех пользователей (общие данные: курсы, новости)"""
+        with self._lock:
+            for section in sections:
+                self._global_versions[section] = self._global_versions.get(section, 0) + 1
+
+    def get(self, user_id, variant: Any, builders: Dict[str, Any]) -> Dict[str, Any]:
+        """Запись снимка: "document", "sections", "etag", "version" и "built_at".
+
+        builders - секция -> функция, возвращающая часть документа; документ
+        объединяет части в порядке builders. Версия растет только если
+        пересобранная секция действительно изменилась, поэтому ETag - строгий
+        валидатор на основе версий данных, а не хеш всего ответа.
+        """
+        user_key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_key, {}).get(variant)
+            versions = {section: self._version(user_key, section) for section in builders}
+            expired = entry is None or time.monotonic() - entry["built_monotonic"] > self.max_age_seconds
+            if expired:
+                stale = list(builders)
+            else:
+                stale = [section for section in builders if entry["versions"].get(section) != versions[section]]
+            if not stale:
+                self.hits += 1
+                return entry
+        
+        # Секции собираются вне блокировки; запись, пришедшая в это время,
+        # снова увеличит версию и будет учтена при следующем чтении
+        rebuilt = {section: builders[section]() for section in stale}
+        digests = {
+            section: hashlib.sha256(json.dumps(part, sort_keys=True, default=str).encode()).hexdigest()
+            for section, part in rebuilt.items()
+        }
+        
+        with self._lock:
+            current = self._entries.get(user_key, {}).get(variant) or entry
+            sections = dict(current["sections"]) if current else {}
+            section_digests = dict(current["section_digests"]) if current else {}
+            section_versions = dict(current["section_versions"]) if current else {}
+            version = current["version"] if current else 0
+            
+            changed = [section for section in stale if section_digests.get(section) != digests[section]]
+            if changed or current is None:
+                version += 1
+            for section in changed:
+                sections[section] = rebuilt[section]
+                section_digests[section] = digests[section]
+                section_versions[section] = version
+            
+            if changed or current is None:
+                document = {}
+                for section in builders:
+                    document.update(sections[section])
+                built_at = datetime.utcnow()
+            else:
+                document = current["document"]
+                built_at = current["built_at"]
+            
+            # Метка пользователя не дает спутать валидаторы разных пользователей в одном браузере
+            user_tag = hashlib.sha256(user_key.encode()).hexdigest()[:8]
+            new_entry = {
+                "sections": sections,
+                "section_digests": section_digests,
+                "section_versions": section_versions,
+                "versions": versions,
+                "document": document,
+                "version": version,
+                "user_tag": user_tag,
+                "version_token": f"{DASHBOARD_SNAPSHOT_EPOCH}.{user_tag}.{version}",
+                "etag": f'"{variant}.{DASHBOARD_SNAPSHOT_EPOCH}.{user_tag}.{version}"',
+                "built_at": built_at,
+                # max_age отсчитывается от последней полной пересборки
+                "built_monotonic": time.monotonic() if expired else current["built_monotonic"]
+            }
+            self._entries.setdefault(user_key, {})[variant] = new_entry
+            self.section_rebuilds += len(stale)
+        return new_entry
+
+    @staticmethod
+    def changed_sections(entry: Dict[str, Any], since: Optional[str]) -> Optional[List[str]]:
+        """Секции, изменившиеся после указанной версии; None - нужен полный документ"""
+        if not since:
+            return None
+        epoch, _, rest = since.partition(".")
+        user_tag, _, version = rest.partition(".")
+        if (epoch != DASHBOARD_SNAPSHOT_EPOCH or user_tag != entry["user_tag"]
+                or not version.isdigit() or int(version) > entry["version"]):
+            return None
+        return [section for section, changed_at in entry["section_versions"].items() if changed_at > int(version)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "hits": self.hits,
+                "section_rebuilds": self.section_rebuilds
+            }
+
+dashboard_snapshots = DashboardSnapshotStore()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли значение If-None-Match с ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [candidate.strip() for candidate in if_none_match.split(",")]
+
+# Модели, изменение которых меняет дашборд пользователя, и их секции
+DASHBOARD_SECTIONS_BY_MODEL = {
+    User: ("profile",),
+    BankAccount: ("accounts",),
+    UserRSSFeed: ("rss",),
+    RSSContentAnalysis: ("rss",),
+}
+
+@event.listens_for(Session, "after_flush")
+def collect_dashboard_invalidations(session, flush_context):
+    pending = session.info.setdefault("dashboard_invalidations", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        sections = DASHBOARD_SECTIONS_BY_MODEL.get(type(obj))
+        owner_id = obj.id if isinstance(obj, User) else getattr(obj, "user_id", None)
+        if sections and owner_id:
+            pending.update((str(owner_id), section) for section in sections)
+
+@event.listens_for(Session, "after_commit")
+def apply_dashboard_invalidations(session):
+    # Применяется только после commit, чтобы параллельная пересборка не закешировала незафиксированные данные
+    changed_sections: Dict[str, set] = {}
+    for user_id, section in session.info.pop("dashboard_invalidations", ()):
+        dashboard_snapshots.invalidate(user_id, section)
+        changed_sections.setdefault(user_id, set()).add(section)
+    
+    for user_id, sections in changed_sections.items():
+        event_broker.publish(user_id, "dashboard.changed", {"sections": sorted(sections)})
+
+@event.listens_for(Session, "after_rollback")
+def discard_dashboard_invalidations(session):
+    session.info.pop("dashboard_invalidations", None)
+
 # =============================================================================
 # Сервисы интеграции (обновленные)
 # =============================================================================
@@ -373,17 +1767,30 @@ class NBKExchangeRateService:
     """Сервис для получения курсов валют из НБ РК"""
     
     @staticmethod
-    async def fetch_exchange_rates():
-        """Получение курсов валют из НБ РК"""
+    async def fetch_exchange_rates(db: Optional[Session] = None):
+        """Получение курсов валют из НБ РК.
+        
+        Если передана сессия, запрос выполняется как условный. При неизмененном
+        ответе возвращается пустой список, а валидаторы добавляются в сессию
+        без commit - их сохраняет вызывающий код вместе с курсами.
+        """
         try:
             logger.info("Fetching exchange rates from NBK...")
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(NBK_API_URL)
-                response.raise_for_status()
+            validators = HTTPValidatorStore.load(db, [NBK_API_URL]) if db else {}
+            async with RSSFetchEngine(timeout=30.0) as engine:
+                result = (await engine.fetch_all([NBK_API_URL], validators))[NBK_API_URL]
+            if isinstance(result, Exception):
+                raise result
+            
+            if result.not_modified:
+                logger.info("NBK exchange rates not modified since last fetch")
+                if db:
+                    HTTPValidatorStore.remember(db, result)
+                return []
                 
             # Парсинг XML ответа от НБ РК
-            root = ET.fromstring(response.content)
+            root = ET.fromstring(result.content)
             rates = []
             
             # НБ РК предоставляет данные в формате XML
@@ -436,6 +1843,8 @@ class NBKExchangeRateService:
                     {'from_currency': 'EUR', 'to_currency': 'KZT', 'rate': 520.3, 'date': datetime.now(timezone.utc), 'source': 'NBK_FALLBACK'},
                     {'from_currency': 'RUB', 'to_currency': 'KZT', 'rate': 5.2, 'date': datetime.now(timezone.utc), 'source': 'NBK_FALLBACK'},
                 ]
+            elif db:
+                HTTPValidatorStore.remember(db, result)
             
             logger.info(f"Fetched {len(rates)} exchange rates from NBK")
             return rates
@@ -453,8 +1862,12 @@ class EnhancedNewsService:
     """Обновленный сервис для получения и анализа новостей с пользовательскими RSS"""
     
     @staticmethod
-    async def fetch_default_news():
-        """Получение новостей из базовых источников"""
+    async def fetch_default_news(db: Optional[Session] = None):
+        """Получение новостей из базовых источников.
+        
+        Если передана сессия, неизмененные с прошлого цикла ленты пропускаются,
+        а валидаторы измененных добавляются в сессию без commit.
+        """
         try:
             logger.info("Fetching default financial news...")
             
@@ -478,14 +1891,25 @@ class EnhancedNewsService:
             
             all_articles = []
             
+            urls = [source['url'] for source in default_sources]
+            validators = HTTPValidatorStore.load(db, urls) if db else {}
+            async with RSSFetchEngine() as engine:
+                results = await engine.fetch_all(urls, validators)
+            
             # Получение новостей из RSS лент
             for source in default_sources:
+                result = results.get(source['url'])
                 try:
-                    async with httpx.AsyncClient(timeout=20.0) as client:
-                        response = await client.get(source['url'])
-                        response.raise_for_status()
+                    if isinstance(result, Exception):
+                        raise result
+                    
+                    if result.not_modified:
+                        if db:
+                            HTTPValidatorStore.remember(db, result)
+                        logger.info(f"{source['source']} feed not modified, skipping")
+                        continue
                     
-                    feed = feedparser.parse(response.content)
+                    feed = feedparser.parse(result.content)
                     
                     for entry in feed.entries[:5]:  # Берем последние 5 новостей из каждого источника
                         article = {
@@ -497,6 +1921,11 @@ class EnhancedNewsService:
                             'category': source['category']
                         }
                         all_articles.append(article)
+                    
+                    # Валидаторы запоминаются только после разбора ленты; commit делает
+                    # вызывающий код вместе с сохранением статей
+                    if db:
+                        HTTPValidatorStore.remember(db, result)
                         
                 except Exception as e:
                     logger.warning(f"Error fetching from {source['source']}: {e}")
@@ -510,97 +1939,222 @@ class EnhancedNewsService:
             return []
 
     @staticmethod
-    async def fetch_user_rss_feeds(user_id: str, db: Session):
-        """Получение новостей из пользовательских RSS каналов"""
-        try:
-            logger.info(f"Fetching user RSS feeds for user {user_id}")
-            
-            # Получаем активные RSS каналы пользователя
-            user_feeds = db.query(UserRSSFeed).filter(
-                UserRSSFeed.user_id == user_id,
-                UserRSSFeed.is_active == True
-            ).all()
-            
-            if not user_feeds:
-                logger.info(f"No active RSS feeds for user {user_id}")
-                return []
-            
-            all_articles = []
+    def _filter_feed_entries(feed: UserRSSFeed, entries: List[Any], user_id: str) -> List[Dict]:
+        """Фильтрация записей RSS по ключевым словам и приоритету канала"""
+        articles = []
+        
+        for entry in entries:
+            article = {
+                'title': entry.get('title', ''),
+                'content': entry.get('summary', '') or entry.get('description', ''),
+                'url': entry.get('link', ''),
+                'published_at': datetime.now(timezone.utc),
+                'source': feed.name,
+                'category': feed.category,
+                'rss_feed_id': str(feed.id),
+                'user_id': user_id
+            }
             
-            for feed in user_feeds:
+            # Фильтрация по ключевым словам
+            if feed.keywords:
+                title_lower = article['title'].lower()
+                content_lower = article['content'].lower()
+                
+                if any(keyword.lower() in title_lower or keyword.lower() in content_lower 
+                       for keyword in feed.keywords):
+                    article['relevance_score'] = 0.8  # Высокая релевантность
+                    articles.append(article)
+                elif feed.priority >= 4:  # Высокий приоритет - берем все статьи
+                    article['relevance_score'] = 0.6
+                    articles.append(article)
+            else:
+                article['relevance_score'] = 0.7
+                articles.append(article)
+        
+        return articles
+
+    @staticmethod
+    def get_due_feeds(db: Session, now: Optional[datetime] = None) -> List[UserRSSFeed]:
+        """Активные RSS каналы, которые пора обновить (один запрос по индексу)"""
+        now = now or datetime.utcnow()
+        
+        due_conditions = [
+            UserRSSFeed.last_fetched.is_(None),
+            # Неизвестная частота - обновляем каждый цикл
+            UserRSSFeed.fetch_frequency.is_(None),
+            UserRSSFeed.fetch_frequency.notin_(list(RSS_FETCH_INTERVALS.keys())),
+        ]
+        for frequency, interval in RSS_FETCH_INTERVALS.items():
+            due_conditions.append(and_(
+                UserRSSFeed.fetch_frequency == frequency,
+                UserRSSFeed.last_fetched <= now - interval
+            ))
+        
+        return db.query(UserRSSFeed).filter(
+            UserRSSFeed.is_active == True,
+            or_(*due_conditions)
+        ).all()
+
+    @staticmethod
+    def with_url_subscribers(feeds: List[UserRSSFeed], db: Session) -> List[UserRSSFeed]:
+        """Дополнение списка активными каналами других пользователей с теми же URL.
+        
+        Валидаторы хранятся по нормализованному URL, поэтому все подписчики
+        одного URL должны обновляться в одном цикле - иначе ответ 304 скроет от
+        них новые статьи. URL подписчиков могут отличаться регистром или
+        завершающим "/", поэтому кандидаты отбираются по хосту, а совпадение
+        проверяется через normalize_feed_url.
+        """
+        if not feeds:
+            return feeds
+        feed_ids = [feed.id for feed in feeds]
+        keys = {normalize_feed_url(feed.url) for feed in feeds}
+        hosts = {urlparse(key).netloc for key in keys}
+        candidates = db.query(UserRSSFeed).filter(
+            UserRSSFeed.is_active == True,
+            or_(*(func.lower(UserRSSFeed.url).contains(host, autoescape=True) for host in hosts)),
+            UserRSSFeed.id.notin_(feed_ids)
+        ).all()
+        subscribers = [feed for feed in candidates if normalize_feed_url(feed.url) in keys]
+        return list(feeds) + subscribers
+
+    @staticmethod
+    async def refresh_feeds(feeds: List[UserRSSFeed], db: Session,
+                            use_validators: bool = True) -> Dict[str, List[Dict]]:
+        """Однократное обновление каждого канала из списка.
+        
+        Каналы группируются по нормализованному URL: каждый URL загружается и
+        разбирается один раз, результат кладется в shared_feed_cache и
+        раздается всем подписчикам.
+        
+        Возвращает {rss_feed_id: [статьи]} только для успешно загруженных каналов.
+        При use_validators=True (плановый цикл) запросы условные: для
+        неизмененных лент статьи не разбираются и возвращается пустой список.
+        Разовые проверки (создание и тест канала) передают use_validators=False:
+        они берут содержимое из общего кеша, если оно свежее, и не сдвигают
+        валидаторы планового цикла.
+        
+        Функция не делает commit: валидаторы, статистика каналов и статьи
+        сохраняются вызывающим кодом в одной транзакции, иначе при ошибке
+        сохранения следующий цикл получит 304 и статьи будут потеряны.
+        """
+        articles_by_feed: Dict[str, List[Dict]] = {}
+        if not feeds:
+            return articles_by_feed
+        
+        feeds_by_key: Dict[str, List[UserRSSFeed]] = {}
+        for feed in feeds:
+            feeds_by_key.setdefault(normalize_feed_url(feed.url), []).append(feed)
+        
+        # TTL общего кеша - самый короткий интервал среди подписчиков URL
+        ttl_by_key = {
+            key: min(RSS_FETCH_INTERVALS.get(feed.fetch_frequency, RSS_FETCH_INTERVALS["hourly"])
+                     for feed in key_feeds)
+            for key, key_feeds in feeds_by_key.items()
+        }
+        
+        entries_by_key: Dict[str, Any] = {}
+        if not use_validators:
+            for key in feeds_by_key:
+                cached_entries = shared_feed_cache.get(key)
+                if cached_entries is not None:
+                    entries_by_key[key] = cached_entries
+        
+        # Загружаем оставшиеся URL параллельно, по одному запросу на URL
+        fetch_urls = {key: str(key_feeds[0].url) for key, key_feeds in feeds_by_key.items()
+                      if key not in entries_by_key}
+        validators = {}
+        if use_validators:
+            stored_validators = HTTPValidatorStore.load(db, list(fetch_urls.keys()))
+            validators = {fetch_urls[key]: value for key, value in stored_validators.items()}
+        
+        responses = {}
+        if fetch_urls:
+            async with RSSFetchEngine() as engine:
+                responses = await engine.fetch_all(list(fetch_urls.values()), validators)
+        
+        for key, url in fetch_urls.items():
+            result = responses.get(url)
+            if isinstance(result, Exception):
+                entries_by_key[key] = result
+            elif result.not_modified and use_validators:
+                shared_feed_cache.touch(key, ttl_by_key[key])
+                entries_by_key[key] = None
+            else:
+                try:
+                    entries = feedparser.parse(result.content).entries
+                    shared_feed_cache.put(key, entries, ttl_by_key[key])
+                    entries_by_key[key] = entries
+                except Exception as e:
+                    entries_by_key[key] = e
+                    continue
+            if use_validators and not isinstance(entries_by_key[key], Exception):
+                HTTPValidatorStore.remember(db, result, key=key)
+        
+        # Фильтрация и статистика для каждого подписчика
+        for key, key_feeds in feeds_by_key.items():
+            entries = entries_by_key.get(key)
+            for feed in key_feeds:
                 try:
                     logger.info(f"Processing RSS feed: {feed.name} - {feed.url}")
                     
-                    async with httpx.AsyncClient(timeout=20.0) as client:
-                        response = await client.get(str(feed.url))
-                        response.raise_for_status()
-                    
-                    parsed_feed = feedparser.parse(response.content)
-                    
-                    # Определяем количество статей в зависимости от приоритета
-                    max_articles = min(feed.priority * 3, 15)  # 3-15 статей
+                    if isinstance(entries, Exception):
+                        raise entries
                     
-                    for entry in parsed_feed.entries[:max_articles]:
-                        article = {
-                            'title': entry.get('title', ''),
-                            'content': entry.get('summary', '') or entry.get('description', ''),
-                            'url': entry.get('link', ''),
-                            'published_at': datetime.now(timezone.utc),
-                            'source': feed.name,
-                            'category': feed.category,
-                            'rss_feed_id': str(feed.id),
-                            'user_id': user_id
-                        }
+                    if entries is None:
+                        # Лента не изменилась с прошлого цикла
+                        articles_by_feed[str(feed.id)] = []
+                    else:
+                        # Определяем количество статей в зависимости от приоритета
+                        max_articles = min(feed.priority * 3, 15)  # 3-15 статей
                         
-                        # Фильтрация по ключевым словам
-                        if feed.keywords:
-                            title_lower = article['title'].lower()
-                            content_lower = article['content'].lower()
-                            
-                            if any(keyword.lower() in title_lower or keyword.lower() in content_lower 
-                                   for keyword in feed.keywords):
-                                article['relevance_score'] = 0.8  # Высокая релевантность
-                                all_articles.append(article)
-                            elif feed.priority >= 4:  # Высокий приоритет - берем все статьи
-                                article['relevance_score'] = 0.6
-                                all_articles.append(article)
-                        else:
-                            article['relevance_score'] = 0.7
-                            all_articles.append(article)
+                        articles_by_feed[str(feed.id)] = EnhancedNewsService._filter_feed_entries(
+                            feed, entries[:max_articles], str(feed.user_id)
+                        )
+                        feed.articles_count += len(entries[:max_articles])
                     
                     # Обновляем статистику канала
                     feed.last_fetched = datetime.utcnow()
                     feed.error_count = 0
-                    feed.articles_count += len(parsed_feed.entries[:max_articles])
                     feed.last_error = None
                     
                 except Exception as e:
                     logger.error(f"Error fetching RSS feed {feed.name}: {e}")
                     feed.error_count += 1
-                    feed.last_error = str(e)
+                    feed.last_error = str(e) or repr(e)
                     continue
-            
-            db.commit()
-            logger.info(f"Fetched {len(all_articles)} articles from user RSS feeds")
-            return all_articles
-            
-        except Exception as e:
-            logger.error(f"Error fetching user RSS feeds: {e}")
-            return []
+        
+        return articles_by_feed
 
 class EnhancedAIAnalysisService:
     """Обновленный AI сервис с поддержкой пользовательских RSS"""
     
     @staticmethod
-    async def analyze_rss_content(article_data: Dict, rss_feed_id: str, user_id: str, db: Session):
-        """AI анализ контента из RSS канала"""
+    async def analyze_rss_content(article_data: Dict, rss_feed_id: str, user_id: str, db: Session,
+                                  article_id: Optional[str] = None):
+        """AI анализ контента из RSS канала.
+        
+        Результат берется из ai_analysis_cache, если эта статья уже
+        анализировалась текущей версией промпта.
+        """
         try:
-            if not client:
-                logger.warning("OpenAI client not available for RSS analysis")
-                return None
-            
             title = article_data.get('title', '')
             content = article_data.get('content', '')
+            content_hash = article_data.get('content_hash') or article_fingerprint(
+                title, content, article_data.get('url')
+            )[1]
+            
+            cached_result = ai_analysis_cache.get(db, content_hash)
+            if cached_result is not None:
+                EnhancedAIAnalysisService._store_rss_analysis(
+                    cached_result, rss_feed_id, user_id, db, article_id, processing_time_ms=0
+                )
+                logger.info(f"AI analysis cache hit for RSS article: {title[:50]}...")
+                return cached_result
+            
+            if not llm_gateway:
+                logger.warning("OpenAI client not available for RSS analysis")
+                return None
             
             prompt = f"""
 Проанализируй следующую новостную статью с точки зрения финансовых рисков и возможностей:
@@ -625,8 +2179,7 @@ class EnhancedAIAnalysisService:
             
             start_time = datetime.utcnow()
             
-            response = client.chat.completions.create(
-                model="gpt-4",
+            ai_response = await llm_gateway.chat(
                 messages=[
                     {"role": "system", "content": "Ты эксперт по финансовому анализу. Анализируешь новости на предмет финансовых рисков и возможностей. Отвечаешь только в формате JSON."},
                     {"role": "user", "content": prompt}
@@ -638,7 +2191,9 @@ class EnhancedAIAnalysisService:
             processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
             
             try:
-                analysis_result = json.loads(response.choices[0].message.content)
+                analysis_result = json.loads(ai_response)
+                # Кешируем только успешно разобранный ответ модели
+                ai_analysis_cache.put(db, content_hash, analysis_result, processing_time)
             except json.JSONDecodeError:
                 logger.warning("Failed to parse AI analysis JSON, using defaults")
                 analysis_result = {
@@ -651,23 +2206,10 @@ class EnhancedAIAnalysisService:
                     "ai_confidence": 0.3
                 }
             
-            # Сохраняем анализ в базу данных
-            analysis = RSSContentAnalysis(
-                user_id=user_id,
-                rss_feed_id=rss_feed_id,
-                financial_relevance=analysis_result.get('financial_relevance', 0.5),
-                risk_indicators=analysis_result.get('risk_indicators', []),
-                sentiment_score=analysis_result.get('sentiment_score', 0.0),
-                key_topics=analysis_result.get('key_topics', []),
-                market_impact=analysis_result.get('market_impact', 'low'),
-                recommendations=analysis_result.get('recommendations', ''),
-                processing_time_ms=processing_time,
-                ai_confidence=analysis_result.get('ai_confidence', 0.5)
+            EnhancedAIAnalysisService._store_rss_analysis(
+                analysis_result, rss_feed_id, user_id, db, article_id, processing_time_ms=processing_time
             )
             
-            db.add(analysis)
-            db.commit()
-            
             logger.info(f"AI analysis completed for RSS article: {title[:50]}...")
             return analysis_result
             
@@ -675,12 +2217,279 @@ class EnhancedAIAnalysisService:
             logger.error(f"Error in RSS content analysis: {e}")
             return None
 
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Грубая оценка числа токенов (кириллица ~3 символа на токен)"""
+        return len(text) // 3 + 1
+
+    @staticmethod
+    def _validate_rss_analysis(item: Any) -> Optional[Dict]:
+        """Проверка одного элемента ответа пакетного анализа"""
+        if not isinstance(item, dict):
+            return None
+        try:
+            relevance = float(item['financial_relevance'])
+            sentiment = float(item['sentiment_score'])
+            confidence = float(item.get('ai_confidence', 0.5))
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not (0 <= relevance <= 1 and -1 <= sentiment <= 1 and 0 <= confidence <= 1):
+            return None
+        if item.get('market_impact') not in ('low', 'medium', 'high'):
+            return None
+        if not isinstance(item.get('risk_indicators', []), list) or not isinstance(item.get('key_topics', []), list):
+            return None
+        return {
+            "financial_relevance": relevance,
+            "risk_indicators": item.get('risk_indicators', []),
+            "sentiment_score": sentiment,
+            "key_topics": item.get('key_topics', []),
+            "market_impact": item['market_impact'],
+            "recommendations": str(item.get('recommendations', '')),
+            "ai_confidence": confidence
+        }
+
+    @staticmethod
+    def _plan_rss_batches(articles: List[Dict]) -> List[List[Dict]]:
+        """Адаптивная нарезка статей на пакеты с учетом бюджета токенов"""
+        batches: List[List[Dict]] = []
+        current: List[Dict] = []
+        current_tokens = 0
+        for article in articles:
+            tokens = EnhancedAIAnalysisService._estimate_tokens(article['title'] + article['content'])
+            output_tokens = (len(current) + 1) * RSS_BATCH_OUTPUT_TOKENS_PER_ARTICLE
+            fits = (
+                len(current) < RSS_BATCH_MAX_ARTICLES
+                and current_tokens + tokens <= RSS_BATCH_PROMPT_TOKEN_BUDGET
+                and current_tokens + tokens + output_tokens <= RSS_ANALYSIS_MODEL_CONTEXT_TOKENS
+            )
+            if current and not fits:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(article)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    async def _request_rss_analysis_batch(articles: List[Dict]) -> Dict[int, Dict]:
+        """Один запрос к модели на пакет статей. Возвращает {индекс: валидный анализ}"""
+        articles_text = "\n\n".join(
+            f"[{index}] ЗАГОЛОВОК: {article['title']}\nСОДЕРЖАНИЕ: {article['content']}"
+            for index, article in enumerate(articles)
+        )
+        prompt = f"""
+Проанализируй следующие новостные статьи с точки зрения финансовых рисков и возможностей.
+Каждая статья начинается с номера в квадратных скобках.
+
+{articles_text}
+
+Предоставь анализ в формате JSON массива, по одному объекту на каждую статью:
+[
+    {{
+        "index": 0,  // номер статьи
+        "financial_relevance": 0.0-1.0,  // релевантность для финансовых решений
+        "risk_indicators": ["indicator1", "indicator2"],  // индикаторы рисков
+        "sentiment_score": -1.0 to 1.0,  // негативный (-1) до позитивный (+1)
+        "key_topics": ["topic1", "topic2"],  // основные темы
+        "market_impact": "low|medium|high",  // влияние на рынок
+        "recommendations": "краткие рекомендации",
+        "ai_confidence": 0.0-1.0  // уверенность в анализе
+    }}
+]
+
+Отвечай только JSON массивом, без дополнительного текста.
+"""
+        ai_response = await llm_gateway.chat(
+            messages=[
+                {"role": "system", "content": "Ты эксперт по финансовому анализу. Анализируешь новости на предмет финансовых рисков и возможностей. Отвечаешь только в формате JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=RSS_BATCH_OUTPUT_TOKENS_PER_ARTICLE * len(articles),
+            temperature=0.3
+        )
+        
+        try:
+            items = json.loads(ai_response)
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse batch AI analysis JSON for {len(articles)} articles")
+            return {}
+        if not isinstance(items, list):
+            return {}
+        
+        results: Dict[int, Dict] = {}
+        for position, item in enumerate(items):
+            index = item.get('index', position) if isinstance(item, dict) else position
+            validated = EnhancedAIAnalysisService._validate_rss_analysis(item)
+            if validated is not None and isinstance(index, int) and 0 <= index < len(articles):
+                results[index] = validated
+        return results
+
+    @staticmethod
+    async def analyze_rss_content_batch(items: List[Dict], db: Session) -> int:
+        """Пакетный AI анализ статей.
+        
+        items - список словарей {article, rss_feed_id, user_id, article_id}.
+        Попадания в кеш сохраняются сразу, уникальные по содержимому промахи
+        отправляются пакетами; элементы ответа, не прошедшие проверку,
+        анализируются поштучно через analyze_rss_content. Анализы попаданий
+        в кеш и каждого пакета записываются одним commit.
+        Возвращает число сохраненных анализов.
+        """
+        stored_count = 0
+        pending: Dict[str, List[Dict]] = {}
+        cached_entries = []
+        
+        for item in items:
+            article = item['article']
+            content_hash = article.get('content_hash') or article_fingerprint(
+                article.get('title', ''), article.get('content', ''), article.get('url')
+            )[1]
+            article['content_hash'] = content_hash
+            
+            cached_result = ai_analysis_cache.get(db, content_hash)
+            if cached_result is not None:
+                cached_entries.append((cached_result, item, 0))
+            else:
+                pending.setdefault(content_hash, []).append(item)
+        
+        if cached_entries:
+            stored_count += EnhancedAIAnalysisService._stage_rss_analyses(cached_entries, db)
+        if not pending:
+            return stored_count
+        if not llm_gateway:
+            logger.warning("OpenAI client not available for RSS analysis")
+            return stored_count
+        
+        unique_articles = [
+            {
+                'content_hash': content_hash,
+                'title': hash_items[0]['article'].get('title', ''),
+                'content': (hash_items[0]['article'].get('content') or '')[:RSS_BATCH_MAX_CONTENT_CHARS]
+            }
+            for content_hash, hash_items in pending.items()
+        ]
+        
+        fallback_hashes: List[str] = []
+        batches = []
+        for batch in EnhancedAIAnalysisService._plan_rss_batches(unique_articles):
+            if len(batch) == 1:
+                fallback_hashes.append(batch[0]['content_hash'])
+            else:
+                batches.append(batch)
+        
+        async def run_batch(batch: List[Dict]):
+            start_time = datetime.utcnow()
+            try:
+                results = await EnhancedAIAnalysisService._request_rss_analysis_batch(batch)
+            except Exception as e:
+                logger.error(f"Batch RSS analysis request failed: {e}")
+                results = {}
+            return results, int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        
+        # Пакеты отправляются параллельно (ограничение - семафор llm_gateway),
+        # запись в БД выполняется последовательно
+        batch_outcomes = await asyncio.gather(*(run_batch(batch) for batch in batches))
+        
+        for batch, (results, processing_time) in zip(batches, batch_outcomes):
+            per_article_time = processing_time // len(batch)
+            batch_entries = []
+            
+            for index, article in enumerate(batch):
+                analysis_result = results.get(index)
+                if analysis_result is None:
+                    fallback_hashes.append(article['content_hash'])
+                    continue
+                ai_analysis_cache.put(db, article['content_hash'], analysis_result, per_article_time)
+                batch_entries.extend(
+                    (analysis_result, item, per_article_time) for item in pending[article['content_hash']]
+                )
+            
+            stored_count += EnhancedAIAnalysisService._stage_rss_analyses(batch_entries, db)
+            
+            logger.info(f"Batch AI analysis: {len(results)}/{len(batch)} articles in {processing_time}ms")
+        
+        # Поштучный анализ для статей, которые не удалось разобрать из пакета
+        for content_hash in fallback_hashes:
+            for item in pending[content_hash]:
+                result = await EnhancedAIAnalysisService.analyze_rss_content(
+                    item['article'], item['rss_feed_id'], item['user_id'], db, article_id=item.get('article_id')
+                )
+                if result is not None:
+                    stored_count += 1
+        
+        return stored_count
+
+    @staticmethod
+    def _store_rss_analysis(analysis_result: Dict, rss_feed_id: str, user_id: str, db: Session,
+                            article_id: Optional[str], processing_time_ms: int):
+        """Сохранение анализа статьи для пользователя"""
+        EnhancedAIAnalysisService._add_rss_analysis(
+            analysis_result, rss_feed_id, user_id, db, article_id, processing_time_ms
+        )
+        db.commit()
+        consultation_answer_cache.invalidate(user_id)
+
+    @staticmethod
+    def _add_rss_analysis(analysis_result: Dict, rss_feed_id: str, user_id: str, db: Session,
+                          article_id: Optional[str], processing_time_ms: int):
+        """Добавление анализа в сессию (без commit)"""
+        analysis = RSSContentAnalysis(
+            user_id=user_id,
+            rss_feed_id=rss_feed_id,
+            article_id=article_id,
+            financial_relevance=analysis_result.get('financial_relevance', 0.5),
+            risk_indicators=analysis_result.get('risk_indicators', []),
+            sentiment_score=analysis_result.get('sentiment_score', 0.0),
+            key_topics=analysis_result.get('key_topics', []),
+            market_impact=analysis_result.get('market_impact', 'low'),
+            recommendations=analysis_result.get('recommendations', ''),
+            processing_time_ms=processing_time_ms,
+            ai_confidence=analysis_result.get('ai_confidence', 0.5)
+        )
+        
+        db.add(analysis)
+
+    @staticmethod
+    def _stage_rss_analyses(entries: List[tuple], db: Session) -> int:
+        """Запись пакета анализов одним commit.
+        
+        entries - список (analysis_result, item, processing_time_ms). Каждая
+        строка пишется в своей точке сохранения: ошибка одного канала
+        откатывает только его строку и не прерывает весь цикл.
+        Возвращает число сохраненных анализов.
+        """
+        stored_count = 0
+        stored_users = set()
+        for analysis_result, item, processing_time_ms in entries:
+            try:
+                with db.begin_nested():
+                    EnhancedAIAnalysisService._add_rss_analysis(
+                        analysis_result, item['rss_feed_id'], item['user_id'], db, item.get('article_id'),
+                        processing_time_ms
+                    )
+                stored_count += 1
+                stored_users.add(item['user_id'])
+            except Exception as e:
+                logger.error(f"Error storing RSS analysis for feed {item['rss_feed_id']}: {e}")
+        
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error committing {stored_count} RSS analyses: {e}")
+            return 0
+        for user_id in stored_users:
+            consultation_answer_cache.invalidate(user_id)
+        return stored_count
+
     @staticmethod
     async def analyze_financial_data_with_rss(exchange_rates: List[Dict], news_articles: List[Dict], 
                                             user_context: Optional[Dict] = None, user_id: Optional[str] = None, db: Optional[Session] = None):
         """Анализ финансовых данных с учетом пользовательских RSS"""
         try:
-            if not client:
+            if not llm_gateway:
                 logger.warning("OpenAI client not available, using mock analysis")
                 return {
                     'summary': 'Текущая экономическая ситуация характеризуется умеренной стабильностью валютного курса.',
@@ -754,8 +2563,7 @@ class EnhancedAIAnalysisService:
 Отвечай на русском языке, учитывая специфику казахстанского рынка.
 """
             
-            response = client.chat.completions.create(
-                model="gpt-4",
+            ai_response = await llm_gateway.chat(
                 messages=[
                     {"role": "system", "content": "Ты профессиональный финансовый аналитик, специализирующийся на казахстанском рынке. Анализируешь данные из различных источников, включая пользовательские RSS каналы."},
                     {"role": "user", "content": prompt}
@@ -764,8 +2572,6 @@ class EnhancedAIAnalysisService:
                 temperature=0.3
             )
             
-            ai_response = response.choices[0].message.content
-            
             # Попытка парсинга JSON ответа
             try:
                 analysis = json.loads(ai_response)
@@ -799,49 +2605,44 @@ class EnhancedAIAnalysisService:
             }
 
     @staticmethod
-    async def answer_question_with_rss(question: str, context: Optional[Dict] = None, user_id: Optional[str] = None, db: Optional[Session] = None):
-        """Ответ на вопрос пользователя с учетом RSS данных"""
+    def build_consultation_messages(question: str, context: Optional[Dict] = None, user_id: Optional[str] = None,
+                                    db: Optional[Session] = None) -> List[Dict[str, str]]:
+        """Сообщения для AI консультанта с актуальными курсами, новостями и RSS данными"""
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        
         try:
-            if not client:
-                return f"Извините, AI консультант временно недоступен. Ваш вопрос: '{question}' был сохранен для обработки."
+            # Последние курсы валют
+            latest_rates = fx_rates.snapshot(db).rows
             
-            # Получение актуальных данных для контекста
-            if not db:
-                db = SessionLocal()
+            # Последние новости
+            latest_news = db.query(NewsArticle).filter(
+                NewsArticle.created_at >= datetime.now() - timedelta(days=1)
+            ).limit(5).all()
             
-            try:
-                # Последние курсы валют
-                latest_rates = db.query(ExchangeRate).filter(
-                    ExchangeRate.date >= datetime.now() - timedelta(days=1)
-                ).all()
-                
-                # Последние новости
-                latest_news = db.query(NewsArticle).filter(
-                    NewsArticle.created_at >= datetime.now() - timedelta(days=1)
-                ).limit(5).all()
-                
-                # RSS анализ пользователя
-                rss_context = ""
-                if user_id:
-                    recent_rss = db.query(RSSContentAnalysis).filter(
-                        RSSContentAnalysis.user_id == user_id,
-                        RSSContentAnalysis.analysis_date >= datetime.now() - timedelta(days=2)
-                    ).order_by(RSSContentAnalysis.financial_relevance.desc()).limit(3).all()
-                    
-                    if recent_rss:
-                        rss_context = "\n\nДанные из ваших RSS каналов:\n"
-                        for rss in recent_rss:
-                            rss_context += f"- Темы: {', '.join(rss.key_topics[:3])}\n"
-                            rss_context += f"  Рекомендации: {rss.recommendations[:100]}...\n"
-                
-                rates_context = "\n".join([f"{r.from_currency}/{r.to_currency}: {r.rate}" for r in latest_rates])
-                news_context = "\n".join([f"- {n.title}" for n in latest_news])
+            # RSS анализ пользователя
+            rss_context = ""
+            if user_id:
+                recent_rss = db.query(RSSContentAnalysis).filter(
+                    RSSContentAnalysis.user_id == user_id,
+                    RSSContentAnalysis.analysis_date >= datetime.now() - timedelta(days=2)
+                ).order_by(RSSContentAnalysis.financial_relevance.desc()).limit(3).all()
                 
-            finally:
-                if 'db' in locals():
-                    db.close()
+                if recent_rss:
+                    rss_context = "\n\nДанные из ваших RSS каналов:\n"
+                    for rss in recent_rss:
+                        rss_context += f"- Темы: {', '.join(rss.key_topics[:3])}\n"
+                        rss_context += f"  Рекомендации: {rss.recommendations[:100]}...\n"
             
-            prompt = f"""
+            rates_context = "\n".join([f"{r['from_currency']}/{r['to_currency']}: {r['rate']}" for r in latest_rates])
+            news_context = "\n".join([f"- {n.title}" for n in latest_news])
+            
+        finally:
+            if own_session:
+                db.close()
+        
+        prompt = f"""
 Контекст:
 АКТУАЛЬНЫЕ КУРСЫ ВАЛЮТ:
 {rates_context}
@@ -860,85 +2661,140 @@ class EnhancedAIAnalysisService:
 Используй актуальные данные из контекста, включая данные из RSS каналов пользователя.
 Ответ должен быть информативным, но кратким (до 300 слов).
 """
+        
+        return [
+            {"role": "system", "content": "Ты профессиональный финансовый консультант Financial AI Dashboard. Отвечаешь на русском языке, даёшь практические советы на основе актуальных данных, включая пользовательские RSS источники."},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def prepare_consultation(db: Session, question: str, context: Optional[Dict] = None,
+                             user_id: Optional[str] = None) -> tuple:
+        """(ключ кеша, ответ из кеша, сообщения для AI); сообщения собираются только при промахе"""
+        cache_key = consultation_answer_cache.make_key(db, question, context, user_id)
+        cached_answer = consultation_answer_cache.get(cache_key)
+        if cached_answer is not None:
+            return cache_key, cached_answer, None
+        return cache_key, None, EnhancedAIAnalysisService.build_consultation_messages(question, context, user_id, db)
+
+    @staticmethod
+    async def answer_question_with_rss(question: str, context: Optional[Dict] = None, user_id: Optional[str] = None, db=None):
+        """Ответ на вопрос пользователя с учетом RSS данных.
+
+        db - Session или AsyncSession; без нее открывается своя асинхронная сессия.
+        """
+        try:
+            if not llm_gateway:
+                return f"Извините, AI консультант временно недоступен. Ваш вопрос: '{question}' был сохранен для обработки."
             
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "Ты профессиональный финансовый консультант Financial AI Dashboard. Отвечаешь на русском языке, даёшь практические советы на основе актуальных данных, включая пользовательские RSS источники."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.4
+            cache_key, cached_answer, messages = await run_with_session(
+                db, EnhancedAIAnalysisService.prepare_consultation, question, context, user_id
             )
+            if cached_answer is not None:
+                return cached_answer
             
-            return response.choices[0].message.content
+            answer = await llm_gateway.chat(messages=messages, max_tokens=500, temperature=0.4)
+            consultation_answer_cache.put(cache_key, answer)
+            return answer
             
         except Exception as e:
             logger.error(f"Error answering question with RSS: {e}")
             return f"Извините, произошла ошибка при обработке вашего вопроса. Пожалуйста, повторите попытку позже. Ваш вопрос был: '{question}'"
 
+    @staticmethod
+    async def stream_answer_with_rss(question: str, context: Optional[Dict] = None, user_id: Optional[str] = None):
+        """Потоковый ответ на вопрос пользователя с учетом RSS данных.
+
+        Контекст собирается в отдельной сессии до начала генерации, так как
+        поток переживает сессию запроса.
+        """
+        if not llm_gateway:
+            yield f"Извините, AI консультант временно недоступен. Ваш вопрос: '{question}' был сохранен для обработки."
+            return
+        
+        try:
+            cache_key, cached_answer, messages = await run_with_session(
+                None, EnhancedAIAnalysisService.prepare_consultation, question, context, user_id
+            )
+            
+            if cached_answer is not None:
+                yield cached_answer
+                return
+            
+            parts: List[str] = []
+            async for delta in llm_gateway.stream_chat(messages=messages, max_tokens=500, temperature=0.4):
+                parts.append(delta)
+                yield delta
+            consultation_answer_cache.put(cache_key, "".join(parts))
+        except Exception as e:
+            logger.error(f"Error streaming answer with RSS: {e}")
+            yield f"Извините, произошла ошибка при обработке вашего вопроса. Пожалуйста, повторите попытку позже. Ваш вопрос был: '{question}'"
+
 # =============================================================================
 # Обновленные задачи по расписанию
 # =============================================================================
 
 async def update_user_rss_feeds():
-    """Обновление пользовательских RSS каналов"""
+    """Обновление пользовательских RSS каналов.
+    
+    Каждый канал, которому пора обновиться, загружается ровно один раз за цикл,
+    а его статьи сохраняются и анализируются только для этого канала.
+    """
     logger.info("Starting user RSS feeds update...")
     
     try:
         db = SessionLocal()
         try:
             # Получаем RSS каналы, которые нужно обновить
-            now = datetime.utcnow()
-            feeds_to_update = db.query(UserRSSFeed).filter(
-                UserRSSFeed.is_active == True
-            ).all()
+            due_feeds = EnhancedNewsService.get_due_feeds(db)
+            if not due_feeds:
+                logger.info("No RSS feeds due for update")
+                return
+            due_feeds = EnhancedNewsService.with_url_subscribers(due_feeds, db)
+            
+            logger.info(f"Updating {len(due_feeds)} RSS feeds")
+            articles_by_feed = await EnhancedNewsService.refresh_feeds(due_feeds, db)
+            
+            # Сохраняем статьи всех каналов одним пакетом с дедупликацией
+            all_articles = [article for articles in articles_by_feed.values() for article in articles]
+            stored = NewsArticleStore.insert_batch(db, all_articles, resolve_existing=True)
+            logger.info(f"Stored {sum(1 for _, inserted in stored.values() if inserted)} new of {len(all_articles)} RSS articles")
+            
+            # Уже проанализированные пары (пользователь, статья) пропускаем
+            analyzed = set()
+            if stored:
+                analyzed = {
+                    (str(user_id), str(article_id))
+                    for user_id, article_id in db.query(RSSContentAnalysis.user_id, RSSContentAnalysis.article_id).filter(
+                        RSSContentAnalysis.article_id.in_([article_id for article_id, _ in stored.values()])
+                    ).all()
+                }
+            # Валидаторы, статистика каналов и статьи фиксируются одной транзакцией
+            db.commit()
+            if any(inserted for _, inserted in stored.values()):
+                dashboard_snapshots.invalidate_global("news")
+                event_broker.broadcast("dashboard.changed", {"sections": ["news"]})
             
-            for feed in feeds_to_update:
-                try:
-                    # Проверяем, нужно ли обновлять этот канал
-                    if feed.last_fetched:
-                        time_diff = now - feed.last_fetched
-                        
-                        if feed.fetch_frequency == "hourly" and time_diff < timedelta(hours=1):
-                            continue
-                        elif feed.fetch_frequency == "daily" and time_diff < timedelta(days=1):
-                            continue
-                        elif feed.fetch_frequency == "weekly" and time_diff < timedelta(weeks=1):
-                            continue
-                    
-                    logger.info(f"Updating RSS feed: {feed.name}")
-                    
-                    # Получаем статьи из RSS
-                    articles = await EnhancedNewsService.fetch_user_rss_feeds(str(feed.user_id), db)
-                    
-                    # Анализируем каждую статью с помощью AI
-                    for article in articles:
-                        if article.get('rss_feed_id') == str(feed.id):
-                            # Сохраняем статью в базу
-                            news_article = NewsArticle(
-                                title=article['title'],
-                                content=article['content'],
-                                url=article['url'],
-                                published_at=article['published_at'],
-                                source=article['source'],
-                                category=article['category'],
-                                relevance_score=article.get('relevance_score', 0.5)
-                            )
-                            db.add(news_article)
-                            db.flush()
-                            
-                            # AI анализ статьи
-                            if feed.auto_analysis:
-                                await EnhancedAIAnalysisService.analyze_rss_content(
-                                    article, str(feed.id), str(feed.user_id), db
-                                )
-                    
-                except Exception as e:
-                    logger.error(f"Error updating RSS feed {feed.name}: {e}")
-                    feed.error_count += 1
-                    feed.last_error = str(e)
+            analysis_items = []
+            for feed in due_feeds:
+                if not feed.auto_analysis:
                     continue
+                for article in articles_by_feed.get(str(feed.id), []):
+                    article_id, _ = stored[article['fingerprint']]
+                    if (str(feed.user_id), str(article_id)) in analyzed:
+                        continue
+                    analyzed.add((str(feed.user_id), str(article_id)))
+                    analysis_items.append({
+                        'article': article,
+                        'rss_feed_id': str(feed.id),
+                        'user_id': str(feed.user_id),
+                        'article_id': article_id
+                    })
+            
+            # AI анализ всех новых статей цикла пакетными запросами
+            if analysis_items:
+                stored_analyses = await EnhancedAIAnalysisService.analyze_rss_content_batch(analysis_items, db)
+                logger.info(f"Stored {stored_analyses} RSS analyses for {len(analysis_items)} articles")
             
             db.commit()
             logger.info("User RSS feeds update completed")
@@ -955,10 +2811,10 @@ async def update_exchange_rates():
     logger.info("Starting scheduled exchange rates update...")
     
     try:
-        rates = await NBKExchangeRateService.fetch_exchange_rates()
-        
         db = SessionLocal()
         try:
+            rates = await NBKExchangeRateService.fetch_exchange_rates(db)
+            
             for rate_data in rates:
                 # Проверяем, есть ли уже такой курс на сегодня
                 existing = db.query(ExchangeRate).filter(
@@ -972,6 +2828,17 @@ async def update_exchange_rates():
                     db.add(rate)
             
             db.commit()
+            if rates:
+                fx_rates.refresh(db)
+                consultation_answer_cache.invalidate()
+                dashboard_snapshots.invalidate_global("rates", "accounts")
+                event_broker.broadcast("rates.updated", {
+                    "rates": [
+                        {"from_currency": row["from_currency"], "to_currency": row["to_currency"], "rate": row["rate"]}
+                        for row in fx_rates.snapshot().rows
+                    ]
+                })
+                event_broker.broadcast("dashboard.changed", {"sections": ["accounts", "rates"]})
             logger.info(f"Successfully updated {len(rates)} exchange rates")
             
         finally:
@@ -985,32 +2852,29 @@ async def update_news():
     logger.info("Starting scheduled news update...")
     
     try:
-        articles = await EnhancedNewsService.fetch_default_news()
-        
         db = SessionLocal()
         try:
+            articles = await EnhancedNewsService.fetch_default_news(db)
+            
             for article_data in articles:
-                # Проверяем, есть ли уже такая новость
-                existing = db.query(NewsArticle).filter(
-                    NewsArticle.title == article_data['title']
-                ).first()
+                # Анализ настроения через AI (упрощенно)
+                if any(word in article_data['title'].lower() for word in ['рост', 'увеличение', 'стабильность']):
+                    sentiment = 'positive'
+                elif any(word in article_data['title'].lower() for word in ['падение', 'снижение', 'кризис']):
+                    sentiment = 'negative'
+                else:
+                    sentiment = 'neutral'
                 
-                if not existing:
-                    # Анализ настроения через AI (упрощенно)
-                    if any(word in article_data['title'].lower() for word in ['рост', 'увеличение', 'стабильность']):
-                        sentiment = 'positive'
-                    elif any(word in article_data['title'].lower() for word in ['падение', 'снижение', 'кризис']):
-                        sentiment = 'negative'
-                    else:
-                        sentiment = 'neutral'
-                    
-                    article_data['sentiment'] = sentiment
-                    article_data['risk_level'] = 'medium'  # По умолчанию
-                    
-                    news = NewsArticle(**article_data)
-                    db.add(news)
+                article_data['sentiment'] = sentiment
+                article_data['risk_level'] = 'medium'  # По умолчанию
+            
+            # Дубликаты отсекаются уникальным индексом по fingerprint
+            stored = NewsArticleStore.insert_batch(db, articles)
             
             db.commit()
+            if any(inserted for _, inserted in stored.values()):
+                dashboard_snapshots.invalidate_global("news")
+                event_broker.broadcast("dashboard.changed", {"sections": ["news"]})
             logger.info(f"Successfully updated {len(articles)} news articles")
             
         finally:
@@ -1029,9 +2893,7 @@ async def generate_daily_report():
             # Получение актуальных данных
             today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
             
-            rates = db.query(ExchangeRate).filter(
-                ExchangeRate.date >= today
-            ).all()
+            rates = fx_rates.snapshot(db).rows
             
             news = db.query(NewsArticle).filter(
                 NewsArticle.created_at >= today
@@ -1039,7 +2901,7 @@ async def generate_daily_report():
             
             # AI анализ с учетом всех RSS данных
             analysis = await EnhancedAIAnalysisService.analyze_financial_data_with_rss(
-                [{'from_currency': r.from_currency, 'to_currency': r.to_currency, 'rate': r.rate} for r in rates],
+                [{'from_currency': r['from_currency'], 'to_currency': r['to_currency'], 'rate': r['rate']} for r in rates],
                 [{'title': n.title, 'content': n.content or ''} for n in news],
                 db=db
             )
@@ -1064,7 +2926,7 @@ async def generate_daily_report():
 **Дата:** {datetime.now().strftime('%d.%m.%Y')}
 
 ## 📊 Курсы валют (НБ РК)
-{chr(10).join([f"- {r.from_currency}/{r.to_currency}: {r.rate:.2f}" for r in rates])}
+{chr(10).join([f"- {r['from_currency']}/{r['to_currency']}: {r['rate']:.2f}" for r in rates])}
 
 ## 📈 Анализ ситуации
 {analysis['summary']}
@@ -1107,12 +2969,22 @@ async def generate_daily_report():
         logger.error(f"Error generating daily report: {e}")
 
 # Планировщик задач
+def run_scheduled_job(job):
+    """Запуск async задачи в своем event loop с закрытием его соединений к LLM"""
+    async def run():
+        try:
+            await job()
+        finally:
+            if llm_gateway:
+                await llm_gateway.aclose()
+    asyncio.run(run())
+
 def schedule_tasks():
     """Планирование автоматических задач"""
-    schedule.every().day.at("08:00").do(lambda: asyncio.run(update_exchange_rates()))
-    schedule.every().hour.do(lambda: asyncio.run(update_news()))
-    schedule.every().hour.do(lambda: asyncio.run(update_user_rss_feeds()))  # НОВОЕ
-    schedule.every().day.at("09:00").do(lambda: asyncio.run(generate_daily_report()))
+    schedule.every().day.at("08:00").do(run_scheduled_job, update_exchange_rates)
+    schedule.every().hour.do(run_scheduled_job, update_news)
+    schedule.every().hour.do(run_scheduled_job, update_user_rss_feeds)  # НОВОЕ
+    schedule.every().day.at("09:00").do(run_scheduled_job, generate_daily_report)
     
     logger.info("Enhanced scheduled tasks configured")
 
@@ -1145,10 +3017,17 @@ async def health_check():
         "services": {
             "database": "connected",
             "nbk_api": "available",
-            "ai_service": "available" if client else "unavailable",
+            "ai_service": "available" if llm_gateway else "unavailable",
             "news_service": "available",
             "rss_feeds": "available"
         },
+        "ai_analysis_cache": ai_analysis_cache.stats(),
+        "consultation_answer_cache": consultation_answer_cache.stats(),
+        "dashboard_snapshots": dashboard_snapshots.stats(),
+        "live_events": event_broker.stats(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "login_limiter": login_limiter.stats(),
         "version": "2.1.0"
     }
 
@@ -1157,10 +3036,12 @@ async def health_check():
 # =============================================================================
 
 @app.get("/api/rss/feeds", response_model=List[RSSFeedResponse])
-async def get_user_rss_feeds(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_rss_feeds(current_user: AuthPrincipal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)):
     """Получение списка RSS каналов пользователя"""
     try:
-        feeds = db.query(UserRSSFeed).filter(UserRSSFeed.user_id == current_user.id).all()
+        feeds = (await db.execute(
+            select(UserRSSFeed).where(UserRSSFeed.user_id == current_user.id)
+        )).scalars().all()
         
         return [
             RSSFeedResponse(
@@ -1189,17 +3070,19 @@ async def get_user_rss_feeds(current_user: User = Depends(get_current_user), db:
 @app.post("/api/rss/feeds", response_model=RSSFeedResponse)
 async def create_rss_feed(
     feed_data: RSSFeedCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создание нового RSS канала"""
     try:
-        # Валидация RSS URL
-        if not validate_rss_url(str(feed_data.url)):
+        # Валидация RSS URL (синхронный HTTP запрос - в отдельном потоке)
+        if not await asyncio.to_thread(validate_rss_url, str(feed_data.url)):
             raise HTTPException(status_code=400, detail="Недоступный или некорректный RSS URL")
         
         # Проверка лимитов подписки
-        existing_feeds_count = db.query(UserRSSFeed).filter(UserRSSFeed.user_id == current_user.id).count()
+        existing_feeds_count = await db.scalar(
+            select(func.count()).select_from(UserRSSFeed).where(UserRSSFeed.user_id == current_user.id)
+        )
         
         max_feeds = 5 if current_user.subscription_plan == "starter" else 20 if current_user.subscription_plan == "professional" else 100
         
@@ -1223,13 +3106,16 @@ async def create_rss_feed(
         )
         
         db.add(rss_feed)
-        db.commit()
-        db.refresh(rss_feed)
+        await db.commit()
+        await db.refresh(rss_feed)
         
-        # Немедленное тестовое обновление
+        # Немедленное тестовое обновление (только нового канала)
         try:
-            await EnhancedNewsService.fetch_user_rss_feeds(str(current_user.id), db)
+            await EnhancedNewsService.refresh_feeds([rss_feed], db, use_validators=False)
+            await db.commit()
         except Exception as e:
+            await db.rollback()
+            await db.refresh(rss_feed)
             logger.warning(f"Initial RSS fetch failed: {e}")
         
         return RSSFeedResponse(
@@ -1259,15 +3145,15 @@ async def create_rss_feed(
 async def update_rss_feed(
     feed_id: str,
     feed_data: RSSFeedUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Обновление RSS канала"""
     try:
-        feed = db.query(UserRSSFeed).filter(
+        feed = (await db.execute(select(UserRSSFeed).where(
             UserRSSFeed.id == feed_id,
             UserRSSFeed.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not feed:
             raise HTTPException(status_code=404, detail="RSS канал не найден")
@@ -1278,8 +3164,8 @@ async def update_rss_feed(
             setattr(feed, field, value)
         
         feed.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(feed)
+        await db.commit()
+        await db.refresh(feed)
         
         return RSSFeedResponse(
             id=str(feed.id),
@@ -1307,27 +3193,27 @@ async def update_rss_feed(
 @app.delete("/api/rss/feeds/{feed_id}")
 async def delete_rss_feed(
     feed_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Удаление RSS канала"""
     try:
-        feed = db.query(UserRSSFeed).filter(
+        feed = (await db.execute(select(UserRSSFeed).where(
             UserRSSFeed.id == feed_id,
             UserRSSFeed.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not feed:
             raise HTTPException(status_code=404, detail="RSS канал не найден")
         
         # Удаляем связанные анализы
-        db.query(RSSContentAnalysis).filter(
+        await db.execute(delete(RSSContentAnalysis).where(
             RSSContentAnalysis.rss_feed_id == feed_id
-        ).delete()
+        ))
         
         # Удаляем сам канал
-        db.delete(feed)
-        db.commit()
+        await db.delete(feed)
+        await db.commit()
         
         return {"message": "RSS канал успешно удален"}
         
@@ -1340,24 +3226,23 @@ async def delete_rss_feed(
 @app.post("/api/rss/feeds/{feed_id}/test")
 async def test_rss_feed(
     feed_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Тестирование RSS канала"""
     try:
-        feed = db.query(UserRSSFeed).filter(
+        feed = (await db.execute(select(UserRSSFeed).where(
             UserRSSFeed.id == feed_id,
             UserRSSFeed.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not feed:
             raise HTTPException(status_code=404, detail="RSS канал не найден")
         
-        # Тестовое получение данных
-        articles = await EnhancedNewsService.fetch_user_rss_feeds(str(current_user.id), db)
-        
-        # Фильтруем статьи для этого канала
-        feed_articles = [a for a in articles if a.get('rss_feed_id') == feed_id]
+        # Тестовое получение данных только для этого канала
+        articles_by_feed = await EnhancedNewsService.refresh_feeds([feed], db, use_validators=False)
+        await db.commit()
+        feed_articles = articles_by_feed.get(str(feed.id), [])
         
         return {
             "status": "success",
@@ -1381,18 +3266,20 @@ async def test_rss_feed(
 
 @app.get("/api/rss/analysis")
 async def get_rss_analysis(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db),
     days: int = 7
 ):
     """Получение анализа RSS контента"""
     try:
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        analyses = db.query(RSSContentAnalysis).filter(
-            RSSContentAnalysis.user_id == current_user.id,
-            RSSContentAnalysis.analysis_date >= start_date
-        ).order_by(RSSContentAnalysis.financial_relevance.desc()).limit(50).all()
+        analyses = (await db.execute(
+            select(RSSContentAnalysis).where(
+                RSSContentAnalysis.user_id == current_user.id,
+                RSSContentAnalysis.analysis_date >= start_date
+            ).order_by(RSSContentAnalysis.financial_relevance.desc()).limit(50)
+        )).scalars().all()
         
         # Агрегированная статистика
         total_analyses = len(analyses)
@@ -1443,14 +3330,17 @@ async def get_rss_analysis(
 # =============================================================================
 
 @app.post("/api/auth/login")
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Авторизация пользователя"""
-    user = db.query(User).filter(User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    login_limiter.check(user_data.email)
+    user = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
+    if not user or not await password_hasher.verify(user_data.password, user.hashed_password):
+        login_limiter.record_failure(user_data.email)
         raise HTTPException(status_code=401, detail="Неверный email или пароль")
+    login_limiter.reset(user_data.email)
     
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     access_token = create_access_token(
         data={"sub": user.email},
@@ -1470,13 +3360,13 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/register")
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Регистрация пользователя"""
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Пользователь с таким email уже существует")
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user = User(
         email=user_data.email,
         name=user_data.name,
@@ -1484,8 +3374,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         company=user_data.company
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     access_token = create_access_token(
         data={"sub": user.email},
@@ -1504,111 +3394,211 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         }
     }
 
+STREAMING_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/api/events")
+async def live_events(request: Request, token: Optional[str] = None, last_event_id: Optional[str] = None):
+    """Канал событий: изменения дашборда, курсы, RSS анализ.
+
+    EventSource не умеет передавать заголовок Authorization, поэтому токен
+    можно передать в ?token=. При переподключении поток продолжается с Last-Event-ID.
+    """
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Сессия нужна только для аутентификации, а не на все время потока
+    principal = auth_cache.get(token)
+    if principal is None:
+        async with AsyncSessionLocal() as db:
+            principal = await db.run_sync(load_principal, token)
+    user_id = str(principal.id)
+    
+    return StreamingResponse(
+        event_broker.stream(user_id, request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers=STREAMING_HEADERS
+    )
+
+# Ключи ответа /api/dashboard по секциям снимка
+DASHBOARD_RESPONSE_KEYS = {
+    "profile": ("user",),
+    "rates": ("exchange_rates",),
+    "news": ("news",),
+    "rss": ("rss_insights",),
+    "accounts": ("accounts",),
+}
+
 @app.get("/api/dashboard")
-async def get_dashboard_data(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Получение данных для дашборда с RSS инсайтами"""
+async def get_dashboard_data(
+    request: Request,
+    since: Optional[str] = None,
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Получение данных для дашборда с RSS инсайтами.
+
+    Данные берутся из снимка пользователя; заново запрашиваются только
+    секции, входные данные которых изменились. На If-None-Match отвечает 304,
+    с ?since=<версия> возвращает только секции, изменившиеся после нее.
+    """
     try:
-        # Получение актуальных курсов валют
-        latest_rates = db.query(ExchangeRate).filter(
-            ExchangeRate.date >= datetime.now() - timedelta(days=1)
-        ).all()
-        
-        # Получение последних новостей
-        latest_news = db.query(NewsArticle).filter(
-            NewsArticle.created_at >= datetime.now() - timedelta(days=1)
-        ).limit(5).all()
-        
-        # Получение банковских счетов пользователя
-        accounts = db.query(BankAccount).filter(BankAccount.user_id == current_user.id).all()
-        
-        # Получение RSS статистики пользователя
-        rss_feeds_count = db.query(UserRSSFeed).filter(
-            UserRSSFeed.user_id == current_user.id,
-            UserRSSFeed.is_active == True
-        ).count()
-        
-        recent_rss_analyses = db.query(RSSContentAnalysis).filter(
-            RSSContentAnalysis.user_id == current_user.id,
-            RSSContentAnalysis.analysis_date >= datetime.now() - timedelta(days=1)
-        ).order_by(RSSContentAnalysis.financial_relevance.desc()).limit(3).all()
-        
-        # Расчет общего баланса в тенге
-        total_balance_kzt = 0
-        for account in accounts:
-            if account.currency == "KZT":
-                total_balance_kzt += account.balance
-            else:
-                # Конвертация через актуальные курсы
-                rate = next((r.rate for r in latest_rates if r.from_currency == account.currency and r.to_currency == "KZT"), 1)
-                total_balance_kzt += account.balance * rate
-        
-        # Определение статуса ликвидности
-        if total_balance_kzt < 30000000:
-            liquidity_status = "CRITICAL"
-        elif total_balance_kzt < 100000000:
-            liquidity_status = "LOW"
-        elif total_balance_kzt > 300000000:
-            liquidity_status = "EXCESS"
-        else:
-            liquidity_status = "ADEQUATE"
-        
-        return {
-            "user": {
-                "name": current_user.name,
-                "company": current_user.company,
-                "subscription_plan": current_user.subscription_plan
-            },
-            "summary": {
-                "total_balance_kzt": total_balance_kzt,
-                "liquidity_status": liquidity_status,
-                "accounts_count": len(accounts),
-                "rss_feeds_count": rss_feeds_count,
-                "last_updated": datetime.now().isoformat()
-            },
-            "exchange_rates": [
-                {
-                    "from_currency": rate.from_currency,
-                    "to_currency": rate.to_currency,
-                    "rate": rate.rate,
-                    "date": rate.date.isoformat(),
-                    "source": rate.source
+        # Секции собираются синхронным кодом внутри run_sync: запросы идут через asyncpg
+        def load_snapshot(db: Session):
+            def build_profile():
+                return {
+                    "user": {
+                        "name": current_user.name,
+                        "company": current_user.company,
+                        "subscription_plan": current_user.subscription_plan
+                    }
                 }
-                for rate in latest_rates
-            ],
-            "news": [
-                {
-                    "id": str(news.id),
-                    "title": news.title,
-                    "content": news.content[:200] + "..." if news.content and len(news.content) > 200 else news.content,
-                    "url": news.url,
-                    "source": news.source,
-                    "sentiment": news.sentiment,
-                    "published_at": news.published_at.isoformat() if news.published_at else None
+            
+            def build_rates():
+                # Актуальные курсы валют (общий снимок для дашборда и отчетов)
+                return {
+                    "exchange_rates": [
+                        {
+                            "from_currency": rate["from_currency"],
+                            "to_currency": rate["to_currency"],
+                            "rate": rate["rate"],
+                            "date": rate["date"].isoformat(),
+                            "source": rate["source"]
+                        }
+                        for rate in fx_rates.snapshot(db).rows
+                    ]
                 }
-                for news in latest_news
-            ],
-            "rss_insights": [
-                {
-                    "key_topics": analysis.key_topics[:3],
-                    "market_impact": analysis.market_impact,
-                    "sentiment_score": analysis.sentiment_score,
-                    "financial_relevance": analysis.financial_relevance,
-                    "recommendations": analysis.recommendations[:100] + "..." if len(analysis.recommendations) > 100 else analysis.recommendations
+            
+            def build_news():
+                latest_news = db.query(NewsArticle).filter(
+                    NewsArticle.created_at >= datetime.now() - timedelta(days=1)
+                ).limit(5).all()
+                return {
+                    "news": [
+                        {
+                            "id": str(news.id),
+                            "title": news.title,
+                            "content": news.content[:200] + "..." if news.content and len(news.content) > 200 else news.content,
+                            "url": news.url,
+                            "source": news.source,
+                            "sentiment": news.sentiment,
+                            "published_at": news.published_at.isoformat() if news.published_at else None
+                        }
+                        for news in latest_news
+                    ]
                 }
-                for analysis in recent_rss_analyses
-            ],
-            "accounts": [
-                {
-                    "id": str(account.id),
-                    "name": account.name,
-                    "bank": account.bank,
-                    "balance": account.balance,
-                    "currency": account.currency,
-                    "account_type": account.account_type
+            
+            def build_rss():
+                rss_feeds_count = db.query(UserRSSFeed).filter(
+                    UserRSSFeed.user_id == current_user.id,
+                    UserRSSFeed.is_active == True
+                ).count()
+                
+                recent_rss_analyses = db.query(RSSContentAnalysis).filter(
+                    RSSContentAnalysis.user_id == current_user.id,
+                    RSSContentAnalysis.analysis_date >= datetime.now() - timedelta(days=1)
+                ).order_by(RSSContentAnalysis.financial_relevance.desc()).limit(3).all()
+                
+                return {
+                    "rss_feeds_count": rss_feeds_count,
+                    "rss_insights": [
+                        {
+                            "key_topics": analysis.key_topics[:3],
+                            "market_impact": analysis.market_impact,
+                            "sentiment_score": analysis.sentiment_score,
+                            "financial_relevance": analysis.financial_relevance,
+                            "recommendations": analysis.recommendations[:100] + "..." if len(analysis.recommendations) > 100 else analysis.recommendations
+                        }
+                        for analysis in recent_rss_analyses
+                    ]
                 }
-                for account in accounts
-            ]
+            
+            def build_accounts():
+                accounts = db.query(BankAccount).filter(BankAccount.user_id == current_user.id).all()
+                
+                # Расчет общего баланса в тенге
+                rates = fx_rates.snapshot(db)
+                total_balance_kzt = sum(rates.to_base(account.balance, account.currency) for account in accounts)
+                
+                # Определение статуса ликвидности
+                if total_balance_kzt < 30000000:
+                    liquidity_status = "CRITICAL"
+                elif total_balance_kzt < 100000000:
+                    liquidity_status = "LOW"
+                elif total_balance_kzt > 300000000:
+                    liquidity_status = "EXCESS"
+                else:
+                    liquidity_status = "ADEQUATE"
+                
+                return {
+                    "total_balance_kzt": total_balance_kzt,
+                    "liquidity_status": liquidity_status,
+                    "accounts": [
+                        {
+                            "id": str(account.id),
+                            "name": account.name,
+                            "bank": account.bank,
+                            "balance": account.balance,
+                            "currency": account.currency,
+                            "account_type": account.account_type
+                        }
+                        for account in accounts
+                    ]
+                }
+            
+            return dashboard_snapshots.get(current_user.id, "web", {
+                "profile": build_profile,
+                "rates": build_rates,
+                "news": build_news,
+                "rss": build_rss,
+                "accounts": build_accounts,
+            })
+        
+        snapshot = await db.run_sync(load_snapshot)
+        document = snapshot["document"]
+        
+        headers = {
+            "ETag": snapshot["etag"],
+            "X-Dashboard-Version": snapshot["version_token"],
+            "Cache-Control": "private, no-cache",
+            "Vary": "Authorization"
         }
+        if etag_matches(request.headers.get("if-none-match"), snapshot["etag"]):
+            return Response(status_code=304, headers=headers)
+        
+        content = {
+            "user": document["user"],
+            "summary": {
+                "total_balance_kzt": document["total_balance_kzt"],
+                "liquidity_status": document["liquidity_status"],
+                "accounts_count": len(document["accounts"]),
+                "rss_feeds_count": document["rss_feeds_count"],
+                "last_updated": snapshot["built_at"].isoformat()
+            },
+            "exchange_rates": document["exchange_rates"],
+            "news": document["news"],
+            "rss_insights": document["rss_insights"],
+            "accounts": document["accounts"]
+        }
+        
+        # В режиме delta остаются только изменившиеся секции (сводка - всегда)
+        changed = dashboard_snapshots.changed_sections(snapshot, since)
+        if changed is not None:
+            keep = {"summary"} | {key for section in changed for key in DASHBOARD_RESPONSE_KEYS[section]}
+            content = {key: value for key, value in content.items() if key in keep}
+        
+        content.update({
+            "version": snapshot["version_token"],
+            "delta": changed is not None,
+            "changed_sections": changed if changed is not None else list(snapshot["sections"])
+        })
+        return JSONResponse(content=content, headers=headers)
         
     except Exception as e:
         logger.error(f"Error getting dashboard data: {e}")
@@ -1617,8 +3607,8 @@ async def get_dashboard_data(current_user: User = Depends(get_current_user), db:
 @app.post("/api/ai/consult")
 async def ai_consultation(
     request: AIQuestionRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """AI консультация с учетом RSS данных"""
     try:
@@ -1637,10 +3627,10 @@ async def ai_consultation(
             )
             
             # Получаем RSS источники, которые были использованы
-            rss_sources = db.query(UserRSSFeed).filter(
+            rss_sources = (await db.execute(select(UserRSSFeed).where(
                 UserRSSFeed.user_id == current_user.id,
                 UserRSSFeed.is_active == True
-            ).limit(5).all()
+            ).limit(5))).scalars().all()
             
             rss_sources_info = [{"name": feed.name, "category": feed.category} for feed in rss_sources]
         else:
@@ -1660,7 +3650,7 @@ async def ai_consultation(
             source=request.source
         )
         db.add(consultation)
-        db.commit()
+        await db.commit()
         
         return {
             "id": str(consultation.id),
@@ -1675,8 +3665,99 @@ async def ai_consultation(
         logger.error(f"Error in AI consultation: {e}")
         raise HTTPException(status_code=500, detail="Ошибка AI консультации")
 
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Кадр Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def persist_streamed_consultation(consultation_fields: Dict[str, Any], response: str,
+                                        webhook_log_id: Optional[uuid.UUID] = None,
+                                        webhook_response: Optional[Dict[str, Any]] = None) -> AIConsultation:
+    """Сохранение консультации после завершения потока.
+
+    Используется отдельная сессия: сессия запроса не должна удерживаться
+    на время генерации ответа.
+    """
+    async with AsyncSessionLocal() as db:
+        consultation = AIConsultation(response=response, **consultation_fields)
+        db.add(consultation)
+        if webhook_log_id is not None:
+            await db.execute(
+                update(WebhookLog)
+                .where(WebhookLog.id == webhook_log_id)
+                .values(response=webhook_response)
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+        await db.refresh(consultation)
+        return consultation
+
+@app.post("/api/ai/consult/stream")
+async def ai_consultation_stream(
+    request: AIQuestionRequest,
+    current_user: AuthPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Потоковая AI консультация (Server-Sent Events).
+
+    События: meta (источники), delta (фрагмент ответа), done (id сохраненной консультации).
+    """
+    user_context = {
+        "user_id": str(current_user.id),
+        "company": current_user.company,
+        "subscription_plan": current_user.subscription_plan
+    }
+    user_context.update(request.context)
+    
+    rss_sources_info = []
+    if request.include_rss:
+        rss_sources = (await db.execute(select(UserRSSFeed).where(
+            UserRSSFeed.user_id == current_user.id,
+            UserRSSFeed.is_active == True
+        ).limit(5))).scalars().all()
+        rss_sources_info = [{"name": feed.name, "category": feed.category} for feed in rss_sources]
+    
+    consultation_fields = {
+        "user_id": current_user.id,
+        "question": request.question,
+        "context_data": user_context,
+        "rss_sources_used": rss_sources_info,
+        "session_id": str(uuid.uuid4()),
+        "source": request.source
+    }
+    rss_user_id = str(current_user.id) if request.include_rss else None
+    
+    async def event_stream():
+        yield format_sse("meta", {
+            "question": request.question,
+            "rss_sources_used": rss_sources_info,
+            "include_rss": request.include_rss
+        })
+        
+        parts: List[str] = []
+        try:
+            async for delta in EnhancedAIAnalysisService.stream_answer_with_rss(request.question, user_context, rss_user_id):
+                parts.append(delta)
+                yield format_sse("delta", {"content": delta})
+        finally:
+            # Сохраняем и при обрыве соединения - с той частью ответа, что успела сгенерироваться.
+            # Starlette отменяет генератор при отключении клиента, поэтому запись экранирована от отмены
+            consultation = None
+            if parts:
+                with anyio.CancelScope(shield=True):
+                    try:
+                        consultation = await persist_streamed_consultation(consultation_fields, "".join(parts))
+                    except Exception as e:
+                        logger.error(f"Error saving streamed consultation: {e}")
+        
+        yield format_sse("done", {
+            "id": str(consultation.id) if consultation else None,
+            "created_at": consultation.created_at.isoformat() if consultation else None
+        })
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=STREAMING_HEADERS)
+
 @app.get("/api/reports/latest")
-async def get_latest_report(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_latest_report(current_user: AuthPrincipal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Получение последнего отчета с RSS данными"""
     try:
         latest_report = db.query(Report).filter(
@@ -1792,12 +3873,81 @@ async def n8n_chat_webhook(payload: Dict[str, Any], db: Session = Depends(get_db
         logger.error(f"Error processing n8n webhook: {e}")
         raise HTTPException(status_code=500, detail="Ошибка обработки webhook")
 
+@app.post("/webhook/n8n/chat/stream")
+async def n8n_chat_webhook_stream(payload: Dict[str, Any], db: Session = Depends(get_db)):
+    """Потоковый webhook для n8n (NDJSON: строки delta, затем done)"""
+    message = payload.get("message", "")
+    user_id = payload.get("user_id")
+    session_id = payload.get("session_id", str(uuid.uuid4()))
+    include_rss = payload.get("include_rss", True)
+    
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    
+    webhook_log = WebhookLog(
+        source="n8n",
+        event_type="chat_message_stream",
+        payload=payload
+    )
+    db.add(webhook_log)
+    db.commit()
+    webhook_log_id = webhook_log.id
+    
+    rss_info = []
+    if include_rss and user_id:
+        user_feeds = db.query(UserRSSFeed).filter(
+            UserRSSFeed.user_id == user_id,
+            UserRSSFeed.is_active == True
+        ).limit(3).all()
+        rss_info = [f"{feed.name} ({feed.category})" for feed in user_feeds]
+    
+    context = {"source": "n8n", "session_id": session_id}
+    consultation_fields = {
+        "user_id": user_id if user_id else None,
+        "question": message,
+        "context_data": {"source": "n8n", "session_id": session_id, "include_rss": include_rss},
+        "rss_sources_used": rss_info,
+        "session_id": session_id,
+        "source": "n8n"
+    }
+    
+    async def ndjson_stream():
+        parts: List[str] = []
+        try:
+            async for delta in EnhancedAIAnalysisService.stream_answer_with_rss(
+                message, context, user_id if include_rss else None
+            ):
+                parts.append(delta)
+                yield json.dumps({"type": "delta", "content": delta}, ensure_ascii=False) + "\n"
+        finally:
+            response_data = {
+                "response": "".join(parts),
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat(),
+                "source": "financial_ai_dashboard",
+                "rss_sources_used": rss_info,
+                "include_rss": include_rss
+            }
+            if parts:
+                # Экранируем от отмены: при отключении клиента ответ все равно сохраняется
+                with anyio.CancelScope(shield=True):
+                    try:
+                        await persist_streamed_consultation(consultation_fields, response_data["response"],
+                                                            webhook_log_id, response_data)
+                    except Exception as e:
+                        logger.error(f"Error saving streamed n8n consultation: {e}")
+        
+        yield json.dumps({"type": "done", **response_data}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson", headers=STREAMING_HEADERS)
+
 @app.get("/webhook/n8n/status")
 async def n8n_webhook_status():
     """Статус webhook для n8n с RSS поддержкой"""
     return {
         "status": "active",
         "webhook_url": "/webhook/n8n/chat",
+        "stream_url": "/webhook/n8n/chat/stream",
         "supported_methods": ["POST"],
         "required_fields": ["message"],
         "optional_fields": ["user_id", "session_id", "webhook_url", "include_rss"],
@@ -9,6 +9,11 @@ class FinancialDashboardApp {
         this.mobileNavOpen = false;
         this.charts = {};
         this.userData = null;
+        this.apiToken = localStorage.getItem('finai_token');
+        this.dashboardETag = null;
+        this.dashboardVersion = null;
+        this.dashboardData = {};
+        this.liveEvents = null;
         this.appData = null;
         this.currentPricingSlide = 0;
         this.currentMetricIndex = 0;
@@ -879,17 +884,25 @@ class FinancialDashboardApp {
             navigator.vibrate(50);
         }
         
-        // Simulate API call
-        setTimeout(() => {
-            this.userData = this.appData.users[0];
-            this.isAuthenticated = true;
-            localStorage.setItem('finai_user', JSON.stringify(this.userData));
-            
-            this.hideElement('loginModal');
-            this.showLoading(false);
-            this.showMainApp();
-            this.showToast('Добро пожаловать в FinAI Dashboard!', 'success');
-        }, 1500);
+        const form = event.target;
+        this.requestAuthToken('/api/auth/login', {
+            email: form.querySelector('input[type="email"]')?.value,
+            password: form.querySelector('input[type="password"]')?.value
+        })
+            .then(apiUser => {
+                this.userData = apiUser ? { ...this.appData.users[0], ...apiUser } : this.appData.users[0];
+                this.isAuthenticated = true;
+                localStorage.setItem('finai_user', JSON.stringify(this.userData));
+                
+                this.hideElement('loginModal');
+                this.showLoading(false);
+                this.showMainApp();
+                this.showToast('Добро пожаловать в FinAI Dashboard!', 'success');
+            })
+            .catch(error => {
+                this.showLoading(false);
+                this.showToast(error.message, 'error');
+            });
         
         return false;
     }
@@ -904,39 +917,84 @@ class FinancialDashboardApp {
             navigator.vibrate(50);
         }
         
-        // Simulate API call
-        setTimeout(() => {
-            const form = event.target;
-            const inputs = form.querySelectorAll('input[type="text"], input[type="email"]');
-            
-            this.userData = {
-                id: 'user_' + Date.now(),
-                name: inputs[0]?.value || 'Новый пользователь',
-                company: inputs[1]?.value || 'Новая компания',
-                email: form.querySelector('input[type="email"]')?.value || 'user@example.com',
-                role: 'CFO',
-                subscription: 'Professional',
-                avatar: 'https://images.unsplash.com/photo-1472099645785-5658abf4ff4e?w=150'
-            };
-            
-            this.isAuthenticated = true;
-            localStorage.setItem('finai_user', JSON.stringify(this.userData));
-            
-            this.hideElement('registerModal');
-            this.showLoading(false);
-            this.showMainApp();
-            this.showToast('Регистрация успешно завершена!', 'success');
-        }, 1500);
+        const form = event.target;
+        const inputs = form.querySelectorAll('input[type="text"], input[type="email"]');
+        const email = form.querySelector('input[type="email"]')?.value || 'user@example.com';
+        
+        this.requestAuthToken('/api/auth/register', {
+            name: inputs[0]?.value || 'Новый пользователь',
+            company: inputs[1]?.value || 'Новая компания',
+            email,
+            password: form.querySelector('input[type="password"]')?.value
+        })
+            .then(apiUser => {
+                this.userData = {
+                    id: 'user_' + Date.now(),
+                    name: inputs[0]?.value || 'Новый пользователь',
+                    company: inputs[1]?.value || 'Новая компания',
+                    email,
+                    role: 'CFO',
+                    subscription: 'Professional',
+                    avatar: 'https://images.unsplash.com/photo-1472099645785-5658abf4ff4e?w=150',
+                    ...(apiUser || {})
+                };
+                
+                this.isAuthenticated = true;
+                localStorage.setItem('finai_user', JSON.stringify(this.userData));
+                
+                this.hideElement('registerModal');
+                this.showLoading(false);
+                this.showMainApp();
+                this.showToast('Регистрация успешно завершена!', 'success');
+            })
+            .catch(error => {
+                this.showLoading(false);
+                this.showToast(error.message, 'error');
+            });
         
         return false;
     }
 
+    async requestAuthToken(path, payload) {
+        // Keeps the API token for streaming chat, dashboard refresh and live events.
+        // Without a reachable backend (static demo) the UI continues in demo mode.
+        let response;
+        try {
+            response = await fetch(path, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(payload)
+            });
+        } catch (error) {
+            console.warn('Auth API unavailable, continuing in demo mode:', error);
+            return null;
+        }
+        if (response.status === 404 || response.status === 405) {
+            return null;
+        }
+        
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            throw new Error(typeof data.detail === 'string' ? data.detail : `Ошибка авторизации (${response.status})`);
+        }
+        this.apiToken = data.access_token;
+        localStorage.setItem('finai_token', this.apiToken);
+        return data.user;
+    }
+
     socialLogin(provider) {
         this.showToast(`Вход через ${provider} будет доступен в ближайшее время`, 'info');
     }
 
     logout() {
         localStorage.removeItem('finai_user');
+        localStorage.removeItem('finai_token');
+        this.apiToken = null;
+        // Validators and data of this user must not be reused by the next one
+        this.dashboardETag = null;
+        this.dashboardVersion = null;
+        this.dashboardData = {};
+        this.disconnectLiveEvents();
         this.isAuthenticated = false;
         this.userData = null;
         this.hideElement('userDropdown');
@@ -968,6 +1026,9 @@ class FinancialDashboardApp {
         // Close mobile navigation
         this.closeMobileNav();
         
+        // Live updates replace polling when signed in with an API token
+        this.connectLiveEvents();
+        
         // Initialize dashboard with delay to ensure DOM is ready
         setTimeout(() => {
             this.populateDashboard();
@@ -1802,23 +1863,7 @@ class FinancialDashboardApp {
         }
 
         this.addChatMessage(message, 'user');
-        
-        // Show typing indicator
-        setTimeout(() => {
-            this.showTypingIndicator();
-            
-            // Simulate AI response delay
-            setTimeout(() => {
-                this.hideTypingIndicator();
-                const response = this.generateAIResponse(message);
-                this.addChatMessage(response, 'ai');
-                
-                // Add haptic feedback for response
-                if (navigator.vibrate) {
-                    navigator.vibrate([50, 100, 50]);
-                }
-            }, 2000);
-        }, 500);
+        this.respondToChatMessage(message);
     }
 
     sendQuickMessage(message) {
@@ -1829,10 +1874,27 @@ class FinancialDashboardApp {
         }
 
         this.addChatMessage(message, 'user');
-        
+        this.respondToChatMessage(message);
+    }
+
+    respondToChatMessage(message) {
+        // Stream the answer from the API when signed in with a real token
+        if (this.apiToken && window.fetch && window.TextDecoder) {
+            this.streamAIResponse(message).catch(error => {
+                console.error('AI stream error:', error);
+                this.hideTypingIndicator();
+                this.respondWithMockAI(message);
+            });
+            return;
+        }
+        this.respondWithMockAI(message);
+    }
+
+    respondWithMockAI(message) {
         setTimeout(() => {
             this.showTypingIndicator();
             
+            // Simulate AI response delay
             setTimeout(() => {
                 this.hideTypingIndicator();
                 const response = this.generateAIResponse(message);
@@ -1846,6 +1908,69 @@ class FinancialDashboardApp {
         }, 500);
     }
 
+    async streamAIResponse(message) {
+        this.showTypingIndicator();
+
+        const response = await fetch('/api/ai/consult/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${this.apiToken}`
+            },
+            body: JSON.stringify({ question: message, include_rss: true })
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let textEl = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE frames are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                const eventLine = frame.split('\n').find(line => line.startsWith('event: '));
+                const dataLine = frame.split('\n').find(line => line.startsWith('data: '));
+                if (!eventLine || !dataLine) continue;
+
+                const event = eventLine.slice(7);
+                const data = JSON.parse(dataLine.slice(6));
+
+                if (event === 'delta') {
+                    if (!textEl) {
+                        this.hideTypingIndicator();
+                        this.addChatMessage('', 'ai');
+                        const messages = document.querySelectorAll('#chatMessages .chat-message--ai .message-text');
+                        textEl = messages[messages.length - 1];
+                    }
+                    answer += data.content;
+                    if (textEl) {
+                        textEl.textContent = answer;
+                        const container = document.getElementById('chatMessages');
+                        if (container) container.scrollTop = container.scrollHeight;
+                    }
+                } else if (event === 'done' && navigator.vibrate) {
+                    navigator.vibrate([50, 100, 50]);
+                }
+            }
+        }
+
+        if (!textEl) {
+            this.hideTypingIndicator();
+        }
+    }
+
     addChatMessage(text, sender) {
         const container = document.getElementById('chatMessages');
         if (!container) return;
@@ -2118,7 +2243,120 @@ class FinancialDashboardApp {
         }, 1500);
     }
 
+    async fetchDashboardFromApi() {
+        // Conditional request: 304 when nothing changed, otherwise only changed sections
+        const url = this.dashboardVersion
+            ? `/api/dashboard?since=${encodeURIComponent(this.dashboardVersion)}`
+            : '/api/dashboard';
+        const headers = { 'Authorization': `Bearer ${this.apiToken}` };
+        if (this.dashboardETag) {
+            headers['If-None-Match'] = this.dashboardETag;
+        }
+
+        const response = await fetch(url, { headers });
+        if (response.status === 304) {
+            return false;
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        const data = await response.json();
+        this.dashboardETag = response.headers.get('ETag');
+        this.dashboardVersion = data.version;
+        this.dashboardData = data.delta ? { ...this.dashboardData, ...data } : data;
+        this.applyDashboardData(this.dashboardData);
+        return true;
+    }
+
+    connectLiveEvents() {
+        if (!this.apiToken || !window.EventSource || this.liveEvents) return;
+
+        // EventSource reconnects on its own and sends Last-Event-ID to resume
+        this.liveEvents = new EventSource(`/api/events?token=${encodeURIComponent(this.apiToken)}`);
+
+        const refreshDashboard = () => {
+            this.fetchDashboardFromApi()
+                .then(changed => {
+                    if (changed) {
+                        this.populateDashboard();
+                        this.populateAccountsList();
+                        this.populateDetailedAccounts();
+                    }
+                })
+                .catch(error => console.error('Dashboard refresh error:', error));
+        };
+
+        this.liveEvents.addEventListener('dashboard.changed', refreshDashboard);
+        this.liveEvents.addEventListener('resync', () => {
+            this.dashboardVersion = null;
+            refreshDashboard();
+        });
+        this.liveEvents.addEventListener('notification', event => {
+            const data = JSON.parse(event.data);
+            this.showToast(data.title, data.type === 'critical' ? 'error' : 'info');
+        });
+        this.liveEvents.addEventListener('report.ready', event => {
+            const data = JSON.parse(event.data);
+            this.showToast(`Отчет готов: ${data.name}`, 'success');
+        });
+        this.liveEvents.addEventListener('report.failed', event => {
+            const data = JSON.parse(event.data);
+            this.showToast(`Ошибка генерации отчета: ${data.name}`, 'error');
+        });
+    }
+
+    disconnectLiveEvents() {
+        if (this.liveEvents) {
+            this.liveEvents.close();
+            this.liveEvents = null;
+        }
+    }
+
+    applyDashboardData(data) {
+        const metrics = this.appData.dashboardMetrics;
+        const summary = data.summary || data;
+
+        metrics.totalBalance = summary.total_balance_kzt ?? summary.totalBalance ?? metrics.totalBalance;
+        metrics.liquidityStatus = summary.liquidity_status ?? summary.liquidityStatus ?? metrics.liquidityStatus;
+        metrics.accountsCount = summary.accounts_count ?? summary.accountsCount ?? metrics.accountsCount;
+        metrics.lastUpdated = summary.last_updated ?? data.lastUpdated ?? metrics.lastUpdated;
+        if (data.cashFlowThisMonth !== undefined) metrics.cashFlowThisMonth = data.cashFlowThisMonth;
+        if (data.riskLevel !== undefined) metrics.riskLevel = data.riskLevel;
+
+        if (Array.isArray(data.accounts)) {
+            this.appData.accounts = data.accounts.map(account => ({
+                id: account.id,
+                name: account.name,
+                bank: account.bank,
+                balance: account.balance,
+                currency: account.currency,
+                type: account.account_type,
+                lastTransaction: account.lastTransaction || metrics.lastUpdated
+            }));
+        }
+    }
+
     refreshData() {
+        if (this.apiToken && window.fetch) {
+            this.showLoading(true);
+            this.fetchDashboardFromApi()
+                .then(changed => {
+                    if (changed) {
+                        this.populateDashboard();
+                        this.populateAccountsList();
+                        this.populateDetailedAccounts();
+                    }
+                    this.showToast(changed ? 'Данные обновлены' : 'Данные актуальны', 'success');
+                })
+                .catch(error => {
+                    console.error('Dashboard refresh error:', error);
+                    this.showToast('Ошибка обновления данных', 'error');
+                })
+                .finally(() => this.showLoading(false));
+            return;
+        }
+
         this.showLoading(true);
         
         setTimeout(() => {